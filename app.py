@@ -1,39 +1,97 @@
 import dash
-from dash.dependencies import Input, Output, State, ClientsideFunction
+from dash.dependencies import Input, Output, State
 import dash_core_components as dcc
 import dash_html_components as html
 from dash.exceptions import PreventUpdate
-import dash_table
+from dash_table.Format import Format
 import dash_bootstrap_components as dbc
 import datetime as dt
 import pandas as pd
 import plotly.express as px
 import os
-import pandas as pd
-import stat
 from pathlib import Path
 import callbacks as cb
 import stat_scrapper.db_utils as db
-import unidecode
 import layouts
 from stat_scrapper.teams import get_abbrevs
+from stat_scrapper.refresh import get_refresh_date
+from stat_scrapper.scheduler import RefreshScheduler, run_migrations
+from data_store import SlateStore
+from view_cache import ViewCache
+from monitoring import instrument_app
 
-database_dir = Path('nba_dfs.db')
+# database of the db folder served, NBA_DFS_DB points the app at another one,
+# ie a synthetic database built by benchmarks/synthetic_db.py
+database_dir = Path(os.environ.get('NBA_DFS_DB', 'nba_dfs.db'))
+# graph levels read from the stored player form, by form metric suffix
+FORM_LEVELS = {'3 Game Avg': 'avg_3', '5 Game Avg': 'avg_5',
+               '10 Game Avg': 'avg_10', 'EWMA': 'ewma'}
 code_url = 'https://github.com/damancox/nba_daily_fantasy'
+# players without a salary on the slate, or slates before the first salary
+# snapshot, show a placeholder rather than an empty cell
+SALARY_COLUMNS = {'SALARY': 'No salary', 'MULTI': '-'}
+# most lineups optimized by a single request
+MAX_LINEUPS = 150
+
+# a database stored by an earlier version is migrated on first run
+run_migrations(database_dir)
+# callbacks read through a kept connection of their thread
+connections = db.get_manager(database_dir)
+conn = connections.reader()
+refresh_date = get_refresh_date(conn)
+
+# slate boxscores stay on the server, only their key goes to the browser,
+# along with the schedule so date picks are served without a query
+store = SlateStore(connections)
+# views computed from a slate are memoized per data refresh
+views = ViewCache()
+# milliseconds between checks for a data refresh
+REFRESH_POLL = 60 * 1000
+# hours between in process refreshes, unset when refreshed by update_db.py
+refresh_hours = float(os.environ.get('NBA_DFS_REFRESH_HOURS', 0))
+if refresh_hours > 0:
+    RefreshScheduler(interval=refresh_hours * 3600).start()
+
+def get_team_dfs(key):
+    return views.memoize('team_dfs', key,
+                         lambda: cb.aggregate_team_dfs(store.get(key)))
+
+def get_player_dfs(key):
+    return views.memoize('player_dfs', key,
+                         lambda: cb.calculate_player_dfs_scores(store.get(key)))
+
+def get_player_form(key, metric):
+    def compute():
+        return cb.get_form_graph_data(connections.reader(), key['date'],
+                                      store.get(key), metric)
+
+    return views.memoize(f'form_{metric}', key, compute)
+
+def get_optimizer_pool(key):
+    def compute():
+        return cb.get_optimizer_pool(connections.reader(), date=key['date'],
+                                     schedule=store.get_schedule(key))
+
+    return views.memoize('optimizer_pool', key, compute)
+
+def get_player_table(key):
+    def compute():
+        return cb.get_player_table(connections.reader(), date=key['date'],
+                                   schedule=store.get_schedule(key))
 
-with db.create_connection('nba_dfs.db') as conn:
-    refresh_q = """select max(date) from refresh_log"""
-    refresh = pd.read_sql(refresh_q, conn)
-    refresh_date = refresh.values[0][0]
+    return views.memoize('player_table', key, compute)
 
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 app.title = 'NBA DFS'
 
 server = app.server
+# callbacks are timed and the process metrics served at /metrics
+instrument_app(app)
 
 app.layout = html.Div([
     
-    dcc.Store(id='data-store'),
+    dcc.Store(id='slate-key'),
+    dcc.Interval(id='refresh-interval', interval=REFRESH_POLL),
     dcc.Store(id='team-dfs'),
     
     html.Div([
@@ -54,7 +112,7 @@ app.layout = html.Div([
             ]),
             html.Div([
                 html.Div("Data Refreshed:", className='menu-title'),
-                html.Div(f"{refresh_date}")
+                html.Div(f"{refresh_date}", id='refresh-date')
             ])
         ], className='menu'),
         html.Div([ # tables holder
@@ -95,7 +153,7 @@ app.layout = html.Div([
                     html.Div([
                         dcc.RadioItems(id='stat-level',
                         options=[{'label': i, 'value': i} 
-                                for i in ['Per Game', '3 Game Avg']],
+                                for i in ['Per Game'] + list(FORM_LEVELS)],
                         value='Per Game')
                     ], style={'width': '30%', 'float': 'right', 
                               'display': 'inline-block'}),
@@ -103,6 +161,39 @@ app.layout = html.Div([
                 dcc.Graph(id='player-graph'),
             ])
             
+        ], className='wrapper'),
+        
+        html.Div([ # lineup optimizer
+            html.H5('Lineup Optimizer'),
+            html.Div([
+                html.Div([
+                    html.Div('Lineups', className='menu-title'),
+                    dcc.Input(id='lineup-count', type='number', value=20,
+                              min=1, max=MAX_LINEUPS),
+                ], style={'width': '15%', 'display': 'inline-block'}),
+                html.Div([
+                    html.Div('Max Exposure', className='menu-title'),
+                    dcc.Input(id='lineup-exposure', type='number', value=1,
+                              min=0.05, max=1, step=0.05),
+                ], style={'width': '15%', 'display': 'inline-block'}),
+                html.Div([
+                    html.Div('Min Unique', className='menu-title'),
+                    dcc.Input(id='lineup-unique', type='number', value=1,
+                              min=1, max=8),
+                ], style={'width': '15%', 'display': 'inline-block'}),
+                html.Div([
+                    html.Div('Lock', className='menu-title'),
+                    dcc.Dropdown(id='lineup-locks', multi=True),
+                ], style={'width': '25%', 'display': 'inline-block'}),
+                html.Div([
+                    html.Div('Exclude', className='menu-title'),
+                    dcc.Dropdown(id='lineup-excludes', multi=True),
+                ], style={'width': '25%', 'display': 'inline-block'}),
+            ]),
+            dbc.Button('Optimize', id='optimize-button', className='button'),
+            html.Div([
+                layouts.lineup_table[0]
+            ], className='card'),
         ], className='wrapper')
         
     ])
@@ -110,25 +201,36 @@ app.layout = html.Div([
 ])
 
 @app.callback(
-    Output('data-store', 'data'),
-    Input('date-picker', 'date')
+    Output('slate-key', 'data'),
+    [Input('date-picker', 'date'),
+     Input('refresh-interval', 'n_intervals')],
+    [State('slate-key', 'data')]
 )
-def get_data(date):
-    with db.create_connection(database_dir) as conn:
-        df = cb.get_today_player_stats(conn, date=date)
-        
-        return df.to_dict('records')
+def get_data(date, n_intervals, current):
+    # a new key, and so new views, only once the data is refreshed
+    key = store.get_key(date)
+    if key == current:
+        raise PreventUpdate
+    store.get(key)
+    
+    return key
+
+@app.callback(
+    Output('refresh-date', 'children'),
+    Input('refresh-interval', 'n_intervals')
+)
+def update_refresh_date(n_intervals):
+    return f"{get_refresh_date(connections.reader())}"
 
 @app.callback(
     [Output('player_table', 'columns'),
      Output('player_table', 'data'),
      Output('player_table', 'row_selectable')],
-    [Input('data-store', 'data'),
+    [Input('slate-key', 'data'),
      Input('team-dfs', 'data')]
 )
-def player_data(data, dfs):
-    df = pd.DataFrame.from_dict(data)
-    dfs_df = cb.aggregate_table_data(df)
+def player_data(key, dfs):
+    dfs_df = get_player_table(key)
 
     df2 = pd.DataFrame.from_dict(dfs)
     t1 = df2.iloc[:, 0:2]
@@ -141,6 +243,10 @@ def player_data(data, dfs):
     dfs_df['Pct Team'] = round(dfs_df['AVG'] / dfs_df['Avg'], 2)
     dfs_df.drop('Avg', inplace=True, axis=1)
     cols = [{"name": i, "id": i} for i in dfs_df.columns]
+    for col in cols:
+        if col['id'] in SALARY_COLUMNS:
+            col.update(type='numeric',
+                       format=Format(nully=SALARY_COLUMNS[col['id']]))
     table_data = dfs_df.to_dict('records')
     
     return cols, table_data, "multi"
@@ -150,21 +256,14 @@ def player_data(data, dfs):
      Output('team_table', 'data'),
      Output('team-dfs', 'data')],
     [Input('date-picker', 'date'),
-     Input('data-store', 'data')]
+     Input('slate-key', 'data')]
 )
-def update_team_table(date, data):
-    q = """select date(Dates) as Date, 
-           "Visitor/Neutral", 
-           "Home/Neutral" 
-           from schedule"""
-    with db.create_connection('nba_dfs.db') as conn:
-        sched = pd.read_sql(q, conn)
-    
-    df = sched[sched.Date == date].drop('Date', axis=1)
+def update_team_table(date, key):
+    df = store.get_schedule(key).on_date(date)[['Visitor/Neutral',
+                                                'Home/Neutral']]
     col_1 = df[['Visitor/Neutral']].rename({'Visitor/Neutral': 'Team'}, axis=1)
     col_2 = df[['Home/Neutral']].rename({'Home/Neutral': 'Team'}, axis=1)
-    box_df = pd.DataFrame.from_dict(data)
-    dfs_df = cb.aggregate_team_dfs(box_df)
+    dfs_df = get_team_dfs(key)
     abb = get_abbrevs().rename({'team_name': 'Team'}, axis=1)
     t1 = (abb.merge(col_1, on='Team', how='right')
           .merge(dfs_df, on='Team', how='left')
@@ -186,11 +285,10 @@ def update_team_table(date, data):
 @app.callback(
     [Output('team_dfs_table', 'columns'),
      Output('team_dfs_table', 'data')],
-    [Input('data-store', 'data')]
+    [Input('slate-key', 'data')]
 )
-def update_team_dfs_table(data):
-    df = pd.DataFrame.from_dict(data)
-    dfs_df = cb.aggregate_team_dfs(df)
+def update_team_dfs_table(key):
+    dfs_df = get_team_dfs(key)
     cols = [{"name": i, "id": i} for i in dfs_df.columns]
     table_data = dfs_df.to_dict('records')
     
@@ -198,36 +296,32 @@ def update_team_dfs_table(data):
     
 @app.callback(
     Output('player-graph', 'figure'),
-    [Input('data-store', 'data'),
+    [Input('slate-key', 'data'),
      Input('player_table', 'derived_virtual_selected_rows'),
      Input('player_table', 'derived_virtual_data'),
      Input('stat-drop', 'value'),
      Input('stat-level', 'value')]
 )
-def update_player_graph(data, row_inds, table_data, stat, level):
+def update_player_graph(key, row_inds, table_data, stat, level):
     if len(row_inds) == 0:
         raise PreventUpdate
     else:
-        box_df = pd.DataFrame.from_dict(data)
-        boxscores = cb.calculate_player_dfs_scores(box_df)
         tbl_df = pd.DataFrame(table_data)
         idx = list(row_inds)
         player_list = tbl_df[tbl_df.index.isin(idx)]['player'].unique()
-        graph_df = boxscores[boxscores['player'].isin(player_list)]
-        graph_df.sort_values(by='date', inplace=True)
-        graph_df.set_index('date', inplace=True)
-        graph_df = cb.reformat_minutes_played(graph_df)
-        print(graph_df)
         if stat == 'DFS':
             y_axis = 'TOT_DFS'
         elif stat == 'MP':
             y_axis = 'MP'
         if level == 'Per Game':
-            pass
-        elif level == '3 Game Avg':
-            graph_df = (graph_df.groupby('player')[y_axis].rolling(3).mean()
-                        .reset_index()
-                        .set_index('date'))
+            graph_df = get_player_dfs(key)
+        else:
+            # averages are read from the form stored at ingest
+            metric = f"{'dfs' if stat == 'DFS' else 'mp'}_{FORM_LEVELS[level]}"
+            graph_df = (get_player_form(key, metric)
+                        .rename({metric: y_axis}, axis=1))
+        graph_df = graph_df[graph_df['player'].isin(player_list)]
+        graph_df = graph_df.sort_values(by='date').set_index('date')
         fig = px.line(graph_df, y=y_axis, color='player', 
                       title='Daily Fantasy Score Totals')
         fig.update_xaxes(title_text='Date')
@@ -236,6 +330,49 @@ def update_player_graph(data, row_inds, table_data, stat, level):
         
         return fig
 
+@app.callback(
+    [Output('lineup-locks', 'options'),
+     Output('lineup-excludes', 'options')],
+    [Input('slate-key', 'data')]
+)
+def update_lineup_options(key):
+    pool = get_optimizer_pool(key)
+    options = [{'label': f'{x.player} ({x.team})', 'value': x.player_id}
+               for x in pool.itertuples()]
+    
+    return options, options
+
+@app.callback(
+    [Output('lineup_table', 'columns'),
+     Output('lineup_table', 'data')],
+    [Input('optimize-button', 'n_clicks')],
+    [State('slate-key', 'data'),
+     State('lineup-count', 'value'),
+     State('lineup-exposure', 'value'),
+     State('lineup-unique', 'value'),
+     State('lineup-locks', 'value'),
+     State('lineup-excludes', 'value')]
+)
+def update_lineup_table(n_clicks, key, count, exposure, unique, locks,
+                        excludes):
+    if not n_clicks:
+        raise PreventUpdate
+    pool = get_optimizer_pool(key)
+    if pool.empty:
+        # only players with a salary are in the pool
+        cols = [{"name": 'Lineups', "id": 'Lineups'}]
+        return cols, [{'Lineups': 'No salaries stored for this slate.'}]
+    lineup_df, _ = cb.build_lineup_table(pool,
+                                         n=min(int(count or 1), MAX_LINEUPS),
+                                         locks=locks or [],
+                                         excludes=excludes or [],
+                                         max_exposure=exposure,
+                                         min_unique=int(unique or 1),
+                                         boxscore_df=store.get(key))
+    cols = [{"name": i, "id": i} for i in lineup_df.columns]
+    
+    return cols, lineup_df.to_dict('records')
+
 @app.callback(
     Output('player_table', 'selected_rows'),
     [Input('clear-button', 'n_clicks')]
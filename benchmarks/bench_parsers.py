@@ -0,0 +1,71 @@
+"""
+Compares the stat_scrapper parser backends on saved boxscore pages.
+
+usage:
+python benchmarks/bench_parsers.py [page_dir] [--repeat N]
+
+Pages are read from page_dir (*.html) or, when not passed, from the
+boxscores held in the page cache.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from stat_scrapper.boxscores import BOX_TABLE_ID
+from stat_scrapper.page_cache import get_page_cache
+from stat_scrapper.parsing import BACKENDS, get_backend, parse_tables
+
+def load_pages(page_dir=None):
+    """
+    Returns the saved pages as a list of bytes.
+    """
+    if page_dir:
+        return [x.read_bytes() for x in sorted(Path(page_dir).glob('*.html'))]
+    cache = get_page_cache()
+    urls = [x[0] for x in cache._conn.execute(
+        "select url from pages where url like '%/boxscores/%'")]
+
+    return [cache.get(x) for x in urls]
+
+def bench_backend(pages, backend, repeat=3):
+    """
+    Returns the best mean seconds per page of a backend over repeat runs.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for page in pages:
+            parse_tables(page, BOX_TABLE_ID, backend=backend)
+        per_page = (time.perf_counter() - start) / len(pages)
+        best = per_page if best is None else min(best, per_page)
+
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('page_dir', nargs='?')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_pages(args.page_dir)
+    if not pages:
+        sys.exit('No saved boxscore pages found.')
+    print(f'{len(pages)} pages')
+    results = {}
+    for backend in BACKENDS:
+        try:
+            get_backend(backend)
+        except ValueError as e:
+            print(e)
+            continue
+        results[backend] = bench_backend(pages, backend, args.repeat)
+    baseline = results['soup']
+    for backend, per_page in results.items():
+        print(f'{backend:<10}{per_page * 1000:>10.2f} ms/page'
+              f'{baseline / per_page:>8.1f}x')
+
+if __name__ == '__main__':
+    main()
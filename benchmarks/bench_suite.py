@@ -0,0 +1,353 @@
+"""
+Offline benchmark suite of the scrapers, the boxscore ingest and the
+dashboard.
+
+usage:
+python benchmarks/bench_suite.py [--games N] [--players N] [--seasons N]
+                                 [--ingest-games N] [--lineups N] [--repeat N]
+                                 [--output PATH] [--compare PATH]
+
+Pages are replayed from the saved fixtures and the dashboard reads a
+synthetic database, so nothing is requested. Measures the parse time of
+each page, the games per second ingested by update_boxscores_table and the
+latency of the slate aggregations and of every Dash callback, cold (views
+and slates computed again) and warm. Results are written as JSON, by default
+to benchmarks/results/<commit>.json, and --compare prints the change of
+every timing against an earlier results file.
+"""
+import argparse
+import contextlib
+import datetime as dt
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# stat_scrapper.teams builds its registry on first use, scraping the teams
+# when no teams table exists, so the saved pages are installed first
+from pages import (BBREF_URL, BOXSCORE_URL, SEASON, install_fixture_cache,
+                   read_fixture, seed_boxscores)
+install_fixture_cache()
+
+from stat_scrapper.boxscores import (BOX_TABLE_ID, get_game_box_score,
+                                     update_boxscores_table)
+from stat_scrapper.db_utils import create_connection
+from stat_scrapper.parsing import BACKENDS, get_backend, parse_tables
+from stat_scrapper.rosters import get_roster
+from stat_scrapper.salaries import get_today_salaries
+from stat_scrapper.schedule import get_schedule, load_schedule
+from stat_scrapper.teams import get_registry, scrape_abbrevs
+from synthetic_db import GAMES_PER_TEAM, PLAYERS_PER_TEAM, build_database
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+# fixtures parsed by each backend, with the tables they are read for
+PARSED_PAGES = [('boxscore', 'boxscore_ot.html', BOX_TABLE_ID),
+                ('schedule', 'schedule_january.html', '^schedule$'),
+                ('roster', 'roster_BRK.html', '^roster$')]
+# ratio to an earlier run past which a timing is flagged
+THRESHOLD = 1.2
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Swallows the progress prints of the code timed.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def time_runs(fn, repeat, setup=None):
+    """
+    Returns the seconds of repeat calls of fn, each after setup when passed.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with quiet():
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+
+    return times
+
+def summarize(name, times, **extra):
+    """
+    Returns the result record of a timing, in seconds.
+    """
+    result = {'name': name,
+              'runs': len(times),
+              'best': min(times),
+              'median': statistics.median(times),
+              'mean': statistics.mean(times)}
+    result.update(extra)
+    print(f"{name:<44}{result['median'] * 1000:>12.2f} ms")
+
+    return result
+
+def bench_pages(repeat):
+    """
+    Times the scraper of every fixture from the offline page cache, then the
+    table parse of each page by every installed backend.
+    """
+    scrapers = [
+        ('scrape.boxscore', lambda: get_game_box_score(
+            BOXSCORE_URL, pd.Timestamp('2020-12-28'))),
+        ('scrape.schedule', lambda: get_schedule(SEASON)),
+        ('scrape.roster', lambda: get_roster('BKN', SEASON)),
+        ('scrape.salaries', lambda: get_today_salaries('draftkings')),
+        ('scrape.teams', scrape_abbrevs),
+    ]
+    results = [summarize(name, time_runs(fn, repeat))
+               for name, fn in scrapers]
+    for backend in BACKENDS:
+        try:
+            get_backend(backend)
+        except ValueError:
+            continue
+        for page, fixture, table_id in PARSED_PAGES:
+            source = read_fixture(fixture)
+            times = time_runs(
+                lambda: parse_tables(source, table_id, backend=backend),
+                repeat)
+            results.append(summarize(f'parse.{page}.{backend}', times,
+                                     bytes=len(source)))
+
+    return results
+
+def bench_ingest(work_dir, games_per_team, repeat):
+    """
+    Times update_boxscores_table ingesting a schedule of games_per_team
+    games a team into a database holding only the schedule.
+    """
+    path = str(work_dir / 'ingest.db')
+    times = []
+    for _ in range(repeat):
+        with quiet():
+            build_database(path, games_per_team=games_per_team, empty=True)
+        conn = create_connection(path)
+        try:
+            sched_df = pd.read_sql("""
+            select "Visitor/Neutral", "Home/Neutral", "Box_Score"
+            from schedule""", conn)
+            bbref_abbrev = get_registry().bbref_abbrev
+            seed_boxscores(pd.DataFrame({
+                'url': BBREF_URL + sched_df['Box_Score'],
+                'away': sched_df['Visitor/Neutral'].map(bbref_abbrev),
+                'home': sched_df['Home/Neutral'].map(bbref_abbrev)}))
+            load_schedule(SEASON, conn=conn, refresh=True)
+            times += time_runs(
+                lambda: update_boxscores_table(conn, SEASON, append=True), 1)
+            rows = conn.execute('select count(*) from boxscores').fetchone()[0]
+        finally:
+            conn.close()
+    games = len(sched_df)
+    result = summarize('ingest.update_boxscores_table', times, games=games,
+                       rows=rows,
+                       games_per_sec=games / statistics.median(times))
+    print(f"{'':<44}{result['games_per_sec']:>12.2f} games/sec")
+
+    return [result]
+
+def get_slate_date(conn):
+    """
+    Returns the date with the most games of the stored schedule.
+    """
+    q = """
+    select game_date from schedule
+    group by game_date order by count(*) desc, game_date desc limit 1
+    """
+
+    return conn.execute(q).fetchone()[0]
+
+def bench_dashboard(work_dir, args):
+    """
+    Times the slate aggregations and every Dash callback against a synthetic
+    database, cold and warm.
+    """
+    path = str(work_dir / 'dashboard.db')
+    with quiet():
+        rows = build_database(path, seasons=args.seasons,
+                              games_per_team=args.games,
+                              players_per_team=args.players)
+    print(f'{path}: {rows} boxscore rows')
+    # the app serves the database named by NBA_DFS_DB, without refreshing
+    os.environ['NBA_DFS_DB'] = path
+    os.environ.pop('NBA_DFS_REFRESH_HOURS', None)
+    with quiet():
+        import app
+        import callbacks as cb
+        from view_cache import ViewCache
+    app.views = ViewCache(work_dir / 'view_cache.db')
+    conn = app.connections.reader()
+    date = args.date or get_slate_date(conn)
+    print(f'slate {date}')
+
+    results = []
+    schedule = app.store.get_schedule()
+    box_df = cb.get_today_player_stats(conn, date=date, schedule=schedule)
+    aggregations = [
+        ('aggregate.slate_boxscores', lambda: cb.get_today_player_stats(
+            conn, date=date, schedule=schedule)),
+        ('aggregate.player_table', lambda: cb.get_player_table(
+            conn, date=date, schedule=schedule)),
+        ('aggregate.team_dfs', lambda: cb.aggregate_team_dfs(box_df)),
+    ]
+    for name, fn in aggregations:
+        results.append(summarize(name, time_runs(fn, args.repeat),
+                                 rows=len(box_df)))
+
+    # inputs of each callback, as the browser would pass them
+    key = app.get_data.__wrapped__(date, None, None)
+    _, _, team_dfs = app.update_team_table.__wrapped__(date, key)
+    _, table_data, _ = app.player_data.__wrapped__(key, team_dfs)
+    pool = app.get_optimizer_pool(key)
+    rows = list(range(min(3, len(table_data))))
+    callbacks = [
+        ('get_data', lambda: app.get_data.__wrapped__(date, None, None)),
+        ('update_refresh_date',
+         lambda: app.update_refresh_date.__wrapped__(None)),
+        ('update_team_table',
+         lambda: app.update_team_table.__wrapped__(date, key)),
+        ('update_team_dfs_table',
+         lambda: app.update_team_dfs_table.__wrapped__(key)),
+        ('player_data', lambda: app.player_data.__wrapped__(key, team_dfs)),
+        ('update_player_graph.per_game',
+         lambda: app.update_player_graph.__wrapped__(
+             key, rows, table_data, 'DFS', 'Per Game')),
+        ('update_player_graph.form',
+         lambda: app.update_player_graph.__wrapped__(
+             key, rows, table_data, 'DFS', '5 Game Avg')),
+        ('update_lineup_options',
+         lambda: app.update_lineup_options.__wrapped__(key)),
+        ('update_lineup_table',
+         lambda: app.update_lineup_table.__wrapped__(
+             1, key, args.lineups, 1, 1, [], [])),
+    ]
+
+    def clear():
+        app.views.clear()
+        app.store.clear()
+
+    for name, fn in callbacks:
+        # the first call of a slate after a refresh computes its views
+        results.append(summarize(f'callback.{name}.cold',
+                                 time_runs(fn, args.repeat, setup=clear),
+                                 players=len(pool)))
+        fn()
+        results.append(summarize(f'callback.{name}.warm',
+                                 time_runs(fn, args.repeat),
+                                 players=len(pool)))
+
+    return results
+
+def get_commit():
+    """
+    Returns the commit benchmarked and whether the tree has changes.
+    """
+    root = Path(__file__).parent.parent
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root,
+                                capture_output=True, text=True,
+                                check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '-uno'],
+                                cwd=root, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+
+    return commit, bool(status)
+
+def compare(previous, results, threshold=THRESHOLD):
+    """
+    Prints the median of every timing against an earlier run, flagging
+    those slower or faster by more than threshold. Returns the names of the
+    timings slower than threshold.
+    """
+    before = {x['name']: x for x in previous['results']}
+    print(f"\nagainst {previous['commit'][:10]}")
+    slower = []
+    for result in results:
+        old = before.get(result['name'])
+        if old is None:
+            continue
+        ratio = result['median'] / old['median']
+        flag = ''
+        if ratio > threshold:
+            flag = 'slower'
+            slower.append(result['name'])
+        elif ratio < 1 / threshold:
+            flag = 'faster'
+        print(f"{result['name']:<44}{old['median'] * 1000:>12.2f} ms"
+              f"{result['median'] * 1000:>12.2f} ms{ratio:>8.2f}x  {flag}")
+
+    return slower
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description='Run the offline benchmark suite.')
+    parser.add_argument('--games', type=int, default=GAMES_PER_TEAM,
+                        help='games a team of the dashboard database')
+    parser.add_argument('--players', type=int, default=PLAYERS_PER_TEAM,
+                        help='players on each roster')
+    parser.add_argument('--seasons', type=int, default=1)
+    parser.add_argument('--ingest-games', type=int, default=6,
+                        help='games a team ingested by update_boxscores_table')
+    parser.add_argument('--lineups', type=int, default=20,
+                        help='lineups built by the optimizer callback')
+    parser.add_argument('--date', help='slate benchmarked, the date with the '
+                                       'most games by default')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='results file written, '
+                                         'benchmarks/results/<commit>.json '
+                                         'by default')
+    parser.add_argument('--compare', help='earlier results file')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('--skip', nargs='*', default=[],
+                        choices=['pages', 'ingest', 'dashboard'])
+
+    return parser.parse_args(args)
+
+def main():
+    args = parse_args()
+    commit, dirty = get_commit()
+    work_dir = Path(tempfile.mkdtemp(prefix='nba_dfs_bench_'))
+    results = []
+    if 'pages' not in args.skip:
+        results += bench_pages(args.repeat)
+    if 'ingest' not in args.skip:
+        results += bench_ingest(work_dir, args.ingest_games, args.repeat)
+    if 'dashboard' not in args.skip:
+        results += bench_dashboard(work_dir, args)
+
+    report = {'commit': commit,
+              'dirty': dirty,
+              'created_at': dt.datetime.now().isoformat(timespec='seconds'),
+              'python': platform.python_version(),
+              'pandas': pd.__version__,
+              'platform': platform.platform(),
+              'cpus': os.cpu_count(),
+              'config': vars(args),
+              'results': results}
+    output = Path(args.output or RESULTS_DIR / (
+        commit[:10] + ('-dirty' if dirty else '') + '.json'))
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f'Results written to {output}')
+
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text())
+        if compare(previous, results, args.threshold):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Saved pages of every source scraped, replayed through an offline page cache
+so the benchmarks never touch the network.
+
+fixtures:
+boxscore_ot.html -> MEM @ BRK on 2020-12-28, decided in overtime
+schedule_december.html -> league schedule index, the December games
+schedule_january.html -> January games of the league schedule
+roster_BRK.html -> Brooklyn roster of the 2021 season
+salaries_draftkings.html -> fantasypros DraftKings salary changes
+teams.html -> wikipedia table of the team abbreviations
+"""
+import tempfile
+from pathlib import Path
+
+from stat_scrapper.page_cache import PageCache, set_page_cache
+
+FIXTURE_DIR = Path(__file__).parent / 'fixtures'
+BBREF_URL = 'https://www.basketball-reference.com'
+SEASON = 2021
+BOXSCORE_URL = f'{BBREF_URL}/boxscores/202012280BRK.html'
+# teams of the boxscore fixture, away first
+BOXSCORE_TEAMS = ('MEM', 'BRK')
+# url -> fixture, the schedule index lists the months and holds the first
+FIXTURE_URLS = {
+    BOXSCORE_URL: 'boxscore_ot.html',
+    f'{BBREF_URL}/leagues/NBA_{SEASON}_games.html': 'schedule_december.html',
+    f'{BBREF_URL}/leagues/NBA_{SEASON}_games-december.html':
+        'schedule_december.html',
+    f'{BBREF_URL}/leagues/NBA_{SEASON}_games-january.html':
+        'schedule_january.html',
+    f'{BBREF_URL}/teams/BRK/{SEASON}.html': 'roster_BRK.html',
+    ('https://www.fantasypros.com/daily-fantasy/nba/'
+     'draftkings-salary-changes.php'): 'salaries_draftkings.html',
+    ('https://en.wikipedia.org/wiki/Wikipedia:WikiProject_National_Baske'
+     'tball_Association/National_Basketball_Association_team_abbreviatio'
+     'ns'): 'teams.html',
+}
+
+# fixture cache shared by the scrapers once installed
+_cache = None
+
+def read_fixture(name):
+    return (FIXTURE_DIR / name).read_bytes()
+
+def install_fixture_cache(cache_dir=None):
+    """
+    Shares an offline page cache holding the fixtures with the scrapers, in
+    a temporary folder unless cache_dir is passed. Pages missing from it
+    raise PageNotCachedError rather than being requested.
+    """
+    global _cache
+    if _cache is None:
+        cache_dir = cache_dir or tempfile.mkdtemp(prefix='nba_dfs_pages_')
+        _cache = PageCache(cache_dir, offline=True)
+        for url, name in FIXTURE_URLS.items():
+            _cache.put(url, read_fixture(name))
+        set_page_cache(_cache)
+
+    return _cache
+
+def render_boxscore(away, home):
+    """
+    Returns the boxscore fixture as the page of a game between the passed
+    basketball-reference abbreviations.
+    """
+    source = read_fixture(FIXTURE_URLS[BOXSCORE_URL])
+    # through placeholders, so a game of BRK at MEM swaps them over
+    for i, team in enumerate(BOXSCORE_TEAMS):
+        source = source.replace(f'box-{team}-'.encode(), f'box-@{i}-'.encode())
+    for i, abbrev in enumerate((away, home)):
+        source = source.replace(f'box-@{i}-'.encode(),
+                                f'box-{abbrev}-'.encode())
+
+    return source
+
+def seed_boxscores(games):
+    """
+    Caches a boxscore page for every game (game_id, url, away, home), so a
+    whole schedule can be ingested offline.
+    """
+    cache = install_fixture_cache()
+    for game in games.itertuples(index=False):
+        cache.put(game.url, render_boxscore(game.away, game.home))
+
+    return
@@ -0,0 +1,315 @@
+"""
+Builds a synthetic database of any size, shaped like the one the scrapers
+fill, for benchmarks run without basketball-reference.
+
+usage:
+python benchmarks/synthetic_db.py path [--seasons N] [--games N]
+                                       [--players N] [--seed N] [--empty]
+
+Each season every team plays about games games with a roster of players
+players, boxscore stats are drawn from each player's role. The schedule,
+rosters and DraftKings salaries of the last season are stored along with
+the ledger, player summaries, form and identities built from the
+boxscores. With --empty only the teams and schedule are stored, leaving
+every game to be ingested.
+"""
+import argparse
+import sys
+import datetime as dt
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# stat_scrapper.teams builds its registry on first use, scraping the teams
+# when no teams table exists, so the saved pages are installed first
+from pages import install_fixture_cache
+install_fixture_cache()
+
+from stat_scrapper.boxscores import BOXSCORE_COLUMNS, get_season_games
+from stat_scrapper.db_utils import (create_connection, execute_query,
+                                    get_db_path, replace_table, upsert_df)
+from stat_scrapper.form import rebuild_player_form
+from stat_scrapper.ledger import INGESTED, create_ledger, register_games
+from stat_scrapper.players import rebuild_players
+from stat_scrapper.refresh import log_refresh
+from stat_scrapper.schedule import Schedule
+from stat_scrapper.summary import rebuild_player_summary
+from stat_scrapper.teams import get_registry
+
+SEASON = 2021
+GAMES_PER_TEAM = 72
+PLAYERS_PER_TEAM = 13
+# minutes of a roster in order of role, the last ones rarely play
+ROLE_MINUTES = [35, 34, 32, 30, 28, 24, 21, 18, 14, 10, 6, 3, 0, 0, 0]
+# roster positions in order of role
+ROLE_POSITIONS = ['PG', 'SG', 'SF', 'PF', 'C', 'G', 'F', 'C', 'PG', 'SF',
+                  'PF', 'SG', 'C', 'G', 'F']
+FIRST_NAMES = ['Marcus', 'Tyrese', 'Jalen', 'Nikola', 'Luka', 'Kevin',
+               'Andre', 'Bogdan', 'Dario', 'Jusuf', 'Kristaps', 'Moritz',
+               'Theo', 'Cedi', 'Goran', 'Miles']
+LAST_NAMES = ['Anderson', 'Bogdanović', 'Carter', 'Dončić', 'Edwards',
+              'Fournier', 'Green', 'Holiday', 'Ibaka', 'Johnson', 'Kuzma',
+              'Lopez', 'Mills', 'Nurkić', 'Osman', 'Porter Jr.', 'Queta',
+              'Rose', 'Smith', 'Turner', 'Valančiūnas', 'Walker', 'Young',
+              'Zubac', 'Ball', 'Craig', 'Diallo', 'Ennis', 'Forbes', 'Gay']
+SITE = 'draftkings'
+
+def make_players(teams, players_per_team=PLAYERS_PER_TEAM, seed=0):
+    """
+    Returns the roster of every team, one row per player with their id,
+    name, position, role and skill.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(teams) * players_per_team
+    names = [f'{FIRST_NAMES[i % len(FIRST_NAMES)]} '
+             f'{LAST_NAMES[i // len(FIRST_NAMES) % len(LAST_NAMES)]}'
+             for i in range(n)]
+    # names repeat past the name pool, ids stay unique by their number
+    ids = [f'{x.split()[1][:5].lower()}{x[:2].lower()}{i:03d}'
+           for i, x in enumerate(names)]
+    roles = np.tile(np.arange(players_per_team), len(teams))
+    players = pd.DataFrame({
+        'player_id': ids,
+        'player': names,
+        'abbrev': np.repeat(teams, players_per_team),
+        'role': roles,
+        'pos': [ROLE_POSITIONS[x % len(ROLE_POSITIONS)] for x in roles],
+        # usage falls off with the role
+        'skill': rng.uniform(0.6, 1.0, n) * (1.25 - roles / 30)})
+
+    return players
+
+def make_schedule(teams, season=SEASON, games_per_team=GAMES_PER_TEAM,
+                  seed=0):
+    """
+    Returns a schedule in the layout of the schedule table, each day pairing
+    the teams with the fewest games until they all played games_per_team.
+    """
+    registry = get_registry()
+    rng = np.random.default_rng(seed)
+    counts = pd.Series(0, index=teams)
+    day = pd.Timestamp(f'{season - 1}-10-20')
+    records = []
+    while (counts < games_per_team).sum() >= 2:
+        open_teams = counts[counts < games_per_team]
+        # ties on games played are broken at random
+        order = (open_teams + rng.uniform(0, 1, len(open_teams))).sort_values()
+        n_games = min(int(rng.integers(5, 12)), len(order) // 2)
+        playing = list(order.index[:n_games * 2])
+        rng.shuffle(playing)
+        for away, home in zip(playing[::2], playing[1::2]):
+            home_bbref = registry.bbref_abbrev(home)
+            records.append([day, '7:30p', registry.name(away), '',
+                            registry.name(home), '',
+                            f"/boxscores/{day:%Y%m%d}0{home_bbref}.html",
+                            '', '', ''])
+        counts[playing] += 1
+        day += pd.Timedelta(days=1)
+
+    return pd.DataFrame(records, columns=['Dates', 'Start (ET)',
+                                          'Visitor/Neutral', 'PTS_V',
+                                          'Home/Neutral', 'PTS_H',
+                                          'Box_Score', 'OT?', 'Attend.',
+                                          'Notes'])
+
+def make_boxscores(sched_df, players, season=SEASON, seed=0):
+    """
+    Draws the boxscores of every game of a schedule, in the layout of the
+    boxscores table. Counting stats follow each player's minutes and skill.
+    """
+    registry = get_registry()
+    rng = np.random.default_rng(seed)
+    dates = sched_df['Dates'].dt.strftime('%Y-%m-%d')
+    away = sched_df['Visitor/Neutral'].map(registry.abbrev)
+    home = sched_df['Home/Neutral'].map(registry.abbrev)
+    games = pd.DataFrame({'game_id': sched_df['Box_Score'].str[11:-5],
+                          'date': dates, 'unique_id': dates + away + home})
+    sides = pd.concat([games.assign(abbrev=away,
+                                    team_name=sched_df['Visitor/Neutral']),
+                       games.assign(abbrev=home,
+                                    team_name=sched_df['Home/Neutral'])])
+    box_df = sides.merge(players, on='abbrev').sort_values(
+        by=['date', 'game_id', 'abbrev', 'role'], ignore_index=True)
+
+    n = len(box_df)
+    base = np.array(ROLE_MINUTES)[box_df['role'] % len(ROLE_MINUTES)]
+    minutes = np.clip(base + rng.normal(0, 4, n), 0, 48) * (base > 0)
+    box_df['MP_SEC'] = (minutes * 60).astype(int)
+    rate = minutes / 48
+    skill = box_df['skill'].to_numpy()
+    fga = rng.poisson(rate * 19 * skill)
+    fg3a = rng.binomial(fga, 0.38)
+    fg3 = rng.binomial(fg3a, 0.36)
+    fg2 = rng.binomial(fga - fg3a, 0.52)
+    fta = rng.poisson(rate * 4.5 * skill)
+    ft = rng.binomial(fta, 0.78)
+    orb = rng.poisson(rate * 2)
+    drb = rng.poisson(rate * 6.5)
+    stats = {
+        'FG': fg2 + fg3, 'FGA': fga, '3P': fg3, '3PA': fg3a, 'FT': ft,
+        'FTA': fta, 'ORB': orb, 'DRB': drb, 'TRB': orb + drb,
+        'AST': rng.poisson(rate * 6 * skill),
+        'STL': rng.poisson(rate * 1.3), 'BLK': rng.poisson(rate * 0.9),
+        'TOV': rng.poisson(rate * 2.4 * skill),
+        'PF': np.minimum(rng.poisson(rate * 3.5), 6),
+        'PTS': 2 * fg2 + 3 * fg3 + ft,
+        '+/-': np.where(minutes > 0, rng.integers(-20, 21, n), 0)}
+    for k, v in stats.items():
+        box_df[k] = v
+    # percentages are null without attempts, zero for players who sat
+    for pct, made, att in [('FG%', 'FG', 'FGA'), ('3P%', '3P', '3PA'),
+                           ('FT%', 'FT', 'FTA')]:
+        attempts = box_df[att].where(box_df[att] > 0)
+        box_df[pct] = (box_df[made] / attempts).round(3)
+        box_df.loc[box_df['MP_SEC'] == 0, pct] = 0.0
+    box_df['season'] = int(season)
+
+    return box_df[BOXSCORE_COLUMNS]
+
+def add_scores(sched_df, box_df):
+    """
+    Fills the points of each team in the schedule from its boxscores.
+    """
+    points = box_df.groupby(['game_id', 'team_name'])['PTS'].sum()
+    game_ids = sched_df['Box_Score'].str[11:-5]
+    sched_df['PTS_V'] = [str(points[x, y]) for x, y
+                         in zip(game_ids, sched_df['Visitor/Neutral'])]
+    sched_df['PTS_H'] = [str(points[x, y]) for x, y
+                         in zip(game_ids, sched_df['Home/Neutral'])]
+
+    return sched_df
+
+def make_salaries(sched_df, players, seed=0):
+    """
+    Returns a DraftKings salary snapshot of every game date for the players
+    of the teams playing, priced by their skill.
+    """
+    registry = get_registry()
+    rng = np.random.default_rng(seed)
+    frames = []
+    for date, games in sched_df.groupby('Dates'):
+        teams = [registry.abbrev(x) for x in
+                 games['Visitor/Neutral'].to_list()
+                 + games['Home/Neutral'].to_list()]
+        slate = players[players['abbrev'].isin(teams)]
+        # priced by their rank on the slate, so lineups fit under the cap
+        salary = (3000 + slate['skill'].rank(pct=True) * 8000
+                  + rng.normal(0, 600, len(slate))) // 100 * 100
+        frames.append(pd.DataFrame({
+            'date': date.strftime('%Y-%m-%d'),
+            'site': SITE,
+            'player_id': slate['player_id'],
+            'player': slate['player'],
+            'team': slate['abbrev'],
+            'pos': slate['pos'],
+            'salary': salary.clip(3000, 12000).astype(int),
+            'fetched_at': date.strftime('%Y-%m-%dT10:00:00')}))
+
+    return pd.concat(frames, ignore_index=True)
+
+def make_rosters(players):
+    """
+    Returns the players in the layout of the rosters table.
+    """
+    rosters = pd.DataFrame({
+        'Player': players['player'], 'Pos': players['pos'], 'Ht': '6-6',
+        'Wt': '215', 'Birth Date': 'January 1, 1995', 'Cntry': 'us',
+        'Exp': '3', 'College': '',
+        'abbrev': players['abbrev'].map(get_registry().bbref_abbrev),
+        'team': players['abbrev'], 'player_id': players['player_id']})
+
+    return rosters
+
+def store_schedule(conn, sched_df, season):
+    """
+    Stores the schedule as update_schedule_table does, registering its games
+    in the ingest ledger.
+    """
+    sched_df = sched_df.copy()
+    sched_df['game_date'] = sched_df['Dates'].dt.strftime('%Y-%m-%d')
+    sched_df['pulled_at'] = dt.datetime.now().isoformat(timespec='seconds')
+    replace_table(sched_df, 'schedule', conn,
+                  indexes=[('ix_schedule_game_date', 'game_date')])
+    create_ledger(conn)
+    register_games(conn, get_season_games(Schedule(sched_df), season))
+
+    return
+
+def build_database(db_name, seasons=1, games_per_team=GAMES_PER_TEAM,
+                   players_per_team=PLAYERS_PER_TEAM, seed=0, empty=False):
+    """
+    Builds a synthetic database of the db folder, or at an absolute path, of
+    seasons seasons ending with SEASON. Returns the number of boxscore rows.
+    """
+    for suffix in ['', '-wal', '-shm']:
+        Path(get_db_path(db_name) + suffix).unlink(missing_ok=True)
+    registry = get_registry()
+    teams = registry.abbrevs()
+    players = make_players(teams, players_per_team, seed)
+    conn = create_connection(db_name)
+    try:
+        replace_table(registry.team_df[['abbrev', 'team_name']], 'teams', conn)
+        execute_query('create_boxscore_table.sql', conn)
+        rows = 0
+        for season in range(SEASON - seasons + 1, SEASON + 1):
+            sched_df = make_schedule(teams, season, games_per_team,
+                                     seed + season)
+            if empty:
+                store_schedule(conn, sched_df, season)
+                continue
+            box_df = make_boxscores(sched_df, players, season, seed + season)
+            sched_df = add_scores(sched_df, box_df)
+            store_schedule(conn, sched_df, season)
+            with conn:
+                upsert_df(box_df, 'boxscores', conn)
+                conn.execute("""
+                update ingest_ledger set status = ?, fetched_at = ?,
+                row_count = (select count(*) from boxscores b
+                             where b.game_id = ingest_ledger.game_id)
+                where season = ?""",
+                (INGESTED, dt.datetime.now().isoformat(timespec='seconds'),
+                 season))
+            rebuild_player_summary(conn, season)
+            rebuild_player_form(conn, season)
+            rows += len(box_df)
+        if not empty:
+            rebuild_players(conn)
+            replace_table(make_rosters(players), 'rosters', conn)
+            execute_query('create_salaries_table.sql', conn)
+            with conn:
+                upsert_df(make_salaries(sched_df, players, seed), 'salaries',
+                          conn)
+        log_refresh(conn)
+    finally:
+        conn.close()
+
+    return rows
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description='Build a synthetic database for the benchmarks.')
+    parser.add_argument('path', help='database built, ie /tmp/synthetic.db')
+    parser.add_argument('--seasons', type=int, default=1)
+    parser.add_argument('--games', type=int, default=GAMES_PER_TEAM,
+                        help='games played by each team a season')
+    parser.add_argument('--players', type=int, default=PLAYERS_PER_TEAM,
+                        help='players on each roster')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--empty', action='store_true',
+                        help='store the schedule only, nothing ingested')
+
+    return parser.parse_args(args)
+
+def main():
+    args = parse_args()
+    path = str(Path(args.path).resolve())
+    rows = build_database(path, seasons=args.seasons, games_per_team=args.games,
+                          players_per_team=args.players, seed=args.seed,
+                          empty=args.empty)
+    print(f'{path}: {rows} boxscore rows')
+
+if __name__ == '__main__':
+    main()
@@ -1,184 +1,156 @@
 import sqlite3
 import pandas as pd 
-import numpy as np
-from stat_scrapper.db_utils import create_connection
-import plotly.express as px
-import plotly.graph_objects as go
 import datetime as dt
-from stat_scrapper.teams import get_abbrevs
-from stat_scrapper.salaries import get_today_salaries
-from unidecode import unidecode
-from stat_scrapper.boxscores import update_boxscores_table
+from stat_scrapper.teams import get_registry
+from stat_scrapper.salaries import get_salaries
+from stat_scrapper.schedule import get_slate_teams
+from stat_scrapper.boxscores import get_season
+from stat_scrapper.summary import get_player_summary
+from stat_scrapper.form import get_player_form, get_latest_form
+from stat_scrapper.scoring import DEFAULT_RULESET, score_dfs
+from stat_scrapper.optimizer import (optimize_lineups, summarize_lineups,
+                                     get_exposures)
+from stat_scrapper.simulation import simulate_slate
 
-def unidecode_column(df, column):
+# search nodes the optimizer expands per request, about a second, tight
+# exposure and uniqueness settings return fewer lineups rather than stall
+LINEUP_NODES = 200000
+
+def get_slate_abbrevs(conn, date, schedule=None):
     """
-    Helper function to remove accents from text.
+    Returns the abbreviations of the teams playing on the specified date,
+    from the in memory schedule when passed or else from the schedule table.
     """
-    df[column] = df[column].apply(lambda x: unidecode(x))
-    
-    return df
+    if schedule is not None:
+        teams = schedule.teams_on(date)
+    else:
+        teams = get_slate_teams(conn, date)
 
-def get_today_player_stats(conn, date=None):
+    return [get_registry().abbrev(x) for x in teams]
+
+def get_today_player_stats(conn, date=None, schedule=None):
     """
-    Gets the boxscores of all players playing on the specified date.
+    Gets the season boxscores of all players playing on the specified date.
+    The slate is looked up in the passed schedule, or by date in the
+    schedule table when not given.
     """
     if not date:
         date = dt.date.today().strftime('%Y-%m-%d')
     else:
         date = pd.to_datetime(date).strftime('%Y-%m-%d')
-    schedule_q = f"""
-    select *
-    from schedule
-    """
-    # query the nba schedule
-    df = pd.read_sql(schedule_q, conn)
-    # ensure date field is datetime dtype
-    df['Dates'] = df['Dates'].map(lambda x: pd.to_datetime(x))
-    # getting games matching date variable
-    df = df[df.Dates == date]
-    # getting a list of the home and away teams for the date's games
-    teams = df['Visitor/Neutral'].to_list() + df['Home/Neutral'].to_list()
-    # Querying the tams table to ge the abbrevs to match as key
-    abbrevs = get_abbrevs()
-    # merging abbreviations with the team to query boxscore query params
-    team_df = pd.DataFrame(teams, columns=['team_name'])
-    team_df = team_df.merge(abbrevs, on='team_name')
-    # getting teams that play today player boxscores for season
-    params = tuple(team_df['abbrev'].to_list())
+    abbrevs = get_slate_abbrevs(conn, date, schedule)
+    season = get_season(pd.to_datetime(date))
+    # getting teams that play today player boxscores for season, only the
+    # columns used by the dashboard
+    marks = ', '.join('?' for _ in abbrevs)
+    # player names come without accents from the identity index
     boxscore_q = f"""
-    select * from boxscores where abbrev in {params}
+    select b.date, b.player_id, coalesce(p.display, b.player) as player,
+           b.MP_SEC / 60.0 as MP, b.PTS, b."3P", b.TRB, b.AST, b.STL, b.BLK,
+           b.TOV, b.team_name, b.abbrev, b.unique_id
+    from boxscores b
+    left join players p on p.player_id = b.player_id
+    where b.season = ? and b.abbrev in ({marks})
     """
-    boxscore_data = pd.read_sql(boxscore_q, conn)
-    # removing accents from player names
-    boxscore_data = unidecode_column(boxscore_data, 'player')
+    boxscore_data = pd.read_sql(boxscore_q, conn,
+                                params=[season] + abbrevs)
         
     return boxscore_data
 
-def reformat_minutes_played(df, col='MP'):
-    mins = df[col].apply(lambda x: x.split(':'))
-    time_col = []
-    for x in mins:
-        x[0] = float(x[0])
-        if len(x) == 2:
-            x[1] = int(x[1]) / 60
-            _ = x[0] + x[1]
-            time_col.append(_)
-        else:
-            x.append(0)
-            _ = x[0] + x[1]
-            time_col.append(_)
-    df['MP'] = time_col
-    
-    return df
- 
-def calculate_player_dfs_scores(df):
-    """
-    get player level dfs scores
-    """
-    # column subset to get dfs totals
-    calc_cols = ['PTS', '3P', 'TRB', 'AST', 'STL', 'BLK', 'TOV']
-    # converting to floats for calculation
-    df[calc_cols] = df[calc_cols].astype(float)
-    # scoring dict to apply to dataframe
-    score_dict = {'PTS': 1, '3P': 0.5, 'TRB': 1.25, 'AST': 1.5, 
-                  'STL': 2, 'BLK': 2, 'TOV': -0.5}
-    # calculating DFS scoring
-    for col in calc_cols:
-        df[col] *= score_dict[col]
-    # returning dataframe with dfs variables only
-    dfs_cols = ['date', 'player', 'MP', 'PTS', '3P', 
-                'TRB', 'AST', 'STL', 'BLK', 'TOV']
-    dfs_df = df[dfs_cols]
-    # aggregating total DFS score
-    dfs_df['TOT_DFS'] = dfs_df.sum(axis=1)
+def calculate_player_dfs_scores(df, ruleset=DEFAULT_RULESET):
+    """
+    get player level dfs scores under a scoring rule set, the passed
+    boxscores are left untouched
+    """
+    dfs_df = df[['date', 'player', 'MP']].copy()
+    dfs_df['TOT_DFS'] = score_dfs(df, ruleset)
     
     return dfs_df
 
-def calculate_avg_dfs_scores(df):
-    avg_df = (df.groupby('player').mean()
-              .reset_index()
-              .sort_values(by='TOT_DFS', ascending=False)
-              .rename({'TOT_DFS': 'AVG_DFS'}, axis=1)
-              .round(2))
-    
-    return avg_df
-
-def calcualte_std_dfs_scores(df):
-    std_df = (df.groupby('player').std()
-              .dropna()
-              .reset_index()
-              .sort_values(by='TOT_DFS', ascending=False)
-              .rename({'TOT_DFS': 'STD_DFS'}, axis=1)
-              .round(2))
-    
-    return std_df
-
-def merge_salaries(df):
-    sal_df = get_today_salaries()[['Player', 'Today']]
-    sal_df.columns = ['player', 'SALARY']
-    sal_df['player'] = sal_df['player'].apply(lambda x: x.strip())
-    sal_df['SALARY'] = (sal_df['SALARY']
-                        .apply(lambda x: x.strip('$'))
-                        .apply(lambda x: x.replace(',', ''))
-                        .apply(lambda x: float(x)))
-    # removing accents from player names
-    sal_df = unidecode_column(sal_df, 'player')
-    # inner merge drops injured and players not active
-    merge_df = df.merge(sal_df, on='player', how='left')
-    merge_df.fillna(0, inplace=True)
+def merge_salaries(df, conn, date):
+    """
+    Adds the salaries stored for the date's slate, players are matched on
+    their player id.
+    """
+    sal_df = get_salaries(conn, date)[['player_id', 'salary']]
+    sal_df = sal_df.rename({'salary': 'SALARY'}, axis=1)
+    sal_df['SALARY'] = sal_df['SALARY'].astype(float)
+    # players without a salary (injured, not active, or slates before the
+    # first salary snapshot) are left null
+    merge_df = df.merge(sal_df, on='player_id', how='left')
     
     return merge_df
 
-def aggregate_table_data(boxscore_df):
-    # adding below line in so names don't drop with acceents, needs to be 
-    # handled better as this is duplicated code found the the merge_salaries
-    # function.
-    dfs_df = calculate_player_dfs_scores(boxscore_df)
-    dfs_df = reformat_minutes_played(dfs_df)
-    
-    dfs_avg = calculate_avg_dfs_scores(dfs_df)
-    dfs_std = calcualte_std_dfs_scores(dfs_df).fillna(0)
+def get_player_table(conn, date=None, schedule=None):
+    """
+    Gets the player table of the specified date's slate from the season
+    player DFS summaries, without pulling any boxscores.
+    """
+    if not date:
+        date = dt.date.today().strftime('%Y-%m-%d')
+    abbrevs = get_slate_abbrevs(conn, date, schedule)
+    season = get_season(pd.to_datetime(date))
+    summary = get_player_summary(conn, season, abbrevs)
+    dfs_agg = (summary.rename({'abbrev': 'Team'}, axis=1)
+               [['player_id', 'player', 'Team', 'MP', 'AVG_DFS', 'STD_DFS']]
+               .round(2))
+    # dfs average of each player's last 5 games before the slate
+    form = (get_latest_form(conn, season, date, 'dfs_avg_5')
+            .rename({'value': 'L5'}, axis=1))
+    dfs_agg = dfs_agg.merge(form.round(2), on='player_id', how='left')
     
-    dfs_agg = dfs_avg.merge(dfs_std[['player', 'STD_DFS']], on='player')
-    dfs_agg = merge_salaries(dfs_agg)
+    return build_player_table(dfs_agg, conn, date)
+
+def build_player_table(dfs_agg, conn, date):
+    """
+    Adds the slate's salaries and value metrics to the per player DFS
+    averages (player_id, player, Team, MP, AVG_DFS and optionally the L5
+    form) and orders the player table columns.
+    """
+    dfs_agg = merge_salaries(dfs_agg, conn, date)
     dfs_agg.sort_values(by='AVG_DFS', ascending=False, inplace=True)
-    dfs_agg = dfs_agg.merge(boxscore_df[['player', 'abbrev']], on='player')
-    dfs_agg.insert(1, 'Team', dfs_agg.pop('abbrev'))
-    dfs_agg.drop_duplicates(inplace=True)
+    form_cols = ['L5'] if 'L5' in dfs_agg else []
     
-    table_df = dfs_agg[['player', 'Team', 'MP', 'AVG_DFS', 'SALARY']]
-    table_df['MULTI'] = round(table_df.AVG_DFS / (table_df.SALARY / 1000), 2)
-    table_df['FPPM'] = round(table_df['AVG_DFS'] / table_df['MP'], 2)
-    table_df.fillna(0, inplace=True)
+    table_df = dfs_agg[['player', 'Team', 'MP', 'AVG_DFS'] + form_cols
+                       + ['SALARY']].copy()
+    # value metrics are left null rather than inf without salary or minutes
+    salary = table_df['SALARY']
+    table_df['MULTI'] = (table_df['AVG_DFS']
+                         / (salary / 1000)).where(salary > 0)
+    table_df['FPPM'] = (table_df['AVG_DFS']
+                        / table_df['MP']).where(table_df['MP'] > 0)
+    table_df[['MULTI', 'FPPM']] = table_df[['MULTI', 'FPPM']].round(2)
+    table_df['SALARY'] = salary.where(salary > 0)
+    filled = ['MP', 'AVG_DFS', 'FPPM'] + form_cols
+    table_df[filled] = table_df[filled].fillna(0)
     
     # re-ordering table
-    table_df = (table_df[['player', 'Team', 'MP', 'AVG_DFS', 'FPPM', 
-                         'SALARY', 'MULTI']]
+    table_df = (table_df[['player', 'Team', 'MP', 'AVG_DFS'] + form_cols
+                         + ['FPPM', 'SALARY', 'MULTI']]
                 .rename({'AVG_DFS': 'AVG'}, axis=1))
     
     return table_df
 
-def calculate_team_dfs_scores(df):
-    """
-    get team level dfs scores
-    """
-    # column subset to get dfs totals
-    calc_cols = ['PTS', '3P', 'TRB', 'AST', 'STL', 'BLK', 'TOV']
-    # converting to floats for calculation
-    df[calc_cols] = df[calc_cols].astype(float)
-    # scoring dict to apply to dataframe
-    score_dict = {'PTS': 1, '3P': 0.5, 'TRB': 1.25, 'AST': 1.5, 
-                  'STL': 2, 'BLK': 2, 'TOV': -0.5}
-    # calculating DFS scoring
-    for col in calc_cols:
-        df[col] *= score_dict[col]
-    # returning dataframe with dfs variables only
-    dfs_cols = ['team_name', 'MP', 'PTS', '3P', 
-                'TRB', 'AST', 'STL', 'BLK', 'TOV']
-    dfs_df = df[dfs_cols]
-    # aggregating total DFS score
-    dfs_df['TOT_DFS'] = dfs_df.sum(axis=1)
-    dfs_df['TOT_DFS'] = dfs_df['TOT_DFS'] - dfs_df['MP']
+def get_form_graph_data(conn, date, boxscore_df, metric):
+    """
+    Gets a stored form metric of the slate's players after each of their
+    games, ie dfs_avg_3, with the player names of the slate boxscores.
+    """
+    season = get_season(pd.to_datetime(date))
+    players = boxscore_df[['player_id', 'player']].drop_duplicates('player_id')
+    form_df = get_player_form(conn, season, players['player_id'], [metric])
+    form_df = form_df.merge(players, on='player_id')
+    
+    return form_df[['date', 'player', metric]]
+
+def calculate_team_dfs_scores(df, ruleset=DEFAULT_RULESET):
+    """
+    get team level dfs scores per game, the sum of the team's player scores
+    """
+    dfs_df = df[['team_name', 'unique_id', 'MP']].copy()
+    dfs_df['TOT_DFS'] = score_dfs(df, ruleset)
+    dfs_df = (dfs_df.groupby(['team_name', 'unique_id']).sum()
+              .reset_index())
     
     return dfs_df
 
@@ -193,14 +165,82 @@ def calculate_team_dfs_avg(df):
     return avg_df
 
 def aggregate_team_dfs(boxscore_df):
-    boxscore_df = reformat_minutes_played(boxscore_df)
-    calc_df = (boxscore_df.groupby(['team_name', 'unique_id']).sum()
-               .reset_index())
-    dfs_df = calculate_team_dfs_scores(calc_df)
+    dfs_df = calculate_team_dfs_scores(boxscore_df)
     dfs_avg = calculate_team_dfs_avg(dfs_df)
     dfs_avg.rename({'team_name': 'Team'}, axis=1, inplace=True)
     
     return dfs_avg
 
 
-    
\ No newline at end of file
+    
+def get_roster_positions(conn, abbrevs):
+    """
+    Returns the roster position of each player of the teams by their
+    player id.
+    """
+    marks = ', '.join('?' for _ in abbrevs)
+    q = f"""
+    select player_id, Pos as pos, team from rosters
+    where team in ({marks})
+    """
+    try:
+        rosters = pd.read_sql(q, conn, params=list(abbrevs))
+    except (pd.io.sql.DatabaseError, sqlite3.Error):
+        rosters = pd.DataFrame(columns=['player_id', 'pos', 'team'])
+
+    return rosters.drop_duplicates(subset='player_id')
+
+def get_optimizer_pool(conn, date=None, schedule=None):
+    """
+    Gets the player pool of the specified date's slate for the lineup
+    optimizer, the season DFS average of each player as their projection
+    along with their salary and position. Positions are the ones listed with
+    the salaries, or else the players' roster positions. Players without a
+    salary are left out.
+    """
+    if not date:
+        date = dt.date.today().strftime('%Y-%m-%d')
+    abbrevs = get_slate_abbrevs(conn, date, schedule)
+    season = get_season(pd.to_datetime(date))
+    summary = get_player_summary(conn, season, abbrevs)
+    salaries = get_salaries(conn, date)[['player_id', 'salary', 'pos']]
+    salaries = salaries[salaries['salary'] > 0]
+    pool = (summary.rename({'abbrev': 'team', 'AVG_DFS': 'proj'}, axis=1)
+            .merge(salaries, on='player_id', how='inner'))
+    rosters = get_roster_positions(conn, abbrevs)
+    pool = pool.merge(rosters[['player_id', 'pos']], on='player_id',
+                      how='left', suffixes=('', '_roster'))
+    pool['pos'] = pool['pos'].fillna(pool.pop('pos_roster'))
+    pool = pool.dropna(subset=['pos'])
+    # players of a game share its label, ie DEN@NYK, the slate lists the
+    # away teams followed by the home teams
+    half = len(abbrevs) // 2
+    games = {}
+    for away, home in zip(abbrevs[:half], abbrevs[half:]):
+        games[away] = games[home] = f'{away}@{home}'
+    pool['game'] = pool['team'].map(games)
+    
+    return pool[['player_id', 'player', 'team', 'pos', 'salary', 'proj',
+                 'game']].reset_index(drop=True)
+
+def build_lineup_table(pool, n=20, locks=(), excludes=(), max_exposure=None,
+                       min_unique=1, boxscore_df=None, n_sims=10000,
+                       max_nodes=LINEUP_NODES):
+    """
+    Optimizes lineups of the player pool, returning one row per lineup with
+    the player of each slot and the exposure of every player used. When the
+    slate's season boxscores are passed the lineups are simulated against
+    each other for their chance to win and to cash. The search stops after
+    max_nodes nodes, so fewer than n lineups may come back.
+    """
+    lineups = optimize_lineups(pool, n=n, locks=locks, excludes=excludes,
+                               max_exposure=max_exposure,
+                               min_unique=min_unique, max_nodes=max_nodes)
+    table_df = summarize_lineups(lineups)
+    exposure_df = get_exposures(lineups) if not lineups.empty else None
+    if boxscore_df is not None and len(table_df) > 1:
+        _, sim_df = simulate_slate(boxscore_df, lineups, n_sims=n_sims)
+        table_df['Win %'] = (sim_df['win'] * 100).round(1).to_numpy()
+        table_df['Cash %'] = (sim_df['cash'] * 100).round(1).to_numpy()
+    
+    return table_df, exposure_df
@@ -0,0 +1,80 @@
+# Server side store of the season boxscores of a slate. Callbacks pass a
+# small slate key through the browser and read the frames from here instead
+# of shipping every boxscore row as JSON.
+
+import threading
+from collections import OrderedDict
+import callbacks as cb
+from stat_scrapper.refresh import get_refresh_version
+from stat_scrapper.schedule import Schedule
+
+# slates kept in memory, the least recently used is evicted first
+MAX_SLATES = 16
+
+class SlateStore:
+    """
+    LRU store of slate boxscores keyed by (date, refresh version). A key
+    missing from the store, ie after eviction or on another worker, is
+    loaded again from the database through the connection manager passed.
+    The stored schedule is held along with them and read again once the
+    data is refreshed.
+    """
+
+    def __init__(self, connections, max_slates=MAX_SLATES):
+        self.connections = connections
+        self.max_slates = max_slates
+        self._frames = OrderedDict()
+        self._schedule = (None, None)
+        self._lock = threading.Lock()
+
+    def get_key(self, date):
+        """
+        Returns the key of a date's slate under the latest data refresh.
+        """
+        version = get_refresh_version(self.connections.reader())
+
+        return {'date': str(date)[:10], 'version': version}
+
+    def get_schedule(self, key=None):
+        """
+        Returns the schedule of the refresh version of the slate key, or of
+        the latest refresh when not passed.
+        """
+        conn = self.connections.reader()
+        version = (key['version'] if key is not None
+                   else get_refresh_version(conn))
+        with self._lock:
+            if self._schedule[0] != version:
+                self._schedule = (version, Schedule.from_db(conn))
+
+            return self._schedule[1]
+
+    def _load(self, key):
+        conn = self.connections.reader()
+
+        return cb.get_today_player_stats(conn, date=key['date'],
+                                         schedule=self.get_schedule(key))
+
+    def get(self, key):
+        """
+        Returns the boxscores of the slate key, loading them on a miss. The
+        stored frame is shared so callers copy it before changing it.
+        """
+        slate = (key['date'], key['version'])
+        with self._lock:
+            if slate in self._frames:
+                self._frames.move_to_end(slate)
+                return self._frames[slate]
+        df = self._load(key)
+        with self._lock:
+            self._frames[slate] = df
+            self._frames.move_to_end(slate)
+            while len(self._frames) > self.max_slates:
+                self._frames.popitem(last=False)
+
+        return df
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._schedule = (None, None)
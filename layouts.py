@@ -56,4 +56,21 @@ player_table = dash_table.DataTable(id='player_table',
                                        'backgroundColor': 'rgb(230, 230, 230)',
                                         'fontWeight': 'bold'
                                         },
-                                    ),
\ No newline at end of file
+                                    ),
+
+lineup_table = dash_table.DataTable(id='lineup_table',
+                                    sort_action="native",
+                                    virtualization=True,
+                                    fixed_rows={'headers': True, 'data': 0},
+                                    style_as_list_view=True,
+                                    style_cell={'padding': '10px'},
+                                    style_data_conditional=[
+                                        {'if': {'row_index': 'odd'},
+                                        'backgroundColor': 'rgb(248, 248, 248)'
+                                        }
+                                        ],
+                                    style_header={
+                                       'backgroundColor': 'rgb(230, 230, 230)',
+                                        'fontWeight': 'bold'
+                                        },
+                                    ),
@@ -0,0 +1,138 @@
+# Instruments the dashboard's Flask server. Every callback request is timed
+# along with the bytes of its inputs and outputs, the metrics of the process
+# are served at /metrics in the Prometheus text format, and when profiling
+# is enabled the next callback requests can be captured with cProfile.
+
+import cProfile
+import os
+import threading
+import time
+from pathlib import Path
+import flask
+from stat_scrapper.metrics import metrics
+
+PROFILE_DIR = Path(__file__).parent / 'db' / 'profiles'
+# set NBA_DFS_PROFILE to 1 to serve /metrics/profile
+PROFILE_ENV = 'NBA_DFS_PROFILE'
+# the path dash posts every callback to
+CALLBACK_PATH = '_dash-update-component'
+
+class RequestProfiler:
+    """
+    Profiles the next requests of a callback, or of any callback, once
+    armed. Each capture is dumped as a pstats file named by its callback,
+    one request at a time as cProfile does not nest.
+    """
+
+    def __init__(self, profile_dir=PROFILE_DIR):
+        self.profile_dir = Path(profile_dir)
+        self.remaining = 0
+        self.callback = None
+        self._busy = False
+        self._lock = threading.Lock()
+
+    def arm(self, requests=1, callback=None):
+        with self._lock:
+            self.remaining = requests
+            self.callback = callback
+
+        return
+
+    def start(self, callback):
+        """
+        Returns a running profiler when the request is to be captured.
+        """
+        with self._lock:
+            if (self._busy or self.remaining <= 0
+                    or self.callback not in (None, callback)):
+                return None
+            self.remaining -= 1
+            self._busy = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        return profiler
+
+    def stop(self, profiler, callback):
+        """
+        Stops a capture and returns the path it was dumped to.
+        """
+        profiler.disable()
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        path = self.profile_dir / (f"{time.strftime('%Y%m%d-%H%M%S')}-"
+                                   f"{callback}.prof")
+        profiler.dump_stats(path)
+        with self._lock:
+            self._busy = False
+
+        return path
+
+def get_callback_names(app):
+    """
+    Returns the function name of each callback by the outputs dash posts.
+    """
+    return {k: getattr(v['callback'], '__name__', k)
+            for k, v in app.callback_map.items()}
+
+def instrument_app(app, profiler=None):
+    """
+    Times the callbacks of a dash app and adds the /metrics route to its
+    server, along with /metrics/profile when profiling is enabled.
+    """
+    server = app.server
+    profiler = profiler or RequestProfiler()
+    names = {}
+
+    @server.before_request
+    def start_timer():
+        if not flask.request.path.endswith(CALLBACK_PATH):
+            return
+        body = flask.request.get_json(silent=True) or {}
+        output = body.get('output', '')
+        # the callback map is complete once the app is serving
+        if output not in names:
+            names.update(get_callback_names(app))
+        flask.g.callback = names.get(output, output)
+        flask.g.started = time.perf_counter()
+        flask.g.profiler = profiler.start(flask.g.callback)
+
+    @server.after_request
+    def record_callback(response):
+        if 'started' not in flask.g:
+            return response
+        callback = flask.g.callback
+        if flask.g.profiler is not None:
+            path = profiler.stop(flask.g.profiler, callback)
+            response.headers['X-Profile'] = path.name
+        metrics.observe('callback_seconds',
+                        time.perf_counter() - flask.g.started,
+                        callback=callback)
+        metrics.observe('callback_request_bytes',
+                        flask.request.content_length or 0, callback=callback)
+        # registered after flask-compress, so the bytes are uncompressed
+        size = (0 if response.direct_passthrough
+                else response.calculate_content_length() or 0)
+        metrics.observe('callback_response_bytes', size, callback=callback)
+        metrics.increment('callback_requests_total', callback=callback,
+                          status=response.status_code)
+
+        return response
+
+    @server.route('/metrics')
+    def serve_metrics():
+        return flask.Response(metrics.render(),
+                              mimetype='text/plain; version=0.0.4')
+
+    if os.environ.get(PROFILE_ENV, '0') == '1':
+        @server.route('/metrics/profile')
+        def arm_profiler():
+            # ie /metrics/profile?requests=3&callback=player_data
+            requests = flask.request.args.get('requests', 1, type=int)
+            callback = flask.request.args.get('callback')
+            profiler.arm(requests, callback)
+            return flask.Response(
+                f"Profiling the next {requests} {callback or 'callback'} "
+                f'requests to {profiler.profile_dir}\n',
+                mimetype='text/plain')
+
+    return profiler
@@ -0,0 +1,138 @@
+# Backfills the boxscores of a range of seasons. Seasons are ingested in a
+# process pool, each into its own staging database checkpointed per game by
+# its ingest ledger, and merged into the main database once done. Run with
+# python -m stat_scrapper.backfill 2015 2021
+
+import argparse
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .db_utils import create_connection
+from .boxscores import MAX_WORKERS, ingest_games
+from .form import rebuild_player_form
+from .schedule import load_schedule
+from .ledger import FAILED
+from .refresh import log_refresh
+from .snapshot import sync_snapshot
+from .http_client import get_http_client
+from .staging import (STAGING_DIR, connect_staging, merge_staging,
+                      remove_staging)
+
+# seasons ingested at the same time, each fetching with its own threads
+MAX_PROCESSES = 2
+# games between the progress lines of a season
+REPORT_EVERY = 25
+
+def format_eta(seconds):
+    """
+    Formats a number of seconds as H:MM:SS.
+    """
+    seconds = int(seconds)
+
+    return f'{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}'
+
+class Progress:
+    """
+    Prints the throughput and ETA of a season's ingest every REPORT_EVERY
+    games, passed to ingest_games as its progress callback.
+    """
+
+    def __init__(self, season, report_every=REPORT_EVERY):
+        self.season = season
+        self.report_every = report_every
+        self.started = time.time()
+
+    def __call__(self, done, total):
+        if done % self.report_every and done != total:
+            return
+        elapsed = time.time() - self.started
+        rate = done / elapsed if elapsed else 0
+        eta = (total - done) / rate if rate else 0
+        print(f'{self.season}: {done}/{total} games, {rate:.2f} games/sec, '
+              f'ETA {format_eta(eta)}', flush=True)
+
+        return
+
+def backfill_season(season, staging_dir=STAGING_DIR, max_workers=MAX_WORKERS,
+                    processes=1):
+    """
+    Ingests a season into its staging database, then computes the form of
+    the whole season at once. Games already ingested by an interrupted run
+    are skipped through the staging ledger. Returns the season, the games
+    ingested and the games left failed.
+    """
+    # every process paces its own requests, so the seasons fetched at the
+    # same time split the rate of each host
+    get_http_client().share(processes)
+    conn = connect_staging(season, staging_dir)
+    try:
+        schedule = load_schedule(season)
+        ingested = ingest_games(conn, season, schedule,
+                                max_workers=max_workers,
+                                progress=Progress(season), form=False)
+        rebuild_player_form(conn, season)
+        failed = conn.execute("""
+        select count(*) from ingest_ledger where season = ? and status = ?""",
+        (int(season), FAILED)).fetchone()[0]
+    finally:
+        conn.close()
+
+    return season, ingested, failed
+
+def backfill(conn: sqlite3.Connection, seasons, processes=MAX_PROCESSES,
+             max_workers=MAX_WORKERS, staging_dir=STAGING_DIR):
+    """
+    Backfills the seasons, up to processes of them at a time, merging each
+    into the main database and its Parquet snapshot once all of them are
+    ingested. Staging databases of seasons left with failed games are kept
+    so a later run retries only those games.
+    """
+    seasons = [int(x) for x in seasons]
+    print(f'Backfilling {len(seasons)} seasons with {processes} processes.')
+    started = time.time()
+    results = []
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(backfill_season, x, staging_dir, max_workers,
+                               processes)
+                   for x in seasons]
+        for done, future in enumerate(as_completed(futures), start=1):
+            season, ingested, failed = future.result()
+            results.append((season, failed))
+            elapsed = time.time() - started
+            eta = elapsed / done * (len(seasons) - done)
+            print(f'Season {season} staged: {ingested} games ingested, '
+                  f'{failed} failed. {done}/{len(seasons)} seasons, '
+                  f'ETA {format_eta(eta)}', flush=True)
+
+    for season, failed in sorted(results):
+        merge_staging(conn, season, staging_dir)
+        if not failed:
+            remove_staging(season, staging_dir)
+        print(f'Season {season} merged.')
+    log_refresh(conn)
+    sync_snapshot(conn, seasons)
+    print(f'Backfill finished in {format_eta(time.time() - started)}.')
+
+    return
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        description='Backfill the boxscores of a range of seasons.')
+    parser.add_argument('first', type=int, help='first season, ie 2015')
+    parser.add_argument('last', type=int, help='last season, ie 2021')
+    parser.add_argument('--processes', type=int, default=MAX_PROCESSES,
+                        help='seasons ingested at the same time')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS,
+                        help='boxscore pages fetched at the same time by '
+                             'each season')
+    parser.add_argument('--db', default='nba_dfs.db',
+                        help='database the seasons are merged into')
+
+    return parser.parse_args(args)
+
+# Main
+if __name__ == "__main__":
+    args = parse_args()
+    with create_connection(args.db) as conn:
+        backfill(conn, range(args.first, args.last + 1),
+                 processes=args.processes, max_workers=args.workers)
@@ -1,153 +1,224 @@
 import pandas as pd
-from bs4 import BeautifulSoup
-import requests
-import numpy as np
-import os
-import datetime as dt
-import calendar
-from .schedule import get_schedule
-from .teams import get_abbrevs
-import numpy as np
-
-def get_std_box_scores(conn, year, abbrev=None, append=False):
-    """
-    Pulls and aggregates boxscores of all games within a year or 
-    of specified team. Pulls standard boxscore of both teams to aggregate
-    together returning one dataframe of all games. Each game is given
-    its own unique id.
-    """
-    sched = get_schedule(year, abbrev)
-    if append:
-        append_q = """
-        select max(date) from boxscores
-        """
-        date = pd.read_sql(append_q, conn)
-        date_formatted = pd.to_datetime(date.values[0])[0]
-        sched = sched[sched.Dates > date_formatted]
-        
-    prepend = 'https://www.basketball-reference.com'
-    
-    
-    links = [prepend + x for x in sched['Box_Score'] if len(x) > 0]
-    dates = [x for x in sched['Dates'][:len(links)]]
-    
-    master_df = pd.DataFrame()
-    for link, date in zip(links, dates):
-        source = requests.get(link)
-        soup = BeautifulSoup(source.content, 'html.parser')
-
-        team_headings = soup.find_all('div', class_='section_heading')
-
-        # getting names of teams tabled
-        team_1 = team_headings[3].text.strip()[:-6].strip()
-        team_2 = team_headings[11].text.strip()[:-6].strip()
-        #handling for if OT changing sequence length
-        ot = None
-        if team_2 == '':
-            team_2 = team_headings[12].text.strip()[:-6]
-            ot = True
-            
-        abbrev_df = get_abbrevs()
-        
-        t1_abbrev = abbrev_df[abbrev_df['team_name'] == team_1]['abbrev'].values[0]
-        t2_abbrev = abbrev_df[abbrev_df['team_name'] == team_2]['abbrev'].values[0]
-        # getting std and adv tables for both teams
-        tables = soup.find_all('table', class_='sortable')
-
-        # getting the columns and players for both teams
-        team_1_std = tables[0]
-        if ot:
-            team_2_std = tables[9]
-        else:
-            team_2_std = tables[8]
-        # 7 and 15 for advanced
-
-        head_1 = []
-        for th in team_1_std.find_all('th'):
-            head_1.append(th.text)
-            
-        head_2 = []
-        for th in team_2_std.find_all('th'):
-            head_2.append(th.text)
-
-        cols = head_1[3:23]
-        t1_players = head_1[23:28] + head_1[49:]
-        t2_players = head_2[23:28] + head_2[49:]
-
-        # getting the table data for both teams
-        t1_df = pd.DataFrame(columns=cols)
-        rows = team_1_std.find_all('tr')
-        for row in rows[2:]:
-            temp_td = row.find_all('td')
-            temp_row = [x.text for x in temp_td]
-            if len(temp_row) < 1:
-                pass
-            else:
-                if len(temp_row) == 1:
-                    temp_row = list(np.repeat(0, 20))
-                temp_ser = pd.Series(temp_row, index=cols)
-                t1_df = t1_df.append(temp_ser, ignore_index=True)
-                
-        t1_df.insert(0, 'player', t1_players)
-
-        t2_df = pd.DataFrame(columns=cols)
-        rows = team_2_std.find_all('tr')
-        for row in rows[2:]:
-            temp_td = row.find_all('td')
-            temp_row = [x.text for x in temp_td]
-            if len(temp_row) < 1:
-                pass
+from .page_cache import get_page
+from .parsing import parse_tables
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .schedule import load_schedule, load_stored_schedule, get_season
+from .teams import get_registry
+from .db_utils import execute_query, upsert_df
+from .ledger import (create_ledger, register_games, get_pending_games,
+                     mark_ingested, mark_failed)
+from .summary import create_summary, update_player_summary
+from .form import (create_player_form, update_player_form,
+                   rebuild_player_form)
+from .players import create_players, update_players
+from .refresh import log_refresh
+from .staging import connect_staging, merge_staging, remove_staging
+from .metrics import timed, count_rows, count_bytes
+
+BBREF_URL = 'https://www.basketball-reference.com'
+# number of boxscore pages fetched at the same time during a season refresh
+MAX_WORKERS = 8
+# standard boxscore stats in the order they are tabled, minutes played are
+# stored as seconds
+STAT_COLUMNS = ['MP_SEC', 'FG', 'FGA', 'FG%', '3P', '3PA', '3P%', 'FT', 'FTA',
+                'FT%', 'ORB', 'DRB', 'TRB', 'AST', 'STL', 'BLK', 'TOV', 'PF',
+                'PTS', '+/-']
+BOXSCORE_COLUMNS = (['game_id', 'player_id', 'player'] + STAT_COLUMNS
+                    + ['season', 'date', 'team_name', 'abbrev', 'unique_id'])
+PCT_COLUMNS = ['FG%', '3P%', 'FT%']
+INT_COLUMNS = [x for x in STAT_COLUMNS if x not in PCT_COLUMNS]
+# data-stat attributes of the STAT_COLUMNS cells
+BOX_STATS = ['mp', 'fg', 'fga', 'fg_pct', 'fg3', 'fg3a', 'fg3_pct', 'ft', 'fta',
+             'ft_pct', 'orb', 'drb', 'trb', 'ast', 'stl', 'blk', 'tov', 'pf',
+             'pts', 'plus_minus']
+# basic boxscore tables are ided by the team, ie box-BRK-game-basic
+BOX_TABLE_ID = r'^box-[A-Z]{3}-game-basic$'
+
+def get_game_id(link):
+    """
+    Returns the basketball-reference id of a game from its boxscore link,
+    ie 202012220BRK.
+    """
+    return link.rsplit('/', 1)[-1].split('.')[0]
+
+def get_player_id(href):
+    """
+    Returns the basketball-reference id of a player from the link to their
+    page, ie youngtr01.
+    """
+    return href.rsplit('/', 1)[-1].split('.')[0]
+
+def minutes_to_seconds(mp):
+    """
+    Converts a MM:SS minutes played string to seconds.
+    """
+    if not mp:
+        return 0
+    mins, _, secs = str(mp).partition(':')
+
+    return int(mins) * 60 + int(secs or 0)
+
+def get_game_box_score(link, date):
+    """
+    Pulls the standard boxscore of both teams of a single game and returns
+    them as a list of records, one per player, in BOXSCORE_COLUMNS order.
+    Only the basic boxscore tables are parsed, found by their id which also
+    carries the team abbreviation. The game is given its own unique id.
+    """
+    with timed('fetch', 'boxscores'):
+        source = get_page(link)
+    count_bytes('boxscores', source)
+    with timed('parse', 'boxscores'):
+        tables = parse_tables(source, BOX_TABLE_ID)
+    if len(tables) != 2:
+        raise ValueError(f'{link} -> Expected 2 boxscore tables, '
+                         f'found {len(tables)}')
+
+    # away team is tabled first
+    registry = get_registry()
+    abbrevs = [registry.abbrev(x.split('-')[1]) for x in tables]
+    game_id = get_game_id(link)
+    season = get_season(date)
+    date = date.strftime('%Y-%m-%d')
+    unique_id = date + ''.join(abbrevs)
+    records = []
+    for abbrev, rows in zip(abbrevs, tables.values()):
+        team = registry.name(abbrev)
+        for row in rows:
+            # players that did not play only have a reason cell
+            if 'reason' in row or 'mp' not in row:
+                stats = [0] * len(STAT_COLUMNS)
             else:
-                if len(temp_row) == 1:
-                    temp_row = list(np.repeat(0, 20))
-                temp_ser = pd.Series(temp_row, index=cols)
-                t2_df = t2_df.append(temp_ser, ignore_index=True)
-                
-        t2_df.insert(0, 'player', t2_players)
-
-        t1_df['team_name'] = team_1
-        t2_df['team_name'] = team_2
-
-        agg_df = (pd.concat([t1_df, t2_df], axis=0)
-                  .reset_index()
-                  .drop('index', axis=1))
-        agg_df['date'] = date.strftime('%Y-%m-%d') 
-        agg_df['unique_id'] = (agg_df['date']
-                                + t1_abbrev + t2_abbrev)
-        
-        master_df = master_df.append(agg_df)
-        master_df = master_df[master_df.player != 'Team Totals']
-        master_df.replace('', '0', inplace=True)
-        master_df.iloc[:, 2:-4] = master_df.iloc[: ,2:-4].astype(float)
-        # still need to id why mystery NA appear instead of just dropping.
-        master_df.dropna(inplace=True)
-
-    return master_df
-
-def update_boxscores_table(conn, year, append=False):
-    abbrev_df = get_abbrevs()
-    abbrev_df.rename({'team': 'team_name'}, axis=1, inplace=True)
-    abbrevs = abbrev_df['abbrev']
-    agg_df = pd.DataFrame()
-    for team in abbrevs:
-        print(f'Retrieving: {team}')
-        team_df = get_std_box_scores(conn, year=year, abbrev=team, append=append)
-        agg_df = agg_df.append(team_df)
-    agg_df.drop_duplicates(inplace=True)
-    agg_df.fillna(0, inplace=True)
-    agg_df = agg_df.merge(abbrev_df, on='team_name')
+                stats = [row.get(x, '') for x in BOX_STATS]
+                stats[0] = minutes_to_seconds(stats[0])
+            player_id = get_player_id(row['player_href'])
+            records.append([game_id, player_id, row['player']] + stats
+                           + [season, date, team, abbrev, unique_id])
+
+    return records
+
+def build_box_scores(records):
+    """
+    Builds the boxscore dataframe of a batch of game records in one go,
+    casting the stat columns once. Counting stats are integers while
+    percentages are left null when there were no attempts.
+    """
+    with timed('build', 'boxscores'):
+        box_df = pd.DataFrame(records, columns=BOXSCORE_COLUMNS)
+        box_df[PCT_COLUMNS] = box_df[PCT_COLUMNS].apply(pd.to_numeric,
+                                                        errors='coerce')
+        box_df[INT_COLUMNS] = (box_df[INT_COLUMNS]
+                               .apply(pd.to_numeric, errors='coerce')
+                               .fillna(0)
+                               .astype(int))
+    count_rows('build', 'boxscores', len(box_df))
+
+    return box_df
+
+def get_season_games(schedule, season):
+    """
+    Returns the game id, boxscore url, season and date of every game of a
+    schedule. Boxscore urls follow the date and home team so they are known
+    before the games are played.
+    """
+    sched = schedule.df
+    home = sched['Home/Neutral'].map(get_registry().bbref_abbrev)
+    game_ids = sched['Dates'].dt.strftime('%Y%m%d') + '0' + home
+    linked = sched['Box_Score'].str.len() > 0
+    game_ids[linked] = sched.loc[linked, 'Box_Score'].map(get_game_id)
+    games = pd.DataFrame({'game_id': game_ids,
+                          'url': BBREF_URL + '/boxscores/' + game_ids + '.html',
+                          'season': int(season),
+                          'date': sched['Dates'].dt.strftime('%Y-%m-%d')})
+
+    return games.drop_duplicates(subset='game_id')
+
+def ingest_games(conn, year, schedule, max_workers=MAX_WORKERS, before=None,
+                 progress=None, form=True):
+    """
+    Ingests the games of the league year that are completed but not yet in
+    the ingest ledger as ingested. Games are fetched by up to max_workers
+    threads and each one is upserted together with its ledger entry, so a
+    crashed run resumes from the games left pending or failed. When passed,
+    progress is called with the games done and the games pending after each
+    game. Without form the player form is left to be rebuilt once the whole
+    batch is in. Returns the number of games ingested.
+    """
+    create_ledger(conn)
+    create_summary(conn)
+    create_player_form(conn)
+    create_players(conn)
+    register_games(conn, get_season_games(schedule, year))
+    pending = get_pending_games(conn, year, before=before)
+    if pending.empty:
+        return 0
+    print(f'Retrieving: {len(pending)} games')
+
+    ingested = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(get_game_box_score, game.url,
+                               pd.to_datetime(game.date)): game.game_id
+                   for game in pending.itertuples(index=False)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            game_id = futures[future]
+            try:
+                box_df = build_box_scores(future.result())
+            except Exception as e:
+                print(f'Failed: {game_id} -> {e}')
+                mark_failed(conn, game_id, e)
+                if progress is not None:
+                    progress(done, len(futures))
+                continue
+            # replacing any rows of the game and keeping the player
+            # summaries, form and identities in step within the same
+            # transaction
+            with timed('write', 'boxscores'), conn:
+                old_df = pd.read_sql('select * from boxscores where game_id = ?',
+                                     conn, params=(game_id,))
+                conn.execute('delete from boxscores where game_id = ?',
+                             (game_id,))
+                upsert_df(box_df, 'boxscores', conn)
+                update_player_summary(conn, box_df, old_df)
+                if form:
+                    update_player_form(conn, box_df, old_df)
+                update_players(conn, box_df)
+                mark_ingested(conn, game_id, len(box_df))
+            count_rows('write', 'boxscores', len(box_df))
+            ingested += 1
+            if progress is not None:
+                progress(done, len(futures))
+
+    return ingested
+
+def update_boxscores_table(conn, year, append=False, max_workers=MAX_WORKERS):
+    """
+    Pulls the boxscores of the league year into the boxscores table. With
+    append only the completed games missing from the ingest ledger are
+    fetched, using the stored schedule, each game committed on its own.
+    Otherwise the schedule is pulled again and the whole year is ingested
+    into a staging database, then swapped in within one transaction so
+    readers never see the year half loaded. Rows are upserted on
+    (game_id, player_id).
+    """
+    execute_query('create_boxscore_table.sql', conn)
+    create_ledger(conn)
     if append:
-        agg_df.to_sql('boxscores', conn, if_exists='append', index=False)
+        schedule = load_stored_schedule(conn, year)
+        ingested = ingest_games(conn, year, schedule, max_workers=max_workers)
     else:
-        agg_df.to_sql('boxscores', conn, if_exists='replace', index=False)
-    refresh = pd.DataFrame([dt.date.today()], columns=['date'])
-    refresh.to_sql('refresh_log', conn, if_exists='replace')
+        schedule = load_schedule(year)
+        remove_staging(year)
+        staging = connect_staging(year)
+        try:
+            ingested = ingest_games(staging, year, schedule,
+                                    max_workers=max_workers, form=False)
+            rebuild_player_form(staging, year)
+        finally:
+            staging.close()
+        merge_staging(conn, year)
+        remove_staging(year)
+    print(f'Ingested {ingested} games.')
+    log_refresh(conn)
     print('Boxscores succesfully updated.')
-    
-    return
-    
 
-
-    
-    
-    
\ No newline at end of file
+    return
@@ -1,14 +1,271 @@
 import sqlite3
 import pandas as pd
 from pathlib import Path
+import threading
 import time
 import os
+from contextlib import contextmanager
 
-QUERY_DIR = Path('sql')
+QUERY_DIR = Path(__file__).parent / 'sql'
+DB_DIR = Path(__file__).parent.parent / 'db'
+# seconds a connection waits on a lock held by the refresh before failing
+BUSY_TIMEOUT = 30
+# applied to every connection, the page cache is in KiB when negative
+PRAGMAS = {
+    'mmap_size': 256 * 1024 ** 2,
+    'cache_size': -64 * 1024,
+    'temp_store': 'memory',
+    'synchronous': 'normal',
+}
+
+class QueryRegistry:
+    """
+    The queries of the sql folder, read from disk once and looked up by
+    file name, ie create_boxscore_table.sql.
+    """
+
+    def __init__(self, query_dir=QUERY_DIR):
+        self.query_dir = Path(query_dir)
+        self._queries = None
+        self._names = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._queries is None:
+                queries = {x.name: x.read_text()
+                           for x in sorted(self.query_dir.glob('*.sql'))}
+                self._names = {normalize_sql(v): k for k, v in queries.items()}
+                self._queries = queries
+
+        return self._queries
+
+    def get(self, name):
+        return (self._queries or self._load()).get(Path(name).name)
+
+    def name_of(self, query):
+        """
+        Returns the file name of a registered query, or None.
+        """
+        self._queries or self._load()
+
+        return self._names.get(normalize_sql(query))
+
+queries = QueryRegistry()
+
+def normalize_sql(query):
+    return ' '.join(str(query).split())
+
+class QueryStats:
+    """
+    Count, total and slowest seconds of every query run through a managed
+    connection, keyed by the query file name or the start of the query.
+    """
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query):
+        return queries.name_of(query) or normalize_sql(query)[:80]
+
+    def record(self, key, seconds, count=1):
+        with self._lock:
+            runs, total, slowest = self._stats.get(key, (0, 0.0, 0.0))
+            self._stats[key] = (runs + count, total + seconds,
+                                max(slowest, seconds))
+
+        return
+
+    def to_df(self):
+        with self._lock:
+            rows = [(k, *v) for k, v in self._stats.items()]
+        df = pd.DataFrame(rows, columns=['query', 'count', 'total_sec',
+                                         'max_sec'])
+        df['mean_sec'] = df['total_sec'] / df['count']
+
+        return df.sort_values(by='total_sec', ascending=False)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+        return
+
+query_stats = QueryStats()
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor recording the time of each statement in query_stats, fetching
+    the rows counted towards the statement run last.
+    """
+
+    def execute(self, sql, parameters=()):
+        self._key = QueryStats.key(sql)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            query_stats.record(self._key, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._key = QueryStats.key(sql)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            query_stats.record(self._key, time.perf_counter() - start)
+
+    def fetchall(self):
+        start = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            query_stats.record(getattr(self, '_key', 'fetch'),
+                               time.perf_counter() - start, count=0)
+
+class TimedConnection(sqlite3.Connection):
+    """
+    Connection whose statements run on a TimedCursor.
+    """
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def get_db_path(db_name):
+    """
+    Returns the absolute path of a database of the db folder.
+    """
+    return os.path.abspath(DB_DIR / db_name)
+
+def apply_pragmas(conn: sqlite3.Connection, read_only=False):
+    """
+    Tunes a connection with PRAGMAS. Writers also make sure the database is
+    in WAL mode, so readers are never blocked by them.
+    """
+    if read_only:
+        conn.execute('pragma query_only = on')
+    else:
+        conn.execute('pragma journal_mode = wal')
+    for pragma, value in PRAGMAS.items():
+        conn.execute(f'pragma {pragma} = {value}')
+
+    return conn
+
+class ConnectionManager:
+    """
+    Connections to one database shared by the threads of a process. Each
+    thread reads through its own read only connection, opened once and
+    kept, while writes go through a single writer connection one thread at
+    a time. Connections opened before a fork are not reused by the child.
+    """
+
+    def __init__(self, db_name):
+        self.path = get_db_path(db_name)
+        self._local = threading.local()
+        self._readers = []
+        self._writer = None
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._write_lock = threading.RLock()
+
+    def _check_fork(self):
+        if os.getpid() != self._pid:
+            with self._lock:
+                self._local = threading.local()
+                self._readers = []
+                self._writer = None
+                self._pid = os.getpid()
+
+        return
+
+    def reader(self) -> sqlite3.Connection:
+        """
+        Returns the read only connection of the calling thread.
+        """
+        self._check_fork()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True,
+                                   timeout=BUSY_TIMEOUT,
+                                   factory=TimedConnection)
+            apply_pragmas(conn, read_only=True)
+            self._local.conn = conn
+            with self._lock:
+                self._readers.append(conn)
+
+        return conn
+
+    @contextmanager
+    def writer(self):
+        """
+        Yields the writer connection, held by one thread at a time. The
+        caller scopes its transactions with the connection.
+        """
+        self._check_fork()
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = sqlite3.connect(self.path,
+                                               timeout=BUSY_TIMEOUT,
+                                               check_same_thread=False,
+                                               factory=TimedConnection)
+                apply_pragmas(self._writer)
+            yield self._writer
+
+    def close(self):
+        """
+        Closes every connection of the manager, threads reading again open
+        new ones.
+        """
+        with self._lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers = []
+            self._local = threading.local()
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+        return
+
+# managers of the databases connected to, keyed by path
+_managers = {}
+_managers_lock = threading.Lock()
+
+def get_manager(db_name='nba_dfs.db') -> ConnectionManager:
+    """
+    Returns the connection manager of a database of the db folder, shared
+    by the whole process.
+    """
+    path = get_db_path(db_name)
+    with _managers_lock:
+        if path not in _managers:
+            _managers[path] = ConnectionManager(db_name)
+
+        return _managers[path]
+
+def read_query(sql_path: str) -> str:
+    """
+    Returns a query of the sql folder from the query registry, other paths
+    are read from disk.
+    """
+    query = queries.get(sql_path)
+    if query is None:
+        with open(sql_path, 'r') as q:
+            query = q.read()
+
+    return query
 
 def sql_to_df(sql_path: str, conn: sqlite3.Connection, params: dict=None):
-    with open(sql_path, 'r') as q:    
-        query = q.read()
+    query = read_query(sql_path)
     if params:
         df = pd.read_sql(query, conn, **params)
     else:
@@ -17,26 +274,58 @@ def sql_to_df(sql_path: str, conn: sqlite3.Connection, params: dict=None):
     return df
 
 def execute_query(sql_path: str, conn=sqlite3.Connection):
-    with open(sql_path, 'r') as q:
-        query = q.read()
+    query = read_query(sql_path)
     try:
-        conn.execute(query)
+        conn.executescript(query)
         print('Query executed.')
     except sqlite3.Error as e:
         print(e)
 
     return
 
+def upsert_df(df: pd.DataFrame, table: str, conn: sqlite3.Connection):
+    """
+    Inserts the rows of a dataframe into an existing table, replacing the rows
+    sharing a primary key.
+    """
+    cols = ', '.join(f'"{x}"' for x in df.columns)
+    marks = ', '.join('?' for _ in df.columns)
+    query = f'insert or replace into {table} ({cols}) values ({marks})'
+    rows = df.astype(object).where(df.notna(), None).itertuples(index=False)
+    conn.executemany(query, rows)
+
+    return
+
+def replace_table(df: pd.DataFrame, table: str, conn: sqlite3.Connection,
+                  indexes=()):
+    """
+    Replaces a table with the rows of a dataframe. The rows are written to a
+    staging table first and swapped in within one transaction, so readers
+    see the old or the new table but never a missing or partial one.
+    indexes are (name, columns) pairs created on the new table.
+    """
+    staging = f'{table}_staging'
+    df.to_sql(staging, conn, if_exists='replace', index=False)
+    with conn:
+        conn.execute('begin immediate')
+        conn.execute(f'drop table if exists {table}')
+        conn.execute(f'alter table {staging} rename to {table}')
+        for name, columns in indexes:
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {name} '
+                         f'ON {table} ({columns})')
+
+    return
+
 def create_connection(db_name: str) -> sqlite3.Connection:
+    """
+    Opens a tuned connection to a database of the db folder in WAL mode, so
+    readers are never blocked by the refresh writing to it. The caller
+    closes it, request handlers read through get_manager instead.
+    """
     try:
-        p_path = Path(__file__).parent.parent
-        write_path = p_path / 'db' / db_name
-        db_file = os.path.abspath(write_path)
-        conn = sqlite3.connect(db_file)
-        return conn
+        conn = sqlite3.connect(get_db_path(db_name), timeout=BUSY_TIMEOUT,
+                               factory=TimedConnection)
+        return apply_pragmas(conn)
     except sqlite3.Error as e:
-        print(e)      
+        print(e)
         return
-    
-    
-    
@@ -7,4 +7,13 @@ class TeamAbbrevError(Exception):
     def __str__(self):
         return f'{self.abbrev} -> Does not exist or not of length 3 characters'
     
-    
\ No newline at end of file
+
+class PageNotCachedError(Exception):
+    
+    def __init__(self, url):
+        self.url = url
+        super().__init__(self.url)
+        
+    def __str__(self):
+        return f'{self.url} -> Not in the page cache while running offline'
+    
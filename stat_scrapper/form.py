@@ -0,0 +1,229 @@
+# Rolling and exponentially weighted form of every player after each game,
+# stored one row per (player, game, metric) as games are ingested so the
+# dashboard reads form without recomputing it.
+
+import sqlite3
+import pandas as pd
+from .db_utils import execute_query, upsert_df
+from .scoring import score_dfs
+
+# games averaged by the rolling form metrics, ie dfs_avg_3
+FORM_WINDOWS = [3, 5, 10]
+# weight of the latest game in the exponentially weighted form, ie dfs_ewma
+EWMA_ALPHA = 0.25
+# stats the form is tracked for, dfs points and minutes played
+FORM_STATS = ['dfs', 'mp']
+FORM_COLUMNS = ['season', 'player_id', 'game_id', 'date', 'metric', 'value']
+
+def create_player_form(conn: sqlite3.Connection):
+    execute_query('create_player_form_table.sql', conn)
+
+    return
+
+def get_metrics(windows=FORM_WINDOWS):
+    """
+    Returns the names of the form metrics of the windows, the rolling
+    averages followed by the ewma of each stat.
+    """
+    metrics = [f'{stat}_avg_{n}' for stat in FORM_STATS for n in windows]
+
+    return metrics + [f'{stat}_ewma' for stat in FORM_STATS]
+
+def get_ewma(values, groups, prior=None, alpha=EWMA_ALPHA):
+    """
+    Returns the exponentially weighted mean of the values within each group,
+    as ewm(alpha=alpha, adjust=False).mean(), from a cumulative sum so all
+    the groups are computed at once. The values are ordered within each
+    group. prior holds the mean before the first value of the group, NaN
+    for groups starting fresh.
+    """
+    decay = 1 - alpha
+    position = values.groupby(groups).cumcount()
+    scale = decay ** position
+    first = values.copy()
+    if prior is not None:
+        first = (decay * prior + alpha * values).where(prior.notna(), values)
+    weights = (alpha * values / scale).where(position > 0, first)
+
+    return weights.groupby(groups).cumsum() * scale
+
+def compute_form(box_df, metrics=None, starts=None):
+    """
+    Computes form metrics after every game of the boxscores passed, holding
+    whole seasons of the players. Rolling averages are left out until a
+    player has played the full window. starts, with the season, player_id
+    and date of the first game of each player to compute and their ewma
+    metrics before it, limits the form to the games from then on, the
+    boxscores only needing the games of the longest window before. Returns
+    long rows in FORM_COLUMNS.
+    """
+    metrics = metrics or get_metrics()
+    keys = ['season', 'player_id']
+    games = box_df[keys + ['game_id', 'date']].copy()
+    games['dfs'] = score_dfs(box_df)
+    games['mp'] = box_df['MP_SEC'] / 60
+    games = (games.sort_values(by=keys + ['date', 'game_id'])
+             .reset_index(drop=True))
+    grouped = games.groupby(keys, sort=False)
+    # the stats of a window are rolled together, ie dfs_avg_5 and mp_avg_5
+    windows = {}
+    for metric in metrics:
+        stat, kind = metric.split('_', 1)
+        if kind != 'ewma':
+            windows.setdefault(int(kind.rsplit('_', 1)[1]), []).append(stat)
+    for n, stats in windows.items():
+        rolled = (grouped[stats].rolling(n, min_periods=n).mean()
+                  .reset_index(level=keys, drop=True))
+        for stat in stats:
+            games[f'{stat}_avg_{n}'] = rolled[stat]
+    if starts is not None:
+        games = games.merge(starts, on=keys, suffixes=('', '_start'))
+        games = (games[games['date'] >= games.pop('date_start')]
+                 .sort_values(by=keys + ['date', 'game_id'])
+                 .reset_index(drop=True))
+    groups = [games[x] for x in keys]
+    for metric in metrics:
+        stat, kind = metric.split('_', 1)
+        if kind != 'ewma':
+            continue
+        prior = games[metric] if metric in games else None
+        games[metric] = get_ewma(games[stat], groups, prior)
+    form_df = games.melt(id_vars=['season', 'player_id', 'game_id', 'date'],
+                         value_vars=metrics, var_name='metric',
+                         value_name='value')
+
+    return form_df.dropna(subset=['value'])[FORM_COLUMNS]
+
+def get_form_starts(conn: sqlite3.Connection, season, starts_df):
+    """
+    Returns the boxscores the form of the players is computed from, their
+    games from the start date on and the games of the longest window before
+    it, along with the starts and the ewma metrics after the game before.
+    """
+    values = ', '.join('(?, ?)' for _ in range(len(starts_df)))
+    params = [x for row in starts_df[['player_id', 'date']].itertuples(
+              index=False) for x in row]
+    box_df = pd.read_sql(f"""
+    with starts (player_id, start) as (values {values})
+    select * from (
+        select b.*,
+               row_number() over (partition by b.player_id
+                                  order by b.date desc, b.game_id desc) as rn
+        from boxscores b join starts s on b.player_id = s.player_id
+        where b.season = ? and b.date < s.start
+    )
+    where rn < ?
+    union all
+    select b.*, 0 as rn
+    from boxscores b join starts s on b.player_id = s.player_id
+    where b.season = ? and b.date >= s.start
+    """, conn, params=params + [int(season), max(FORM_WINDOWS),
+                                int(season)])
+    ewma = [f'{stat}_ewma' for stat in FORM_STATS]
+    marks = ', '.join('?' for _ in ewma)
+    prior = pd.read_sql(f"""
+    with starts (player_id, start) as (values {values})
+    select player_id, metric, value from (
+        select f.player_id,
+               f.metric,
+               f.value,
+               row_number() over (partition by f.player_id, f.metric
+                                  order by f.date desc, f.game_id desc) as rn
+        from player_form f join starts s on f.player_id = s.player_id
+        where f.season = ? and f.metric in ({marks}) and f.date < s.start
+    )
+    where rn = 1
+    """, conn, params=params + [int(season)] + ewma)
+    prior = (prior.pivot(index='player_id', columns='metric', values='value')
+             .reindex(columns=ewma).reset_index())
+    prior.columns.name = None
+    starts_df = starts_df.merge(prior, on='player_id', how='left')
+
+    return box_df.drop('rn', axis=1), starts_df
+
+def update_player_form(conn: sqlite3.Connection, new_df, old_df=None):
+    """
+    Updates the form of the players of newly ingested games. Only the form
+    after the earliest new game of each player is written again, later games
+    ingested earlier included, carried on from the games of the longest
+    window and the stored ewma before it. Run inside the transaction writing
+    the boxscores, which already hold the new rows.
+    """
+    frames = [new_df] if old_df is None else [new_df, old_df]
+    changed = pd.concat(frames)
+    if changed.empty:
+        return
+    # form rows of players dropped from a game ingested again go with it
+    conn.executemany('delete from player_form where game_id = ?',
+                     [(x,) for x in changed['game_id'].unique()])
+    starts = changed.groupby(['season', 'player_id'])['date'].min()
+    for season, starts_df in starts.reset_index().groupby('season'):
+        box_df, starts_df = get_form_starts(conn, season, starts_df)
+        form_df = compute_form(box_df, starts=starts_df)
+        if not form_df.empty:
+            upsert_df(form_df, 'player_form', conn)
+
+    return
+
+def rebuild_player_form(conn: sqlite3.Connection, season, metrics=None):
+    """
+    Computes the form of a whole season from the boxscores table. Passing
+    metrics, ie ['dfs_avg_7'], only computes and replaces those, so new
+    windows are added without touching the others.
+    """
+    create_player_form(conn)
+    metrics = metrics or get_metrics()
+    box_df = pd.read_sql('select * from boxscores where season = ?', conn,
+                         params=(int(season),))
+    form_df = compute_form(box_df, metrics)
+    marks = ', '.join('?' for _ in metrics)
+    with conn:
+        conn.execute(f"""
+        delete from player_form where season = ? and metric in ({marks})""",
+        [int(season)] + metrics)
+        upsert_df(form_df, 'player_form', conn)
+
+    return
+
+def get_player_form(conn: sqlite3.Connection, season, player_ids, metrics):
+    """
+    Returns the form metrics of the players after each of their games, one
+    column per metric.
+    """
+    player_ids = list(player_ids)
+    metrics = list(metrics)
+    id_marks = ', '.join('?' for _ in player_ids)
+    metric_marks = ', '.join('?' for _ in metrics)
+    q = f"""
+    select player_id, game_id, date, metric, value from player_form
+    where season = ? and player_id in ({id_marks})
+    and metric in ({metric_marks})
+    """
+    form_df = pd.read_sql(q, conn, params=[int(season)] + player_ids
+                          + metrics)
+    form_df = (form_df.pivot_table(index=['player_id', 'game_id', 'date'],
+                                   columns='metric', values='value')
+               .reset_index())
+    form_df.columns.name = None
+
+    return form_df.sort_values(by=['player_id', 'date'])
+
+def get_latest_form(conn: sqlite3.Connection, season, date, metric):
+    """
+    Returns each player's latest value of a form metric from the games
+    played before the date.
+    """
+    q = """
+    select player_id, value from (
+        select player_id,
+               value,
+               row_number() over (partition by player_id
+                                  order by date desc, game_id desc) as rn
+        from player_form
+        where season = ? and metric = ? and date < ?
+    )
+    where rn = 1
+    """
+    date = pd.to_datetime(date).strftime('%Y-%m-%d')
+
+    return pd.read_sql(q, conn, params=(int(season), metric, date))
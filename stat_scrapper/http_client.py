@@ -0,0 +1,262 @@
+# The HTTP client every scraper fetches through, by way of the page cache.
+# One keep-alive session pools the connections to each host, every host is
+# paced by a token bucket that backs off on 429s and creeps back up as
+# requests succeed, and failed requests are retried with jittered
+# exponential backoff.
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from .metrics import metrics
+
+# sustained requests per second allowed by host, matched on the end of the
+# host name. basketball-reference jails clients going over 20 a minute.
+HOST_RATES = {
+    'basketball-reference.com': 19 / 60,
+    'fantasypros.com': 1,
+    'wikipedia.org': 5,
+}
+DEFAULT_RATE = 2
+# floor of the rate of a host once throttled
+MIN_RATE = 1 / 120
+# share of the allowed rate won back by each successful request
+RECOVERY = 0.05
+# seconds to connect and to wait between bytes of the response
+TIMEOUT = (5, 30)
+MAX_RETRIES = 4
+# seconds of the first backoff, doubled each retry up to MAX_BACKOFF
+BACKOFF = 2
+MAX_BACKOFF = 120
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# connections kept alive per host, one per boxscore worker
+POOL_SIZE = 8
+HEADERS = {
+    'User-Agent': 'nba_daily_fantasy stat scrapper',
+    'Accept-Encoding': 'gzip, deflate',
+}
+
+def get_host_rate(host):
+    """
+    Returns the requests per second allowed to a host.
+    """
+    for suffix, rate in HOST_RATES.items():
+        if host == suffix or host.endswith('.' + suffix):
+            return rate
+
+    return DEFAULT_RATE
+
+def parse_retry_after(value):
+    """
+    Returns the seconds of a Retry-After header, given in seconds or as an
+    http date, or None when missing or malformed.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def get_backoff(attempt, backoff=BACKOFF, max_backoff=MAX_BACKOFF):
+    """
+    Returns the seconds to wait before a retry, a random share of an
+    exponential backoff (full jitter) so threads do not retry in step.
+    """
+    return random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+
+class TokenBucket:
+    """
+    Paces the requests to a host at up to max_rate per second, with bursts
+    of up to capacity. A throttled host halves its rate and holds every
+    request until the Retry-After has passed, then each success wins back a
+    share of max_rate.
+    """
+
+    def __init__(self, max_rate, capacity=1):
+        self.base_rate = max_rate
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.blocked_until = 0.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = max(0.0, now - max(self.updated, self.blocked_until))
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = max(now, self.updated)
+
+    def acquire(self):
+        """
+        Blocks until a request can be sent, returns the seconds waited.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = max(self.blocked_until - now,
+                            (1 - self.tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def throttle(self, retry_after=None):
+        """
+        Halves the rate after a 429 and holds requests for retry_after
+        seconds, or for one request at the new rate.
+        """
+        with self._lock:
+            self.rate = max(MIN_RATE, min(self.rate, self.max_rate) / 2)
+            hold = retry_after if retry_after is not None else 1 / self.rate
+            self.blocked_until = max(self.blocked_until,
+                                     time.monotonic() + hold)
+            self.tokens = 0
+
+        return
+
+    def recover(self):
+        with self._lock:
+            self.rate = min(self.max_rate,
+                            self.rate + self.max_rate * RECOVERY)
+
+        return
+
+    def share(self, parts):
+        """
+        Splits the rate of the host between parts processes.
+        """
+        with self._lock:
+            self.max_rate = self.base_rate / parts
+            self.rate = min(self.rate, self.max_rate)
+
+        return
+
+class HttpClient:
+    """
+    Keep-alive session shared by the scraper threads, sending each request
+    through the token bucket of its host. Connection errors, timeouts and
+    429 or 5xx responses are retried up to max_retries times, after the
+    Retry-After of the response when given and a jittered backoff otherwise.
+    The last response is returned once out of retries, so its status is
+    raised by the caller.
+    """
+
+    def __init__(self, timeout=TIMEOUT, max_retries=MAX_RETRIES,
+                 pool_size=POOL_SIZE):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        # retries are handled here so every attempt is paced and counted
+        adapter = HTTPAdapter(pool_connections=len(HOST_RATES) + 1,
+                              pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.buckets = {}
+        self._share = 1
+        self._lock = threading.Lock()
+
+    def get_bucket(self, host):
+        with self._lock:
+            if host not in self.buckets:
+                bucket = TokenBucket(get_host_rate(host))
+                if self._share > 1:
+                    bucket.share(self._share)
+                self.buckets[host] = bucket
+
+            return self.buckets[host]
+
+    def share(self, parts):
+        """
+        Splits the rate of every host between parts processes, ie the
+        seasons of a backfill fetched at the same time.
+        """
+        with self._lock:
+            self._share = parts
+            buckets = list(self.buckets.values())
+        for bucket in buckets:
+            bucket.share(parts)
+
+        return
+
+    def get(self, url, headers=None):
+        """
+        Returns the response of a GET of the url, retrying failed attempts.
+        """
+        host = urlsplit(url).netloc
+        bucket = self.get_bucket(host)
+        attempt = 0
+        while True:
+            waited = bucket.acquire()
+            if waited:
+                metrics.observe('http_wait_seconds', waited, host=host)
+            try:
+                with metrics.time('http_request_seconds', host=host):
+                    response = self.session.get(url, headers=headers,
+                                                timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                reason = type(e).__name__
+                delay = get_backoff(attempt)
+            else:
+                if response.status_code == 429:
+                    retry_after = parse_retry_after(
+                        response.headers.get('Retry-After'))
+                    # without a Retry-After the host is held for a backoff
+                    bucket.throttle(retry_after if retry_after is not None
+                                    else get_backoff(attempt))
+                    metrics.increment('http_throttled_total', host=host)
+                elif response.status_code not in RETRY_STATUSES:
+                    bucket.recover()
+                    return response
+                if attempt >= self.max_retries:
+                    return response
+                reason = str(response.status_code)
+                # 429s wait in the bucket, which holds every thread
+                delay = (0 if response.status_code == 429
+                         else get_backoff(attempt))
+                response.close()
+            metrics.increment('http_retries_total', host=host, reason=reason)
+            print(f'Retrying {url} -> {reason}, attempt {attempt + 1} of '
+                  f'{self.max_retries}')
+            time.sleep(delay)
+            attempt += 1
+
+# client shared by all the scrapers, created on first use
+_http_client = None
+_client_lock = threading.Lock()
+
+def get_http_client():
+    """
+    Returns the http client shared by the scrapers of the process.
+    """
+    global _http_client
+    with _client_lock:
+        if _http_client is None:
+            _http_client = HttpClient()
+
+    return _http_client
+
+def set_http_client(client):
+    """
+    Shares the passed http client with the scrapers in place of the default
+    one.
+    """
+    global _http_client
+    with _client_lock:
+        _http_client = client
+
+    return
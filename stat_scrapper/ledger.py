@@ -0,0 +1,95 @@
+# Tracks the ingest status of every game so boxscore updates only fetch the
+# games not yet stored and pick up where a failed run stopped.
+
+import sqlite3
+import datetime as dt
+import pandas as pd
+from .db_utils import execute_query
+
+PENDING = 'pending'
+INGESTED = 'ingested'
+FAILED = 'failed'
+
+def create_ledger(conn: sqlite3.Connection):
+    execute_query('create_ingest_ledger_table.sql', conn)
+
+    return
+
+def register_games(conn: sqlite3.Connection, games: pd.DataFrame):
+    """
+    Adds games (game_id, url, season, date) to the ledger as pending. Games
+    already in the ledger keep their status, while games of the same
+    seasons never ingested that are no longer scheduled, ie postponed
+    games moved to another date and game id, are dropped.
+    """
+    q = """
+    insert or ignore into ingest_ledger (game_id, url, season, date, status)
+    values (?, ?, ?, ?, ?)
+    """
+    rows = [(x.game_id, x.url, int(x.season), x.date, PENDING)
+            for x in games.itertuples(index=False)]
+    scheduled = set(games['game_id'])
+    with conn:
+        conn.executemany(q, rows)
+        for season in games['season'].unique():
+            ids = [x[0] for x in conn.execute("""
+            select game_id from ingest_ledger
+            where season = ? and status in (?, ?)""",
+            (int(season), PENDING, FAILED))]
+            conn.executemany('delete from ingest_ledger where game_id = ?',
+                             [(x,) for x in ids if x not in scheduled])
+
+    return
+
+def get_pending_games(conn: sqlite3.Connection, season, before=None):
+    """
+    Returns the games of a season played before the passed date (today by
+    default) that are not ingested yet, pending and failed alike.
+    """
+    if before is None:
+        before = dt.date.today().strftime('%Y-%m-%d')
+    q = """
+    select game_id, url, season, date, status
+    from ingest_ledger
+    where season = ? and date < ? and status != ?
+    order by date, game_id
+    """
+
+    return pd.read_sql(q, conn, params=(int(season), before, INGESTED))
+
+def mark_ingested(conn: sqlite3.Connection, game_id, row_count):
+    """
+    Flags a game as ingested. Run inside the transaction writing its rows.
+    """
+    q = """
+    update ingest_ledger
+    set status = ?, fetched_at = ?, row_count = ?, error = null
+    where game_id = ?
+    """
+    conn.execute(q, (INGESTED, dt.datetime.now().isoformat(timespec='seconds'),
+                     row_count, game_id))
+
+    return
+
+def mark_failed(conn: sqlite3.Connection, game_id, error):
+    q = """
+    update ingest_ledger
+    set status = ?, fetched_at = ?, error = ?
+    where game_id = ?
+    """
+    with conn:
+        conn.execute(q, (FAILED,
+                         dt.datetime.now().isoformat(timespec='seconds'),
+                         str(error), game_id))
+
+    return
+
+def clear_season(conn: sqlite3.Connection, season):
+    """
+    Forgets every game of a season so it is ingested again.
+    """
+    with conn:
+        conn.execute('delete from ingest_ledger where season = ?',
+                     (int(season),))
+
+    return
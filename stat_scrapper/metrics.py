@@ -0,0 +1,167 @@
+# Timings and counts of the pipeline stages, ie the fetch, parse, build and
+# write of each scraper, kept in memory by the process and rendered in the
+# Prometheus text format along with the query stats of the managed
+# connections. The dashboard serves them at /metrics.
+
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
+from .db_utils import query_stats
+
+PREFIX = 'nba_dfs'
+# help text of every metric, summaries end in _seconds or _bytes
+METRIC_HELP = {
+    'stage_seconds': 'Seconds spent in each stage of a scraper.',
+    'stage_rows_total': 'Rows produced by each stage of a scraper.',
+    'stage_bytes_total': 'Bytes of the pages fetched by a scraper.',
+    'page_cache_requests_total': 'Page cache lookups by their outcome.',
+    'http_request_seconds': 'Seconds of the requests sent to each host.',
+    'http_wait_seconds': 'Seconds requests waited on the rate of a host.',
+    'http_retries_total': 'Requests retried by host and reason.',
+    'http_throttled_total': 'Requests answered 429 by each host.',
+    'refresh_seconds': 'Seconds of each database refresh.',
+    'callback_seconds': 'Seconds of each dashboard callback request.',
+    'callback_request_bytes': 'Bytes of the inputs sent to a callback.',
+    'callback_response_bytes': 'Bytes of the outputs of a callback.',
+    'callback_requests_total': 'Callback requests by their status code.',
+    'query_seconds': 'Seconds of the sqlite statements by query.',
+}
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+def _labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+
+    return '{' + pairs + '}'
+
+class Metrics:
+    """
+    Summaries (count, sum and max of the values observed) and counters of
+    the process, keyed by the metric name and its labels.
+    """
+
+    def __init__(self):
+        self._summaries = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            count, total, largest = self._summaries.get(key, (0, 0.0, 0.0))
+            self._summaries[key] = (count + 1, total + value,
+                                    max(largest, value))
+
+        return
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+        return
+
+    @contextmanager
+    def time(self, name, **labels):
+        """
+        Observes the seconds spent in the block, failed blocks included.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def to_df(self, name='stage_seconds'):
+        """
+        Returns the count, total, mean and max of a summary by its labels.
+        """
+        with self._lock:
+            rows = [(dict(labels), *v) for (x, labels), v
+                    in self._summaries.items() if x == name]
+        df = pd.DataFrame([{**labels, 'count': count, 'total': total,
+                            'max': largest}
+                           for labels, count, total, largest in rows])
+        if df.empty:
+            return df
+        df['mean'] = df['total'] / df['count']
+
+        return df.sort_values(by='total', ascending=False)
+
+    def render(self):
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            summaries = dict(self._summaries)
+            counters = dict(self._counters)
+        # statements are timed by db_utils, keyed by query
+        for x in query_stats.to_df().itertuples(index=False):
+            key = ('query_seconds', (('query', x.query),))
+            summaries[key] = (x.count, x.total_sec, x.max_sec)
+
+        lines = []
+        for name in sorted({x[0] for x in summaries}):
+            family = f'{PREFIX}_{name}'
+            series = sorted((k[1], v) for k, v in summaries.items()
+                            if k[0] == name)
+            lines.append(f'# HELP {family} {METRIC_HELP.get(name, name)}')
+            lines.append(f'# TYPE {family} summary')
+            for labels, (count, total, _) in series:
+                lines.append(f'{family}_count{_labels(labels)} {count}')
+                lines.append(f'{family}_sum{_labels(labels)} {total:.6f}')
+            lines.append(f'# TYPE {family}_max gauge')
+            for labels, (_, _, largest) in series:
+                lines.append(f'{family}_max{_labels(labels)} {largest:.6f}')
+        for name in sorted({x[0] for x in counters}):
+            family = f'{PREFIX}_{name}'
+            lines.append(f'# HELP {family} {METRIC_HELP.get(name, name)}')
+            lines.append(f'# TYPE {family} counter')
+            for labels, value in sorted((k[1], v) for k, v in counters.items()
+                                        if k[0] == name):
+                lines.append(f'{family}{_labels(labels)} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._summaries.clear()
+            self._counters.clear()
+
+        return
+
+# metrics of the process, each gunicorn worker serves its own
+metrics = Metrics()
+
+def timed(stage, source):
+    """
+    Times a stage of a scraper, ie timed('parse', 'boxscores').
+    """
+    return metrics.time('stage_seconds', stage=stage, source=source)
+
+def count_rows(stage, source, rows):
+    metrics.increment('stage_rows_total', rows, stage=stage, source=source)
+
+    return
+
+def count_bytes(source, body):
+    metrics.increment('stage_bytes_total', len(body or b''), stage='fetch',
+                      source=source)
+
+    return
+
+def format_stages():
+    """
+    Returns the stage timings as a table, for the logs of a run.
+    """
+    df = metrics.to_df('stage_seconds')
+    if df.empty:
+        return 'No stages timed.'
+    df = df[['source', 'stage', 'count', 'total', 'mean', 'max']]
+
+    return df.round(3).to_string(index=False)
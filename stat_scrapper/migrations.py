@@ -0,0 +1,280 @@
+# Brings databases created by earlier versions of the scrapper up to the
+# current schema. Run with python -m stat_scrapper.migrations
+
+import pandas as pd
+from .db_utils import create_connection, execute_query, upsert_df
+from .boxscores import (BBREF_URL, BOXSCORE_COLUMNS, INT_COLUMNS,
+                        PCT_COLUMNS, minutes_to_seconds)
+from .ledger import create_ledger, INGESTED, PENDING
+from .summary import create_summary, rebuild_player_summary
+from .form import create_player_form, rebuild_player_form
+from .players import name_aliases, rebuild_players
+from .rosters import get_roster
+from .refresh import create_refresh_log
+from .teams import get_registry
+
+# ledger columns of the games of a migrated boxscores table
+LEDGER_COLUMNS = ['game_id', 'url', 'season', 'date', 'status', 'fetched_at',
+                  'row_count']
+
+def get_columns(conn, table):
+    return [x[1] for x in conn.execute(f'pragma table_info({table})')]
+
+def get_seasons(dates):
+    """
+    Returns the league years of a series of game dates.
+    """
+    dates = pd.to_datetime(dates)
+
+    return dates.dt.year + (dates.dt.month >= 8).astype(int)
+
+def fetch_roster_ids(legacy_df):
+    """
+    Returns the (season, team, alias) -> player id index of the rosters of
+    every team and season of the legacy boxscores, pulled from
+    basketball-reference with the ids of their player links. Teams whose
+    roster can not be pulled are left out, as are aliases shared by
+    teammates.
+    """
+    abbrevs = legacy_df['abbrev'].map(get_registry().abbrev)
+    teams = (pd.DataFrame({'abbrev': abbrevs,
+                           'season': get_seasons(legacy_df['date'])})
+             .drop_duplicates()
+             .sort_values(by=['season', 'abbrev']))
+    index = {}
+    shared = set()
+    for team in teams.itertuples(index=False):
+        try:
+            roster = get_roster(team.abbrev, int(team.season))
+        except Exception as e:
+            print(f'Roster of {team.abbrev} {team.season} not available -> '
+                  f'{e}')
+            continue
+        for x in roster[roster['player_id'] != ''].itertuples(index=False):
+            for alias in name_aliases(x.Player):
+                key = (int(team.season), team.abbrev, alias)
+                if index.setdefault(key, x.player_id) != x.player_id:
+                    shared.add(key)
+    for key in shared:
+        del index[key]
+
+    return index
+
+def resolve_legacy_ids(legacy_df, roster_ids):
+    """
+    Returns the player ids of legacy boxscore rows, looked up in the roster
+    ids by the season, the team and the player's name. Rows not found are
+    left null.
+    """
+    seasons = get_seasons(legacy_df['date'])
+    teams = legacy_df['abbrev'].map(get_registry().abbrev)
+    aliases = legacy_df['player'].map(name_aliases)
+
+    return pd.Series([next((roster_ids[(season, team, a)] for a in names
+                            if (season, team, a) in roster_ids), None)
+                      for season, team, names in zip(seasons, teams, aliases)],
+                     index=legacy_df.index, dtype=object)
+
+def convert_legacy_boxscores(legacy_df, roster_ids):
+    """
+    Converts boxscores stored as text with MM:SS minutes to the typed
+    boxscores schema. Player ids are taken from the season rosters, games
+    with a player not found in them (or found twice) are held back to be
+    ingested again. Returns the converted rows and the held back games.
+    """
+    df = legacy_df.copy()
+    df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+    df['season'] = get_seasons(df['date'])
+    # the home team is last in the unique id and in the boxscore url
+    home = df['unique_id'].str[-3:].map(get_registry().bbref_abbrev)
+    df['game_id'] = df['date'].str.replace('-', '') + '0' + home
+    df['player_id'] = resolve_legacy_ids(df, roster_ids)
+    df['MP_SEC'] = df['MP'].map(minutes_to_seconds)
+    df[PCT_COLUMNS] = df[PCT_COLUMNS].apply(pd.to_numeric, errors='coerce')
+    df[INT_COLUMNS] = (df[INT_COLUMNS]
+                       .apply(pd.to_numeric, errors='coerce')
+                       .fillna(0)
+                       .round()
+                       .astype(int))
+    unresolved = (df['player_id'].isna()
+                  | df.duplicated(subset=['game_id', 'player_id'], keep=False))
+    held = df['game_id'].isin(df.loc[unresolved, 'game_id'])
+    held_df = (df[held].groupby(['game_id', 'season'], as_index=False)
+               .agg(date=('date', 'min')))
+
+    return df.loc[~held, BOXSCORE_COLUMNS], held_df
+
+def get_legacy_fetch_time(conn, legacy_df):
+    """
+    Returns the time the legacy boxscores were pulled, the date of the
+    latest refresh logged or else the day after the latest game.
+    """
+    date = None
+    if get_columns(conn, 'refresh_log'):
+        date = conn.execute('select max(date) from refresh_log').fetchone()[0]
+    if date is None:
+        date = pd.to_datetime(legacy_df['date']).max() + pd.Timedelta(days=1)
+
+    return pd.to_datetime(date).strftime('%Y-%m-%dT%H:%M:%S')
+
+def migrate_boxscores(conn):
+    """
+    Moves a text boxscores table to the typed schema keyed on
+    (game_id, player_id), the player ids resolved through the rosters of
+    their seasons. Games converted are flagged as ingested in the ingest
+    ledger, fetched when the legacy boxscores were last refreshed, while the
+    games held back are left pending, so the next update pulls them with the
+    ids scraped from their boxscores. Returns True when a migration was run.
+    """
+    tables = [x[0] for x in conn.execute(
+        "select name from sqlite_master where type = 'table'")]
+    if 'boxscores_legacy' not in tables:
+        cols = get_columns(conn, 'boxscores')
+        if not cols or 'game_id' in cols:
+            return False
+        with conn:
+            conn.execute('alter table boxscores rename to boxscores_legacy')
+    legacy_df = pd.read_sql('select * from boxscores_legacy', conn)
+    box_df, held_df = convert_legacy_boxscores(legacy_df,
+                                               fetch_roster_ids(legacy_df))
+    execute_query('create_boxscore_table.sql', conn)
+    create_ledger(conn)
+    games = (box_df.groupby(['game_id', 'season'], as_index=False)
+             .agg(date=('date', 'min'), row_count=('player_id', 'size')))
+    games['status'] = INGESTED
+    games['fetched_at'] = get_legacy_fetch_time(conn, legacy_df)
+    games = pd.concat([games, held_df.assign(status=PENDING)])
+    games['url'] = BBREF_URL + '/boxscores/' + games['game_id'] + '.html'
+    with conn:
+        upsert_df(box_df, 'boxscores', conn)
+        upsert_df(games[LEDGER_COLUMNS], 'ingest_ledger', conn)
+        conn.execute('drop table boxscores_legacy')
+    print(f'Migrated {len(box_df)} boxscore rows, {len(held_df)} games held '
+          'back to be ingested again.')
+
+    return True
+
+def migrate_player_summary(conn):
+    """
+    Builds the player DFS summaries of every season already ingested.
+    """
+    tables = [x[0] for x in conn.execute(
+        "select name from sqlite_master where type = 'table'")]
+    if 'player_dfs_summary' in tables or 'boxscores' not in tables:
+        return False
+    create_summary(conn)
+    seasons = [x[0] for x in conn.execute(
+        'select distinct season from boxscores')]
+    for season in seasons:
+        rebuild_player_summary(conn, season)
+    print('Player DFS summaries built.')
+
+    return True
+
+def migrate_player_form(conn):
+    """
+    Builds the player form of every season already ingested.
+    """
+    tables = [x[0] for x in conn.execute(
+        "select name from sqlite_master where type = 'table'")]
+    if 'player_form' in tables or 'boxscores' not in tables:
+        return False
+    create_player_form(conn)
+    seasons = [x[0] for x in conn.execute(
+        'select distinct season from boxscores')]
+    for season in seasons:
+        rebuild_player_form(conn, season)
+    print('Player form built.')
+
+    return True
+
+def migrate_players(conn):
+    """
+    Builds the player identity index from the players already ingested.
+    """
+    tables = [x[0] for x in conn.execute(
+        "select name from sqlite_master where type = 'table'")]
+    if 'players' in tables or 'boxscores' not in tables:
+        return False
+    rebuild_players(conn)
+    print('Player identities built.')
+
+    return True
+
+def migrate_rosters(conn):
+    """
+    Adds the player id column to a rosters table stored before the ids were
+    scraped, left null until the rosters are pulled again, and drops the
+    roster table the rosters table replaced.
+    """
+    migrated = False
+    if get_columns(conn, 'roster'):
+        with conn:
+            conn.execute('drop table roster')
+        print('Old roster table dropped.')
+        migrated = True
+    cols = get_columns(conn, 'rosters')
+    if cols and 'player_id' not in cols:
+        with conn:
+            conn.execute('alter table rosters add column player_id text')
+        print('Roster player id column added.')
+        migrated = True
+
+    return migrated
+
+def migrate_schedule_dates(conn):
+    """
+    Adds the indexed ISO game_date column used for slate lookups to a
+    schedule table that predates it.
+    """
+    cols = get_columns(conn, 'schedule')
+    if not cols or 'game_date' in cols:
+        return False
+    with conn:
+        conn.execute('alter table schedule add column game_date text')
+        conn.execute('update schedule set game_date = substr(Dates, 1, 10)')
+        conn.execute("""
+        CREATE INDEX IF NOT EXISTS ix_schedule_game_date
+        ON schedule (game_date)""")
+    print('Schedule game dates added.')
+
+    return True
+
+def migrate_refresh_log(conn):
+    """
+    Moves a refresh log replaced on every refresh to the versioned log,
+    keeping its refresh dates.
+    """
+    cols = get_columns(conn, 'refresh_log')
+    if not cols or 'version' in cols:
+        return False
+    legacy_df = pd.read_sql('select date from refresh_log order by date', conn)
+    with conn:
+        conn.execute('drop table refresh_log')
+    create_refresh_log(conn)
+    with conn:
+        conn.executemany("""
+        insert into refresh_log (date, refreshed_at) values (?, ?)""",
+        [(x[:10], x[:10] + 'T00:00:00') for x in legacy_df['date']])
+    print('Refresh log versioned.')
+
+    return True
+
+def migrate(conn):
+    """
+    Runs every migration needed by the database.
+    """
+    migrate_boxscores(conn)
+    migrate_player_summary(conn)
+    migrate_player_form(conn)
+    migrate_players(conn)
+    migrate_rosters(conn)
+    migrate_schedule_dates(conn)
+    migrate_refresh_log(conn)
+
+    return
+
+# Main
+if __name__ == "__main__":
+    with create_connection('nba_dfs.db') as conn:
+        migrate(conn)
@@ -0,0 +1,297 @@
+# Builds DraftKings classic lineups from the projected points and salaries
+# of a slate. Lineups are enumerated exactly, best first, by a branch and
+# bound search whose bounds come from a dynamic program over the slots
+# filled and the salary left.
+
+import heapq
+import re
+from functools import reduce
+from math import gcd
+import numpy as np
+import pandas as pd
+
+# DraftKings classic roster slots and the positions each one takes
+DK_SLOTS = ['PG', 'SG', 'SF', 'PF', 'C', 'G', 'F', 'UTIL']
+SLOT_POSITIONS = {
+    'PG': {'PG'}, 'SG': {'SG'}, 'SF': {'SF'}, 'PF': {'PF'}, 'C': {'C'},
+    'G': {'PG', 'SG'}, 'F': {'SF', 'PF'},
+    'UTIL': {'PG', 'SG', 'SF', 'PF', 'C'},
+}
+SALARY_CAP = 50000
+# lineups must hold players from at least this many games
+MIN_GAMES = 2
+# most salary steps the bounds are tabled over, salaries are counted in
+# steps of their greatest common divisor, ie $100 on DraftKings
+MAX_SALARY_STEPS = 2000
+# lineups holding players past their exposure skipped before the bounds are
+# tabled again without those players
+RESTART_AFTER = 50
+# generic positions, ie from basketball-reference rosters
+POSITION_GROUPS = {'G': {'PG', 'SG'}, 'F': {'SF', 'PF'}}
+POOL_COLUMNS = ['player_id', 'player', 'team', 'pos', 'salary', 'proj']
+
+def parse_positions(pos):
+    """
+    Returns the set of positions a player is listed at, ie PG/SG -> {PG, SG}
+    and G-F -> {PG, SG, SF, PF}.
+    """
+    positions = set()
+    for x in re.split(r'[/,\- ]+', str(pos or '').upper()):
+        positions |= POSITION_GROUPS.get(x, {x} & SLOT_POSITIONS['UTIL'])
+
+    return positions
+
+class LineupOptimizer:
+    """
+    Finds the best DraftKings classic lineups of a player pool with columns
+    player_id, player, team, pos, salary and proj, and optionally game.
+
+    bound[i, mask, r] is the most points players i onwards can add by
+    filling the slots missing from the bit mask with at most r salary steps.
+    It is tabled for a set of locked and excluded players, then a best first
+    search walks the players in order, skipping each or placing it in an
+    open slot it is eligible for. As the bounds are exact, lineups come out
+    in order of projection without dead ends. Lineups placing the same
+    players in other slots are only yielded once.
+    """
+
+    def __init__(self, pool, salary_cap=SALARY_CAP, slots=DK_SLOTS,
+                 min_games=MIN_GAMES):
+        # best projections first, so the top lineups are completed early
+        pool = pool.sort_values(by='proj', ascending=False)
+        self.pool = pool.reset_index(drop=True)
+        self.salary_cap = salary_cap
+        self.slots = list(slots)
+        self.full = 2 ** len(self.slots) - 1
+        self.min_games = min_games if 'game' in self.pool else 1
+        positions = self.pool['pos'].map(parse_positions)
+        # slots each player can fill
+        self.eligible = [[j for j, slot in enumerate(self.slots)
+                          if x & SLOT_POSITIONS[slot]] for x in positions]
+        salaries = self.pool['salary'].astype(int).to_list()
+        self.step = reduce(gcd, salaries, int(salary_cap)) or 1
+        self.steps = int(salary_cap) // self.step
+        if self.steps > MAX_SALARY_STEPS:
+            raise ValueError(f'{self.steps} -> Salary steps above '
+                             f'{MAX_SALARY_STEPS}, round the salaries')
+        self.costs = [x // self.step for x in salaries]
+        self.proj = self.pool['proj'].astype(float).to_list()
+        self.games = (self.pool['game'].to_list() if self.min_games > 1
+                      else list(range(len(self.pool))))
+        # search nodes expanded, see enumerate
+        self.nodes = 0
+
+    def _bounds(self, locked, allowed):
+        """
+        Tables the bounds of the search backwards from the last player.
+        Locked players can not be skipped and players not allowed can not
+        be picked.
+        """
+        n = len(self.pool)
+        bound = np.full((n + 1, self.full + 1, self.steps + 1), -np.inf,
+                        dtype=np.float32)
+        bound[n, self.full, :] = 0
+        masks = np.arange(self.full + 1)
+        for i in range(n - 1, -1, -1):
+            nxt = bound[i + 1]
+            cur = bound[i]
+            if not locked[i]:
+                cur[:] = nxt
+            cost = self.costs[i]
+            if not allowed[i] or cost > self.steps:
+                continue
+            for j in self.eligible[i]:
+                open_masks = masks[(masks >> j & 1) == 0]
+                placed = nxt[open_masks | (1 << j), :self.steps + 1 - cost]
+                cur[open_masks, cost:] = np.maximum(cur[open_masks, cost:],
+                                                    placed + self.proj[i])
+
+        return bound
+
+    def enumerate(self, locks=(), excludes=(), max_nodes=None):
+        """
+        Yields the (player, slot) index pairs of every lineup from best to
+        worst projection, each set of players once. Stops once the nodes
+        expanded by the optimizer, counted in self.nodes, reach max_nodes.
+        """
+        ids = self.pool['player_id']
+        locked = ids.isin(locks).to_list()
+        allowed = (~ids.isin(excludes)).to_list()
+        # memoryview lookups return python floats, much faster than numpy
+        bound = memoryview(self._bounds(np.array(locked), np.array(allowed)))
+        seen = set()
+        count = 0
+        # nodes are (-bound, order, player, mask, steps used, points, picks)
+        heap = [(-bound[0, 0, self.steps], count, 0, 0, 0, 0.0, ())]
+        while heap:
+            if max_nodes is not None and self.nodes >= max_nodes:
+                return
+            self.nodes += 1
+            top, _, i, mask, used, points, picks = heapq.heappop(heap)
+            if top == np.inf:
+                return
+            if mask == self.full:
+                players = frozenset(x for x, _ in picks)
+                if players not in seen:
+                    seen.add(players)
+                    yield list(picks)
+                continue
+            left = self.steps - used
+            children = []
+            if not locked[i]:
+                children.append((points + bound[i + 1, mask, left], mask,
+                                 used, points, picks))
+            cost = self.costs[i]
+            if allowed[i] and cost <= left:
+                gain = points + self.proj[i]
+                for j in self.eligible[i]:
+                    if mask >> j & 1:
+                        continue
+                    child = mask | (1 << j)
+                    children.append((gain + bound[i + 1, child, left - cost],
+                                     child, used + cost, gain,
+                                     picks + ((i, j),)))
+            for child_bound, child, *rest in children:
+                if child_bound == -np.inf:
+                    continue
+                count += 1
+                heapq.heappush(heap, (-child_bound, count, i + 1, child,
+                                      *rest))
+
+    def _games(self, picks):
+        return len({self.games[i] for i, _ in picks})
+
+    def solve(self, locks=(), excludes=()):
+        """
+        Returns the (player, slot) index pairs of the best lineup, or None
+        when no lineup satisfies the constraints.
+        """
+        for picks in self.enumerate(locks, excludes):
+            if self._games(picks) >= self.min_games:
+                return picks
+
+        return None
+
+    def _exposure_limits(self, n, max_exposure):
+        """
+        Returns the most lineups each player may appear in out of n, from a
+        share applied to every player or a dict of player id to share.
+        """
+        ids = self.pool['player_id']
+        if max_exposure is None:
+            shares = pd.Series(1.0, index=ids.index)
+        elif isinstance(max_exposure, dict):
+            shares = ids.map(max_exposure).fillna(1.0)
+        else:
+            shares = pd.Series(float(max_exposure), index=ids.index)
+
+        return np.maximum(1, np.floor(shares * n)).astype(int).to_numpy()
+
+    def lineups(self, n=1, locks=(), excludes=(), max_exposure=None,
+                min_unique=1, max_nodes=None):
+        """
+        Returns up to n distinct lineups from best to worst projection as a
+        dataframe with one row per lineup slot. Each lineup is the best one
+        differing by at least min_unique players from the lineups before it
+        and keeping every player within their max_exposure share of the n
+        lineups. Locked players are in every lineup and excluded players in
+        none. With max_nodes the search stops after expanding that many
+        nodes, returning the lineups found by then, so tight exposure and
+        uniqueness constraints can not run on unbounded.
+        """
+        self.nodes = 0
+        ids = self.pool['player_id']
+        locks = set(locks)
+        excludes = set(excludes) - locks
+        limits = self._exposure_limits(n, max_exposure)
+        locked = ids.isin(locks).to_numpy()
+        counts = np.zeros(len(self.pool), dtype=int)
+        # picked[k, i] when lineup k holds player i
+        picked = np.zeros((n, len(self.pool)), dtype=bool)
+        found = []
+        max_shared = len(self.slots) - max(min_unique, 1)
+        exhausted = False
+        while len(found) < n and not exhausted:
+            capped = (counts >= limits) & ~locked
+            exhausted = True
+            stale = 0
+            for picks in self.enumerate(locks, excludes | set(ids[capped]),
+                                        max_nodes=max_nodes):
+                players = [i for i, _ in picks]
+                # players reaching their exposure are skipped until too many
+                # lineups hold them, then the bounds are tabled without them
+                if capped[players].any():
+                    stale += 1
+                    if stale > RESTART_AFTER:
+                        exhausted = False
+                        break
+                    continue
+                shared = picked[:len(found), players].sum(axis=1)
+                if shared.max(initial=0) > max_shared:
+                    continue
+                if self._games(picks) < self.min_games:
+                    continue
+                picked[len(found), players] = True
+                found.append(picks)
+                counts[players] += 1
+                capped = (counts >= limits) & ~locked
+                if len(found) == n:
+                    break
+            if max_nodes is not None and self.nodes >= max_nodes:
+                break
+
+        return self._lineup_frame(found)
+
+    def _lineup_frame(self, found):
+        """
+        Returns the lineups found as one row per lineup slot.
+        """
+        picks = [(number, i, j) for number, lineup in enumerate(found)
+                 for i, j in sorted(lineup, key=lambda x: x[1])]
+        numbers = [x[0] for x in picks]
+        players = [x[1] for x in picks]
+        slots = [x[2] for x in picks]
+        lineups = self.pool.iloc[players][POOL_COLUMNS].reset_index(drop=True)
+        lineups.insert(0, 'slot', [self.slots[j] for j in slots])
+        lineups.insert(0, 'lineup', numbers)
+
+        return lineups
+
+def optimize_lineups(pool, n=1, locks=(), excludes=(), max_exposure=None,
+                     min_unique=1, salary_cap=SALARY_CAP, max_nodes=None):
+    """
+    Returns the n best DraftKings classic lineups of a player pool, see
+    LineupOptimizer.lineups.
+    """
+    optimizer = LineupOptimizer(pool, salary_cap=salary_cap)
+
+    return optimizer.lineups(n, locks=locks, excludes=excludes,
+                             max_exposure=max_exposure, min_unique=min_unique,
+                             max_nodes=max_nodes)
+
+def summarize_lineups(lineups, slots=DK_SLOTS):
+    """
+    Pivots lineups to one row per lineup with the player of each slot, the
+    total salary and projection.
+    """
+    if lineups.empty:
+        return pd.DataFrame(columns=slots + ['Salary', 'Proj'])
+    wide = lineups.pivot(index='lineup', columns='slot', values='player')
+    totals = lineups.groupby('lineup')[['salary', 'proj']].sum()
+    wide = wide[slots]
+    wide.columns.name = None
+    wide['Salary'] = totals['salary']
+    wide['Proj'] = totals['proj'].round(2)
+
+    return wide.reset_index(drop=True)
+
+def get_exposures(lineups):
+    """
+    Returns the share of lineups each player appears in.
+    """
+    n = lineups['lineup'].nunique()
+    exposures = (lineups.groupby(['player_id', 'player']).size() / n)
+
+    return (exposures.rename('exposure')
+            .reset_index()
+            .sort_values(by='exposure', ascending=False))
@@ -0,0 +1,264 @@
+import sqlite3
+import hashlib
+import zlib
+import os
+import re
+import tempfile
+import time
+import threading
+from pathlib import Path
+from .errors import PageNotCachedError
+from .metrics import metrics
+from .http_client import get_http_client
+
+CACHE_DIR = Path(__file__).parent.parent / 'db' / 'page_cache'
+# upper bound of the compressed bodies kept on disk
+MAX_CACHE_BYTES = 1024 ** 3
+# seconds a cached page is served before it is revalidated, by url pattern.
+# None never expires, final boxscores do not change once posted.
+SOURCE_TTLS = [
+    (re.compile(r'basketball-reference\.com/boxscores/'), None),
+    (re.compile(r'basketball-reference\.com/leagues/'), 6 * 60 * 60),
+    (re.compile(r'basketball-reference\.com/teams/'), 24 * 60 * 60),
+    (re.compile(r'wikipedia\.org/'), 30 * 24 * 60 * 60),
+    (re.compile(r'fantasypros\.com/'), 60 * 60),
+]
+DEFAULT_TTL = 60 * 60
+
+def get_ttl(url):
+    """
+    Returns the ttl in seconds of the source a url belongs to.
+    """
+    for pattern, ttl in SOURCE_TTLS:
+        if pattern.search(url):
+            return ttl
+
+    return DEFAULT_TTL
+
+class PageCache:
+    """
+    Content addressed cache of scraped pages. Bodies are stored zlib
+    compressed under the sha256 of their content and an sqlite index maps
+    each url to its body along with the fetch time and the ETag and
+    Last-Modified validators used to revalidate expired pages. Least recently
+    used pages are evicted once the bodies outgrow max_bytes.
+
+    In offline mode nothing is requested, pages are replayed from the cache
+    and PageNotCachedError is raised for anything never fetched.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES,
+                 offline=False):
+        self.cache_dir = Path(cache_dir)
+        self.object_dir = self.cache_dir / 'objects'
+        self.object_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.cache_dir / 'index.db',
+                                     check_same_thread=False, timeout=30)
+        with self._conn:
+            self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url text PRIMARY KEY,
+                digest text NOT NULL,
+                size integer NOT NULL,
+                fetched_at real NOT NULL,
+                last_access real NOT NULL,
+                etag text,
+                last_modified text
+            )""")
+            self._conn.execute("""
+            CREATE INDEX IF NOT EXISTS ix_pages_last_access
+            ON pages (last_access)""")
+
+    def _object_path(self, digest):
+        return self.object_dir / digest[:2] / digest
+
+    def _read_object(self, digest):
+        with open(self._object_path(digest), 'rb') as f:
+            return zlib.decompress(f.read())
+
+    def _write_object(self, body):
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._object_path(digest)
+        data = zlib.compress(body)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            # a temporary file of its own per writer, threads included
+            with tempfile.NamedTemporaryFile(dir=path.parent, suffix='.tmp',
+                                             delete=False) as f:
+                f.write(data)
+            os.replace(f.name, path)
+
+        return digest, len(data)
+
+    def _lookup(self, url):
+        q = """
+        select digest, fetched_at, etag, last_modified
+        from pages where url = ?
+        """
+        with self._lock:
+            return self._conn.execute(q, (url,)).fetchone()
+
+    def _touch(self, url, fetched_at=None):
+        with self._lock, self._conn:
+            if fetched_at:
+                self._conn.execute("""
+                update pages set last_access = ?, fetched_at = ?
+                where url = ?""", (time.time(), fetched_at, url))
+            else:
+                self._conn.execute("""
+                update pages set last_access = ? where url = ?""",
+                (time.time(), url))
+
+    def _store(self, url, response):
+        self.put(url, response.content, etag=response.headers.get('ETag'),
+                 last_modified=response.headers.get('Last-Modified'))
+
+    def put(self, url, body, etag=None, last_modified=None):
+        """
+        Stores the body of a url as fetched now, ie to replay saved pages.
+        """
+        digest, size = self._write_object(body)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("""
+            insert or replace into pages
+            (url, digest, size, fetched_at, last_access, etag, last_modified)
+            values (?, ?, ?, ?, ?, ?, ?)""",
+            (url, digest, size, now, now, etag, last_modified))
+        self.evict()
+
+    def get(self, url):
+        """
+        Returns the body of the url, from the cache while it is within the ttl
+        of its source and from basketball-reference etc. otherwise.
+        """
+        entry = self._lookup(url)
+        if entry:
+            digest, fetched_at, etag, last_modified = entry
+            ttl = get_ttl(url)
+            fresh = ttl is None or time.time() - fetched_at < ttl
+            if fresh or self.offline:
+                try:
+                    body = self._read_object(digest)
+                    self._touch(url)
+                    metrics.increment('page_cache_requests_total',
+                                      result='hit')
+                    return body
+                except FileNotFoundError:
+                    entry = None
+        if self.offline:
+            metrics.increment('page_cache_requests_total', result='missing')
+            raise PageNotCachedError(url)
+
+        # conditional request so unchanged pages are not downloaded again
+        headers = {}
+        if entry:
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        response = get_http_client().get(url, headers=headers)
+        if entry and response.status_code == 304:
+            self._touch(url, fetched_at=time.time())
+            metrics.increment('page_cache_requests_total',
+                              result='not_modified')
+            return self._read_object(digest)
+        response.raise_for_status()
+        metrics.increment('page_cache_requests_total', result='fetched')
+        self._store(url, response)
+
+        return response.content
+
+    def size(self):
+        """
+        Returns the total size in bytes of the compressed bodies indexed.
+        """
+        q = """
+        select coalesce(sum(size), 0)
+        from (select distinct digest, size from pages)
+        """
+        with self._lock:
+            return self._conn.execute(q).fetchone()[0]
+
+    def evict(self):
+        """
+        Drops the least recently used pages until the cache is back under
+        max_bytes. Bodies are only deleted once no url points to them.
+        """
+        total = self.size()
+        if total <= self.max_bytes:
+            return
+        with self._lock:
+            pages = self._conn.execute("""
+            select url, digest, size from pages
+            order by last_access""").fetchall()
+        for url, digest, size in pages:
+            if total <= self.max_bytes:
+                break
+            with self._lock, self._conn:
+                self._conn.execute('delete from pages where url = ?', (url,))
+                shared = self._conn.execute("""
+                select 1 from pages where digest = ? limit 1""",
+                (digest,)).fetchone()
+            if not shared:
+                self._object_path(digest).unlink(missing_ok=True)
+                total -= size
+
+    def clear(self, pattern=None):
+        """
+        Removes every cached page, or only those with a url matching the
+        passed regex pattern.
+        """
+        with self._lock:
+            urls = [x[0] for x in self._conn.execute('select url from pages')]
+        with self._lock, self._conn:
+            for url in urls:
+                if pattern is None or re.search(pattern, url):
+                    self._conn.execute('delete from pages where url = ?',
+                                       (url,))
+        with self._lock:
+            digests = {x[0] for x in
+                       self._conn.execute('select digest from pages')}
+        for path in self.object_dir.glob('*/*'):
+            if path.name not in digests:
+                path.unlink(missing_ok=True)
+
+# cache shared by all the scrapers, created on first use
+_page_cache = None
+
+def get_page_cache():
+    """
+    Returns the page cache shared by the scrapers. Setting the NBA_DFS_OFFLINE
+    environment variable to 1 replays pages from the cache only.
+    """
+    global _page_cache
+    if _page_cache is None:
+        offline = os.environ.get('NBA_DFS_OFFLINE', '0') == '1'
+        _page_cache = PageCache(offline=offline)
+
+    return _page_cache
+
+def set_page_cache(cache):
+    """
+    Shares the passed page cache with the scrapers in place of the default
+    one, ie a cache of saved pages replayed offline.
+    """
+    global _page_cache
+    _page_cache = cache
+
+    return
+
+def set_offline(offline=True):
+    """
+    Switches the shared page cache in or out of offline replay mode.
+    """
+    get_page_cache().offline = offline
+
+def get_page(url):
+    """
+    Returns the body of the url through the shared page cache.
+    """
+    return get_page_cache().get(url)
@@ -0,0 +1,102 @@
+import os
+import re
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# lxml is used when installed, set NBA_DFS_PARSER to pick a backend
+BACKENDS = ['lxml', 'strainer', 'soup']
+DEFAULT_BACKEND = 'lxml' if lxml is not None else 'strainer'
+
+def get_backend(backend=None):
+    """
+    Returns the parser backend to use, checking it is available.
+    """
+    backend = backend or os.environ.get('NBA_DFS_PARSER', DEFAULT_BACKEND)
+    if backend not in BACKENDS:
+        raise ValueError(f'{backend} -> Parser backend not one of {BACKENDS}')
+    if backend == 'lxml' and lxml is None:
+        raise ValueError('lxml -> Parser backend is not installed')
+
+    return backend
+
+def _row_record(cells):
+    """
+    Builds a record of a table row keyed by the data-stat of each cell. Cells
+    holding a link also get the href under the data-stat suffixed by _href.
+    """
+    record = {}
+    for stat, text, href in cells:
+        if stat is None:
+            continue
+        record[stat] = text
+        if href is not None:
+            record[f'{stat}_href'] = href
+
+    return record
+
+def _soup_tables(soup, pattern):
+    tables = {}
+    for table in soup.find_all('table', id=pattern):
+        body = table.find('tbody') or table
+        records = []
+        for row in body.find_all('tr', recursive=False):
+            if 'thead' in (row.get('class') or []):
+                continue
+            cells = []
+            for cell in row.find_all(['th', 'td'], recursive=False):
+                a = cell.find('a')
+                href = a.get('href') if a is not None else None
+                cells.append((cell.get('data-stat'), cell.get_text(), href))
+            records.append(_row_record(cells))
+        tables[table['id']] = records
+
+    return tables
+
+def _lxml_tables(source, pattern):
+    tree = lxml.html.fromstring(source)
+    tables = {}
+    for table in tree.iter('table'):
+        table_id = table.get('id')
+        if table_id is None or not pattern.search(table_id):
+            continue
+        records = []
+        for row in table.xpath('./tbody/tr | ./tr'):
+            if 'thead' in (row.get('class') or '').split():
+                continue
+            cells = []
+            for cell in row.xpath('./th | ./td'):
+                a = cell.find('.//a')
+                href = a.get('href') if a is not None else None
+                cells.append((cell.get('data-stat'), cell.text_content(),
+                              href))
+            records.append(_row_record(cells))
+        tables[table_id] = records
+
+    return tables
+
+def parse_tables(source, table_id, backend=None):
+    """
+    Extracts only the tables of a page whose id matches the table_id regex.
+    Returns a dict of table id to a list of body row records keyed by the
+    data-stat attribute of each cell, in page order.
+
+    backends:
+    lxml -> lxml.html tree of the page (fastest)
+    strainer -> html.parser restricted to the matching tables by SoupStrainer
+    soup -> html.parser of the full page
+    """
+    backend = get_backend(backend)
+    pattern = re.compile(table_id)
+    if backend == 'lxml':
+        return _lxml_tables(source, pattern)
+    if backend == 'strainer':
+        strainer = SoupStrainer('table', id=pattern)
+        soup = BeautifulSoup(source, 'html.parser', parse_only=strainer)
+    else:
+        soup = BeautifulSoup(source, 'html.parser')
+
+    return _soup_tables(soup, pattern)
@@ -0,0 +1,138 @@
+# Player identity index. Players are keyed on their basketball-reference id,
+# ie jokicni01, and their normalized names and aliases are tabled once at
+# ingest, so names from other sources resolve to an id by a single lookup
+# and the dashboard never normalizes names itself.
+
+import re
+import sqlite3
+import pandas as pd
+from unidecode import unidecode
+from .db_utils import execute_query, upsert_df
+
+PLAYER_COLUMNS = ['player_id', 'player', 'display', 'name', 'last_date']
+# suffixes dropped by the aliases, sources disagree on them
+NAME_SUFFIXES = {'jr', 'sr', 'ii', 'iii', 'iv', 'v'}
+# aliases added by hand are never replaced by the ones derived at ingest
+MANUAL = 'manual'
+INGEST = 'ingest'
+
+def create_players(conn: sqlite3.Connection):
+    execute_query('create_players_table.sql', conn)
+
+    return
+
+def normalize_name(name):
+    """
+    Returns a player name stripped of accents, punctuation, case and tags
+    used to match names across sources, ie P.J. Tucker -> pj tucker and
+    Nathan Knight (TW) -> nathan knight.
+    """
+    name = re.sub(r'[\(\[].*?[\)\]]', '', unidecode(str(name))).lower()
+
+    return ' '.join(re.sub(r'[^a-z0-9 ]', '', name).split())
+
+def name_aliases(name):
+    """
+    Returns the aliases a name is matched by, its normalized form with and
+    without a suffix, ie Marvin Bagley III -> marvin bagley iii and
+    marvin bagley.
+    """
+    normalized = normalize_name(name)
+    parts = normalized.split()
+    if len(parts) > 2 and parts[-1] in NAME_SUFFIXES:
+        return [normalized, ' '.join(parts[:-1])]
+
+    return [normalized]
+
+def update_players(conn: sqlite3.Connection, df):
+    """
+    Adds the players of a dataframe with player_id, player and optionally
+    date columns to the identity index along with their aliases. A player's
+    name follows their latest date, and an alias shared by players goes to
+    the one seen last. Run inside the transaction writing the rows.
+    """
+    players = df[['player_id', 'player']].copy()
+    players['last_date'] = df['date'] if 'date' in df else None
+    players = (players.sort_values(by='last_date', na_position='first')
+               .drop_duplicates(subset='player_id', keep='last'))
+    players['display'] = players['player'].map(unidecode)
+    players['name'] = players['player'].map(normalize_name)
+    rows = players[PLAYER_COLUMNS].astype(object)
+    rows = rows.where(rows.notna(), None).itertuples(index=False)
+    conn.executemany("""
+    insert into players (player_id, player, display, name, last_date)
+    values (?, ?, ?, ?, ?)
+    on conflict (player_id) do update set
+        player = excluded.player,
+        display = excluded.display,
+        name = excluded.name,
+        last_date = excluded.last_date
+    where excluded.last_date >= coalesce(players.last_date, '')
+    """, rows)
+
+    aliases = [(alias, x.player_id, INGEST, x.last_date)
+               for x in players.itertuples(index=False)
+               for alias in name_aliases(x.player)]
+    conn.executemany(f"""
+    insert into player_aliases (alias, player_id, source, last_date)
+    values (?, ?, ?, ?)
+    on conflict (alias) do update set
+        player_id = excluded.player_id,
+        last_date = excluded.last_date
+    where player_aliases.source != '{MANUAL}'
+    and coalesce(excluded.last_date, '') >= coalesce(player_aliases.last_date, '')
+    """, aliases)
+
+    return
+
+def add_alias(conn: sqlite3.Connection, alias, player_id):
+    """
+    Resolves a name to a player from now on, ie a nickname used by a salary
+    source, add_alias(conn, 'Nic Claxton', 'claxtni01').
+    """
+    create_players(conn)
+    with conn:
+        upsert_df(pd.DataFrame({'alias': [normalize_name(alias)],
+                                'player_id': [player_id],
+                                'source': [MANUAL]}), 'player_aliases', conn)
+
+    return
+
+def rebuild_players(conn: sqlite3.Connection):
+    """
+    Builds the identity index from every player of the boxscores table.
+    """
+    create_players(conn)
+    q = """
+    select player_id, player, max(date) as date from boxscores
+    group by player_id
+    """
+    with conn:
+        update_players(conn, pd.read_sql(q, conn))
+
+    return
+
+def load_player_index(conn: sqlite3.Connection):
+    """
+    Returns the alias -> player id hash index of every player.
+    """
+    rows = conn.execute('select alias, player_id from player_aliases')
+
+    return dict(rows.fetchall())
+
+def resolve_player_ids(conn: sqlite3.Connection, names, index=None):
+    """
+    Resolves player names from any source to their player ids through the
+    alias index. Names not found are given an id derived from the name, ie
+    name:jane-doe, and reported so an alias can be added.
+    """
+    index = load_player_index(conn) if index is None else index
+    aliases = names.map(name_aliases)
+    ids = aliases.map(lambda x: next((index[a] for a in x if a in index),
+                                     None))
+    missing = ids.isna()
+    if missing.any():
+        print(f'Unresolved players: {", ".join(names[missing])}')
+    slugs = aliases.str[0].str.replace(' ', '-')
+
+    return ids.fillna('name:' + slugs)
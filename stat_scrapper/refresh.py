@@ -0,0 +1,44 @@
+# Every data refresh appends a row to the refresh log. Its version numbers
+# the refreshes so views built from the data know when they are stale.
+
+import sqlite3
+import datetime as dt
+from .db_utils import execute_query
+
+def create_refresh_log(conn: sqlite3.Connection):
+    execute_query('create_refresh_log_table.sql', conn)
+
+    return
+
+def log_refresh(conn: sqlite3.Connection):
+    """
+    Records a completed refresh and returns its version.
+    """
+    create_refresh_log(conn)
+    now = dt.datetime.now()
+    with conn:
+        cur = conn.execute("""
+        insert into refresh_log (date, refreshed_at) values (?, ?)""",
+        (now.strftime('%Y-%m-%d'), now.isoformat(timespec='seconds')))
+
+    return cur.lastrowid
+
+def get_refresh_version(conn: sqlite3.Connection):
+    """
+    Returns the version of the latest refresh, 0 before the first one.
+    """
+    try:
+        row = conn.execute('select max(version) from refresh_log').fetchone()
+    except sqlite3.OperationalError:
+        # no refresh has created the log yet
+        return 0
+
+    return row[0] or 0
+
+def get_refresh_date(conn: sqlite3.Connection):
+    """
+    Returns the date of the latest refresh.
+    """
+    row = conn.execute('select max(date) from refresh_log').fetchone()
+
+    return row[0]
@@ -1,54 +1,49 @@
 import pandas as pd 
-from bs4 import BeautifulSoup
-import requests
-import os
-import teams as ref
-from errors import TeamAbbrevError
+from .parsing import parse_tables
+from .page_cache import get_page
+from . import teams as ref
+from .errors import TeamAbbrevError
 import sqlite3
-import db_utils
-from pathlib import Path
+from . import db_utils
+from .boxscores import get_player_id
+from .players import create_players, update_players
+from .metrics import timed, count_rows, count_bytes
 
-QUERY_DIR = Path('sql')
+ROSTER_COLUMNS = ['Player', 'Pos', 'Ht', 'Wt', 'Birth Date', 'Cntry', 'Exp',
+                  'College']
+# data-stat attributes of the ROSTER_COLUMNS cells
+ROSTER_STATS = ['player', 'pos', 'height', 'weight', 'birth_date',
+                'birth_country', 'years_experience', 'college']
 
 def get_roster(abbrev, year):
     """
     Get the roster of a specified team in a specified year.
     """
-    # gets a list of team abbreviations to check against passed abbrev arg
-    static_team_abbrev = ref.get_abbrevs()['abbrev'].to_list()
     # Raising error is passed abbrev not 3 characters or in team abbrev list
-    if (len(abbrev) != 3) or (abbrev not in static_team_abbrev):
+    if (len(abbrev) != 3) or (abbrev not in ref.get_registry().aliases):
         raise TeamAbbrevError(abbrev)
     # converting to string if passed as int for adding to url
     if not isinstance(year, str):
         year = str(year)
-    if abbrev == 'BKN':
-        abbrev = 'BRK'
-    elif abbrev == 'CHA':
-        abbrev = 'CHO'
-    elif abbrev == 'PHX':
-        abbrev = 'PHO'
+    abbrev = ref.get_registry().bbref_abbrev(abbrev)
     # creating team specfic url to pull roster
     url = f'https://www.basketball-reference.com/teams/{abbrev}/{year}.html'
     #scraping and retr
-    source = requests.get(url)
-    soup = BeautifulSoup(source.content, 'html.parser')
-    
-    table = soup.find_all('table')
-    header = table[0].find_all('th')
-    rows = table[0].find_all('tr')
+    with timed('fetch', 'rosters'):
+        source = get_page(url)
+    count_bytes('rosters', source)
+    with timed('parse', 'rosters'):
+        rows = parse_tables(source, '^roster$').get('roster', [])
 
-    #TODO really bad handling here if tables ever change
-    cols = [x.text.strip() for x in header[1:9]]
-    cols[5] = 'Cntry'
-    
-    roster = pd.DataFrame(columns=cols)
-    for row in rows[1:]:
-        row_data = row.find_all('td')
-        player_data = pd.Series([x.text.strip() for x in row_data], index=cols)
-        roster = roster.append(player_data, ignore_index=True)
+    with timed('build', 'rosters'):
+        records = [[row.get(x, '').strip() for x in ROSTER_STATS]
+                   for row in rows]
+        roster = pd.DataFrame(records, columns=ROSTER_COLUMNS)
+        roster['player_id'] = [get_player_id(row.get('player_href', ''))
+                               for row in rows]
 
-    roster['abbrev'] = abbrev
+        roster['abbrev'] = abbrev
+    count_rows('build', 'rosters', len(roster))
     
     return roster
 
@@ -56,13 +51,22 @@ def update_roster_table(conn: sqlite3.Connection, year: str):
     """
     Creates the roster table in the databse.
     """
-    abbrevs = ref.get_abbrevs()['abbrev']
-    roster_df = pd.DataFrame()
+    abbrevs = ref.get_registry().abbrevs()
+    roster_ls = []
     for abbrev in abbrevs:
         _temp = get_roster(abbrev, year)
         _temp['team'] = abbrev
-        roster_df = roster_df.append(_temp)
-    roster_df.to_sql('rosters', conn, if_exists='replace')
+        roster_ls.append(_temp)
+    roster_df = pd.concat(roster_ls, axis=0)
+    with timed('write', 'rosters'):
+        db_utils.replace_table(roster_df, 'rosters', conn)
+        # players yet to play are added to the identity index from the
+        # rosters
+        create_players(conn)
+        with conn:
+            update_players(conn, roster_df.rename({'Player': 'player'},
+                                                  axis=1))
+    count_rows('write', 'rosters', len(roster_df))
     print('Rosters succsesfully updated.')
     
     return
\ No newline at end of file
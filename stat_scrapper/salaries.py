@@ -1,34 +1,114 @@
 import pandas as pd
-from bs4 import BeautifulSoup
-import requests
-import numpy as np
+from io import StringIO
+from .page_cache import get_page
+from .db_utils import execute_query, upsert_df
+from .players import create_players, resolve_player_ids
+from .metrics import timed, count_rows, count_bytes
 import datetime as dt 
-import re
-    
-    
-def get_today_salaries():
-    source = requests.get('https://www.fantasypros.com/daily-fantasy/nba/draftkings-salary-changes.php')
-    soup = BeautifulSoup(source.content, 'html.parser')
-
-    # getting table headers
-    table = soup.find('table', {'id': 'data-table'})
-    table_header = table.find('thead')
-
-    columns = []
-    for th in table_header.findAll('th'):
-        key = th.get_text()
-        columns.append(key)
-        
-    # getting table data (in seperate table)
-    table_body = table.find('tbody')
-    data_rows = []
-    for tr in table_body.findAll('td'):
-        key = tr.get_text()
-        data_rows.append(key)
-
-    row_chunks = [data_rows[x:x+7] for x in np.arange(0, len(data_rows), 7)]
-    data = pd.DataFrame(row_chunks, columns=columns)
-    data['Player'] = data['Player'].apply(lambda x: re.sub("[\(\[].*?[\)\]]", "", x))
-    data['Player'] = data['Player'].apply(lambda x: x.strip())
-    
-    return data
+import sqlite3
+import threading
+import time
+
+SALARY_URLS = {
+    'draftkings': ('https://www.fantasypros.com/daily-fantasy/nba/'
+                   'draftkings-salary-changes.php'),
+    'fanduel': ('https://www.fantasypros.com/daily-fantasy/nba/'
+                'fanduel-salary-changes.php'),
+}
+DEFAULT_SITE = 'draftkings'
+SALARY_COLUMNS = ['date', 'site', 'player_id', 'player', 'team', 'pos',
+                  'salary', 'fetched_at']
+# seconds the salaries of today's slate are held in memory, past slates are
+# final and kept until the process ends
+SLATE_TTL = 5 * 60
+
+def get_today_salaries(site=DEFAULT_SITE):
+    """
+    Pulls the current salaries of a site from fantasypros. Returns a
+    dataframe of the player, their team and position and the salary.
+    """
+    with timed('fetch', 'salaries'):
+        source = get_page(SALARY_URLS[site])
+    count_bytes('salaries', source)
+    if isinstance(source, bytes):
+        source = source.decode('utf-8')
+    with timed('parse', 'salaries'):
+        data = pd.read_html(StringIO(source), attrs={'id': 'data-table'})[0]
+
+    # player cells read ie Nikola Jokic (DEN - C)
+    with timed('build', 'salaries'):
+        player = data['Player'].astype(str)
+        details = player.str.extract(r'\((\w+)\s*-\s*([^)]+)\)')
+        salaries = pd.DataFrame({
+            'player': player.str.replace(r'[\(\[].*?[\)\]]', '',
+                                         regex=True).str.strip(),
+            'team': details[0],
+            'pos': details[1].str.strip(),
+            'salary': pd.to_numeric(data['Today'].astype(str)
+                                    .str.replace(r'[$,]', '', regex=True),
+                                    errors='coerce')})
+        salaries = salaries.dropna(subset=['salary'])
+        salaries['salary'] = salaries['salary'].astype(int)
+    count_rows('build', 'salaries', len(salaries))
+
+    return salaries.reset_index(drop=True)
+
+def update_salaries_table(conn: sqlite3.Connection, date=None, sites=None):
+    """
+    Pulls today's salaries of every site, or of only the sites passed, and
+    stores them as the salary snapshot of the date. Run on a schedule, a
+    date pulled again replaces its earlier snapshot.
+    """
+    date = pd.to_datetime(date or dt.date.today()).strftime('%Y-%m-%d')
+    execute_query('create_salaries_table.sql', conn)
+    create_players(conn)
+    fetched_at = dt.datetime.now().isoformat(timespec='seconds')
+    for site in sites or SALARY_URLS:
+        sal_df = get_today_salaries(site)
+        sal_df['player_id'] = resolve_player_ids(conn, sal_df['player'])
+        sal_df = sal_df.drop_duplicates(subset='player_id')
+        sal_df['date'] = date
+        sal_df['site'] = site
+        sal_df['fetched_at'] = fetched_at
+        with timed('write', 'salaries'), conn:
+            conn.execute('delete from salaries where date = ? and site = ?',
+                         (date, site))
+            upsert_df(sal_df[SALARY_COLUMNS], 'salaries', conn)
+        count_rows('write', 'salaries', len(sal_df))
+        print(f'{site} salaries succesfully updated: {len(sal_df)} players.')
+        _slates.pop((date, site), None)
+
+    return
+
+# salaries of the slates looked up, (date, site) -> (loaded at, dataframe)
+_slates = {}
+_slates_lock = threading.Lock()
+
+def get_salaries(conn: sqlite3.Connection, date, site=DEFAULT_SITE):
+    """
+    Returns the salaries stored for a date's slate, empty when no snapshot
+    was taken that day. Slates are held in memory once looked up.
+    """
+    date = pd.to_datetime(date).strftime('%Y-%m-%d')
+    today = dt.date.today().strftime('%Y-%m-%d')
+    with _slates_lock:
+        entry = _slates.get((date, site))
+    if entry is not None:
+        loaded_at, sal_df = entry
+        if date < today or time.time() - loaded_at < SLATE_TTL:
+            return sal_df
+    q = """
+    select player_id, player, team, pos, salary from salaries
+    where date = ? and site = ?
+    """
+    try:
+        sal_df = pd.read_sql(q, conn, params=(date, site))
+    except (pd.io.sql.DatabaseError, sqlite3.Error):
+        sal_df = pd.DataFrame(columns=['player_id', 'player', 'team', 'pos',
+                                       'salary'])
+    # past dates without a snapshot are looked up again, one may be loaded
+    if not sal_df.empty or date >= today:
+        with _slates_lock:
+            _slates[(date, site)] = (time.time(), sal_df)
+
+    return sal_df
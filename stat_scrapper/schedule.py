@@ -3,13 +3,32 @@
 # Something to handle possible load management
 
 import pandas as pd
-from bs4 import BeautifulSoup
-import requests
+from bs4 import BeautifulSoup, SoupStrainer
+from .page_cache import get_page
 import numpy as np
-import os
 import datetime as dt
-import calendar
-from .teams import get_abbrevs
+from .teams import get_registry
+from .parsing import parse_tables
+from .db_utils import replace_table
+from .metrics import timed, count_rows, count_bytes
+from .refresh import get_refresh_version
+
+SCHEDULE_COLUMNS = ['Dates', 'Start (ET)', 'Visitor/Neutral', 'PTS_V',
+                    'Home/Neutral', 'PTS_H', 'Box_Score', 'OT?', 'Attend.',
+                    'Notes']
+# data-stat attributes of the SCHEDULE_COLUMNS cells
+SCHEDULE_STATS = ['date_game', 'game_start_time', 'visitor_team_name',
+                  'visitor_pts', 'home_team_name', 'home_pts', 'box_score_text',
+                  'overtimes', 'attendance', 'game_remarks']
+# days the stored schedule is used before it is pulled again, so the games
+# added later in the season and postponed games moved to a new date are seen
+SCHEDULE_MAX_AGE = 1
+
+def get_season(date):
+    """
+    Returns the league year (end year of the season) a game date falls in.
+    """
+    return date.year + 1 if date.month >= 8 else date.year
 
 def get_schedule(year, abbrev=None):
     """
@@ -26,75 +45,212 @@ def get_schedule(year, abbrev=None):
     
     # getting months available for provided year
     url = f'https://www.basketball-reference.com/leagues/NBA_{year}_games.html'
-    source = requests.get(url)
-    soup = BeautifulSoup(source.content, 'html.parser')
-    filt = soup.find_all('div', class_='filter')
-    a_tag = filt[0].find_all('a')
-    month_list = []
-    for a in a_tag:
-        month_list.append(a.text.lower())
+    with timed('fetch', 'schedule'):
+        source = get_page(url)
+    count_bytes('schedule', source)
+    with timed('parse', 'schedule'):
+        strainer = SoupStrainer('div', class_='filter')
+        soup = BeautifulSoup(source, 'html.parser', parse_only=strainer)
+        filt = soup.find_all('div', class_='filter')
+        a_tag = filt[0].find_all('a')
+        month_list = []
+        for a in a_tag:
+            month_list.append(a.text.lower())
         
-    # looping through each month to get the schedule and aggregate into one df
-    month_df_ls = []
+    # looping through each month to collect the schedule rows as records,
+    # the dataframe is built once all months are pulled
+    records = []
     for month in month_list:
         url = (f'https://www.basketball-reference.com/leagues/NBA_{year}_games-'
                f'{month}.html')
-        source = requests.get(url)
-        soup = BeautifulSoup(source.content, 'html.parser')
-        t_head = soup.find('thead')
-        
-        columns = []
-        for th in t_head.find_all('th'):
-            key = th.get_text()
-            columns.append(key)
-            # not including dates in headers since will add later
-            headers = columns[1:]
-        headers[5:7] = ['Box_Score', 'OT?']
+        with timed('fetch', 'schedule'):
+            source = get_page(url)
+        count_bytes('schedule', source)
+        with timed('parse', 'schedule'):
+            rows = parse_tables(source, '^schedule$').get('schedule', [])
 
         # gets data from table along with links to boxscores
-        table_body = soup.find('tbody')
-        table_rows = table_body.find_all('tr')
-        table_data = pd.DataFrame(columns=headers)
-        for row in table_rows:
-            temp_data = row.find_all('td')
-            row_data = pd.Series([x.text for x in temp_data], index=headers)
-            for a_tags in row:
-                tags = a_tags.find_all('a')
-                for a in tags:
-                    pre_mask = a.get('href')[0:4] == '/box'
-                    post_mask = a.get('href')[-4:] == 'html'
-                    if (pre_mask) & (post_mask):
-                        row_data[5] = a.get('href')
-            table_data = table_data.append(row_data, ignore_index=True)
-
-        dates_col = soup.findAll('th', {'data-stat': 'date_game'})
-        dates = []
-        for x in dates_col:
-            dates.append(x.get_text())
-
-        table_data.insert(0, 'Dates', dates[1:])
-        month_df_ls.append(table_data)
-        agg_df = pd.concat(month_df_ls, axis=0)
-        
-    if abbrev:
-        abbrev_df = get_abbrevs()
-        team_name = abbrev_df[abbrev_df.abbrev == abbrev]['team_name'].values[0]
-        vis_mask = (agg_df['Visitor/Neutral'] == team_name)
-        hom_mask = (agg_df['Home/Neutral'] == team_name)
-        agg_df = (agg_df[(vis_mask) | (hom_mask)]
-                  .reset_index()
-                  .drop('index', axis=1))
-        
-    agg_df['Dates'] = pd.to_datetime(agg_df.Dates)
+        for row in rows:
+            row_data = [row.get(x, '') for x in SCHEDULE_STATS]
+            box_link = row.get('box_score_text_href', '')
+            if not (box_link.startswith('/box') and box_link.endswith('html')):
+                box_link = ''
+            row_data[6] = box_link
+            records.append(row_data)
+
+    with timed('build', 'schedule'):
+        agg_df = pd.DataFrame(records, columns=SCHEDULE_COLUMNS)
+
+        if abbrev:
+            team_name = get_registry().name(abbrev)
+            vis_mask = (agg_df['Visitor/Neutral'] == team_name)
+            hom_mask = (agg_df['Home/Neutral'] == team_name)
+            agg_df = (agg_df[(vis_mask) | (hom_mask)]
+                      .reset_index()
+                      .drop('index', axis=1))
+
+        agg_df['Dates'] = pd.to_datetime(agg_df.Dates)
+    count_rows('build', 'schedule', len(agg_df))
     
     return agg_df
 
+class Schedule:
+    """
+    League schedule of a single year held in memory. Games are indexed by
+    team name and by date so lookups for a team or a slate never go back to
+    basketball-reference or the database. Load it once per run with
+    Schedule.from_web or Schedule.from_db (or load_schedule) and pass it
+    around.
+    """
+
+    def __init__(self, sched_df):
+        sched_df = sched_df.reset_index(drop=True)
+        sched_df['Dates'] = pd.to_datetime(sched_df['Dates'])
+        self.df = sched_df
+
+        self._by_date = {date: idx for date, idx
+                         in sched_df.groupby('Dates').indices.items()}
+        by_team = {}
+        for col in ['Visitor/Neutral', 'Home/Neutral']:
+            for team, idx in sched_df.groupby(col).indices.items():
+                by_team.setdefault(team, []).append(idx)
+        self._by_team = {team: np.sort(np.concatenate(idx))
+                         for team, idx in by_team.items()}
+
+    @classmethod
+    def from_web(cls, year):
+        """
+        Pulls the full league schedule of the year from basketball-reference.
+        """
+        return cls(get_schedule(year))
+
+    @classmethod
+    def from_db(cls, conn):
+        """
+        Loads the schedule stored in the schedule table.
+        """
+        q = """
+        select "Dates", "Start (ET)", "Visitor/Neutral", "PTS_V",
+               "Home/Neutral", "PTS_H", "Box_Score", "OT?", "Attend.", "Notes"
+        from schedule
+        """
+        sched_df = pd.read_sql(q, conn)
+        sched_df['Box_Score'] = sched_df['Box_Score'].fillna('')
+
+        return cls(sched_df)
+
+    def team_name(self, team):
+        """
+        Returns the full team name for a team name or abbreviation.
+        """
+        if team in self._by_team:
+            return team
+
+        return get_registry().name(team)
+
+    def for_team(self, team):
+        """
+        Returns the games of a team, passed as a name or abbreviation.
+        """
+        idx = self._by_team.get(self.team_name(team), [])
+
+        return self.df.iloc[idx].reset_index(drop=True)
+
+    def on_date(self, date):
+        """
+        Returns the games played on the specified date.
+        """
+        idx = self._by_date.get(pd.to_datetime(date), [])
+
+        return self.df.iloc[idx].reset_index(drop=True)
+
+    def teams_on(self, date):
+        """
+        Returns a list of the away teams followed by the home teams playing
+        on the specified date.
+        """
+        games = self.on_date(date)
+
+        return (games['Visitor/Neutral'].to_list()
+                + games['Home/Neutral'].to_list())
+
+# schedules already loaded during this run, keyed by year and source along
+# with the version they were loaded at, see load_schedule
+_SCHEDULES = {}
+
+def load_schedule(year, conn=None, refresh=False):
+    """
+    Returns the schedule of the year, pulling it only the first time it is
+    asked for each day. When a connection is passed the schedule table is
+    used instead of basketball-reference, read again after each data
+    refresh so long running processes see the games added since.
+    """
+    year = str(year)
+    if conn is not None:
+        key, version = (year, 'db'), get_refresh_version(conn)
+    else:
+        key, version = (year, 'web'), dt.date.today()
+    loaded = _SCHEDULES.get(key)
+    if refresh or loaded is None or loaded[0] != version:
+        if conn is not None:
+            _SCHEDULES[key] = (version, Schedule.from_db(conn))
+        else:
+            _SCHEDULES[key] = (version, Schedule.from_web(year))
+
+    return _SCHEDULES[key][1]
+
+def get_slate_teams(conn, date):
+    """
+    Returns a list of the away teams followed by the home teams playing on
+    the specified date, looked up in the schedule table by its indexed ISO
+    game_date.
+    """
+    q = """
+    select "Visitor/Neutral", "Home/Neutral"
+    from schedule
+    where game_date = ?
+    """
+    date = pd.to_datetime(date).strftime('%Y-%m-%d')
+    games = pd.read_sql(q, conn, params=(date,))
+
+    return (games['Visitor/Neutral'].to_list()
+            + games['Home/Neutral'].to_list())
+
+def schedule_is_stale(conn, year, max_age=SCHEDULE_MAX_AGE):
+    """
+    Returns True when the schedule table is missing, holds another season
+    or was pulled more than max_age days ago.
+    """
+    cols = [x[1] for x in conn.execute('pragma table_info(schedule)')]
+    if 'pulled_at' not in cols:
+        return True
+    first, pulled_at = conn.execute("""
+    select min(game_date), max(pulled_at) from schedule""").fetchone()
+    if first is None or get_season(pd.to_datetime(first)) != int(year):
+        return True
+    age = dt.datetime.now() - dt.datetime.fromisoformat(pulled_at)
+
+    return age > dt.timedelta(days=max_age)
+
+def load_stored_schedule(conn, year, max_age=SCHEDULE_MAX_AGE):
+    """
+    Returns the schedule of the year from the schedule table, pulling it
+    from basketball-reference into the table first when it is stale.
+    """
+    if schedule_is_stale(conn, year, max_age):
+        load_schedule(year, refresh=True)
+        update_schedule_table(conn, year)
+
+    return load_schedule(year, conn=conn, refresh=True)
+
 def update_schedule_table(conn, year):
-    sched_df = get_schedule(year)
-    sched_df.columns = ['Dates', 'Start (ET)', 'Visitor/Neutral', 'PTS_V', 
-                        'Home/Neutral', 'PTS_H', 'Box_Score', 'OT?', 'Attend.', 
-                        'Notes']
-    sched_df.to_sql('schedule', conn, if_exists='replace')
+    sched_df = load_schedule(year).df.copy()
+    sched_df['game_date'] = sched_df['Dates'].dt.strftime('%Y-%m-%d')
+    sched_df['pulled_at'] = dt.datetime.now().isoformat(timespec='seconds')
+    with timed('write', 'schedule'):
+        replace_table(sched_df, 'schedule', conn,
+                      indexes=[('ix_schedule_game_date', 'game_date')])
+    count_rows('write', 'schedule', len(sched_df))
     print('Schedule has been updated.')
     
     return
\ No newline at end of file
@@ -0,0 +1,140 @@
+# Refreshes the database on a schedule, either from a thread of the
+# dashboard or as a sidecar process run with python -m stat_scrapper.scheduler
+# A lock file keeps a single refresh running across processes, and every
+# write is a transaction on the WAL mode database so readers carry on.
+
+import fcntl
+import threading
+import datetime as dt
+from contextlib import contextmanager
+from pathlib import Path
+import pandas as pd
+import requests
+from .db_utils import get_manager
+from .boxscores import update_boxscores_table
+from .schedule import get_season, load_stored_schedule
+from .salaries import update_salaries_table
+from .migrations import migrate
+from .snapshot import sync_snapshot
+from .metrics import metrics
+
+REFRESH_HOURS = 6
+LOCK_PATH = Path(__file__).parent.parent / 'db' / 'refresh.lock'
+
+def get_refresh_season(conn, today=None):
+    """
+    Returns the season refreshed, the one of today's date once its schedule
+    is out, pulling it into the schedule table, or else the season of the
+    stored schedule, ie over the summer before the next schedule is posted.
+    """
+    season = get_season(today or dt.date.today())
+    try:
+        load_stored_schedule(conn, season)
+    except requests.HTTPError as e:
+        last_date = conn.execute(
+            'select max(game_date) from schedule').fetchone()[0]
+        if last_date is None:
+            raise
+        stored = get_season(pd.to_datetime(last_date))
+        print(f'Schedule of {season} not available -> {e}, refreshing '
+              f'{stored}.')
+        season = stored
+
+    return season
+
+def refresh_database(conn):
+    """
+    Runs the daily refresh, the boxscores of the current season and their
+    Parquet snapshot followed by today's salaries.
+    """
+    migrate(conn)
+    # past seasons are loaded with python -m stat_scrapper.backfill
+    season = get_refresh_season(conn)
+    try:
+        update_boxscores_table(conn, season, append=True)
+    except Exception as e:
+        raise RuntimeError(f'Boxscore update of {season} failed -> {e}') from e
+    sync_snapshot(conn, seasons=[season])
+    # salaries are snapshotted each run so past slates keep their salaries
+    update_salaries_table(conn)
+    # folds the write ahead log back so the database file stands alone
+    conn.execute('pragma wal_checkpoint(truncate)')
+
+    return
+
+@contextmanager
+def refresh_lock(path=LOCK_PATH, blocking=False):
+    """
+    Holds the refresh lock file, yielding False when another process holds
+    it already, or waiting for it when blocking.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX
+                        | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def run_refresh(db_name='nba_dfs.db'):
+    """
+    Refreshes the database unless a refresh is already running. Returns
+    True when a refresh was run.
+    """
+    with refresh_lock() as locked:
+        if not locked:
+            print('Refresh already running, skipped.')
+            return False
+        # the process' single writer, shared with any other writes
+        with get_manager(db_name).writer() as conn:
+            with metrics.time('refresh_seconds'):
+                refresh_database(conn)
+
+    return True
+
+def run_migrations(db_name='nba_dfs.db'):
+    """
+    Brings the database to the current schema, waiting for a refresh or
+    another process migrating it to finish. Run by the dashboard as it
+    starts, so a database stored by an earlier version is migrated on
+    first run.
+    """
+    with refresh_lock(blocking=True):
+        with get_manager(db_name).writer() as conn:
+            migrate(conn)
+
+    return
+
+class RefreshScheduler(threading.Thread):
+    """
+    Daemon thread refreshing the database every interval seconds. Failed
+    refreshes are reported and tried again on the next interval.
+    """
+
+    def __init__(self, interval=REFRESH_HOURS * 3600, db_name='nba_dfs.db'):
+        super().__init__(name='refresh-scheduler', daemon=True)
+        self.interval = interval
+        self.db_name = db_name
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                run_refresh(self.db_name)
+            except Exception as e:
+                print(f'Refresh failed -> {e!r}')
+
+    def stop(self):
+        self._stopped.set()
+
+        return
+
+# Main
+if __name__ == "__main__":
+    RefreshScheduler().run()
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+# boxscore stats scored by the rule sets
+SCORING_STATS = ['PTS', '3P', 'TRB', 'AST', 'STL', 'BLK', 'TOV']
+# stats counted towards double and triple doubles
+DOUBLE_STATS = ['PTS', 'TRB', 'AST', 'STL', 'BLK']
+BONUSES = ['double_double', 'triple_double']
+
+# points per stat and bonus of each site, a triple double also earns the
+# double double bonus
+RULESETS = {
+    'draftkings': {
+        'stats': {'PTS': 1, '3P': 0.5, 'TRB': 1.25, 'AST': 1.5,
+                  'STL': 2, 'BLK': 2, 'TOV': -0.5},
+        'bonuses': {'double_double': 1.5, 'triple_double': 3}
+    },
+    'fanduel': {
+        'stats': {'PTS': 1, 'TRB': 1.2, 'AST': 1.5,
+                  'STL': 3, 'BLK': 3, 'TOV': -1},
+        'bonuses': {}
+    },
+    'yahoo': {
+        'stats': {'PTS': 1, '3P': 0.5, 'TRB': 1.2, 'AST': 1.5,
+                  'STL': 3, 'BLK': 3, 'TOV': -1},
+        'bonuses': {}
+    },
+}
+DEFAULT_RULESET = 'draftkings'
+# kept for callers of the original single rule set
+DFS_SCORING = RULESETS[DEFAULT_RULESET]['stats']
+
+def register_ruleset(name, stats, bonuses=None):
+    """
+    Adds a custom rule set, ie register_ruleset('custom', {'PTS': 1}).
+    Stats and bonuses left out score nothing.
+    """
+    unknown = set(stats) - set(SCORING_STATS)
+    unknown |= set(bonuses or {}) - set(BONUSES)
+    if unknown:
+        raise ValueError(f'{sorted(unknown)} -> Not scorable stats')
+    RULESETS[name] = {'stats': dict(stats), 'bonuses': dict(bonuses or {})}
+
+    return
+
+class ScoringEngine:
+    """
+    Scores boxscores against several rule sets at once. Each rule set is a
+    column of a coefficient matrix over the scored stats and bonus flags, so
+    a whole stat matrix is scored by a single matmul. Input frames are never
+    modified.
+    """
+
+    def __init__(self, rulesets=None):
+        self.rulesets = list(rulesets or RULESETS)
+        features = SCORING_STATS + BONUSES
+        self.coefs = np.zeros((len(features), len(self.rulesets)))
+        for j, name in enumerate(self.rulesets):
+            rules = RULESETS[name]
+            weights = {**rules['stats'], **rules['bonuses']}
+            for i, feature in enumerate(features):
+                self.coefs[i, j] = weights.get(feature, 0)
+
+    def features(self, df):
+        """
+        Returns the stat matrix of the boxscores with the bonus flags
+        appended as columns.
+        """
+        stats = df[SCORING_STATS].to_numpy(dtype=float)
+        doubles = (df[DOUBLE_STATS].to_numpy(dtype=float) >= 10).sum(axis=1)
+        bonuses = np.column_stack([doubles >= 2, doubles >= 3])
+
+        return np.hstack([stats, bonuses])
+
+    def score(self, df):
+        """
+        Returns the fantasy points of each boxscore row, one column per rule
+        set.
+        """
+        points = self.features(df) @ self.coefs
+
+        return pd.DataFrame(points, index=df.index, columns=self.rulesets)
+
+def score_rulesets(df, rulesets=None):
+    """
+    Returns the fantasy points of each boxscore row for every rule set, or
+    only for the rule sets passed.
+    """
+    return ScoringEngine(rulesets).score(df)
+
+def score_dfs(df, ruleset=DEFAULT_RULESET):
+    """
+    Returns the fantasy points of each boxscore row under one rule set
+    without touching the passed dataframe.
+    """
+    return ScoringEngine([ruleset]).score(df)[ruleset]
@@ -0,0 +1,242 @@
+# Monte Carlo simulation of slate outcomes. Each simulation draws a DFS
+# score for every player of the slate, correlated within teams, so player
+# score distributions and the chances of lineups winning or cashing can be
+# read off the draws.
+
+import os
+import threading
+import multiprocessing as mp
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from .scoring import DEFAULT_RULESET, score_dfs
+
+N_SIMS = 20000
+# simulations drawn at a time, bounding memory to players x CHUNK_SIMS
+CHUNK_SIMS = 2500
+# correlation of the scores of players on the same team
+TEAM_CORR = 0.2
+# quantiles tabled of each player's empirical score distribution
+QUANTILE_GRID = np.linspace(0, 1, 101)
+# players need this many games for their own distribution, others are drawn
+# from a normal fitted to their mean and deviation
+MIN_GAMES = 5
+# score histogram the percentiles are read from, in DFS points, and the
+# percentiles batch runs ask for
+HIST_BINS = np.arange(-20, 150.5, 0.5)
+PERCENTILES = [10, 25, 50, 75, 90]
+# share of the lineups simulated that cash, ie 0.5 for double ups
+CASH_SHARE = 0.5
+
+# process pool of batch simulations, see get_process_pool
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_process_pool(max_workers=None):
+    """
+    Returns the process pool shared by simulations run with several workers,
+    created on first use and kept for the life of the process. Workers are
+    spawned rather than forked, so they never inherit the threads, locks or
+    sqlite connections of a dashboard worker.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers or os.cpu_count() or 1,
+                mp_context=mp.get_context('spawn'))
+
+    return _pool
+
+def normal_cdf(x):
+    """
+    Standard normal cdf by the Abramowitz and Stegun erf approximation,
+    accurate to about 1e-7.
+    """
+    z = np.abs(x) / np.sqrt(2)
+    t = 1 / (1 + 0.3275911 * z)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741
+           + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1 - poly * np.exp(-z * z)
+
+    return 0.5 * (1 + np.sign(x) * erf)
+
+def _simulate_chunk(args):
+    """
+    Draws one chunk of simulations. Returns the per player sums and sums of
+    squares, the score histograms when asked for, along with the lineup
+    score sums, wins and cashes, so chunks are merged by adding them up.
+    """
+    (quantiles, empirical, means, stds, team_idx, n_teams, team_corr,
+     lineups, with_hist, n_sims, seed) = args
+    rng = np.random.default_rng(seed)
+    n_players = len(means)
+    # gaussian copula, a shared team factor and a player factor
+    team = rng.standard_normal((n_teams, n_sims))
+    own = rng.standard_normal((n_players, n_sims))
+    z = (np.sqrt(team_corr) * team[team_idx]
+         + np.sqrt(1 - team_corr) * own)
+    scores = means[:, None] + stds[:, None] * z
+    if empirical.any():
+        # empirical players read their quantile table at the drawn level
+        pos = normal_cdf(z[empirical]) * (quantiles.shape[1] - 1)
+        lo = np.minimum(pos.astype(int), quantiles.shape[1] - 2)
+        frac = pos - lo
+        table = quantiles[empirical]
+        rows = np.arange(len(table))[:, None]
+        scores[empirical] = (table[rows, lo] * (1 - frac)
+                             + table[rows, lo + 1] * frac)
+
+    result = {'sum': scores.sum(axis=1),
+              'sum_sq': (scores ** 2).sum(axis=1)}
+    if with_hist:
+        # histogram of every player at once, scores past the ends clipped
+        n_bins = len(HIST_BINS) - 1
+        bins = np.clip(np.searchsorted(HIST_BINS, scores, side='right') - 1,
+                       0, n_bins - 1)
+        bins += np.arange(n_players)[:, None] * n_bins
+        hist = np.bincount(bins.ravel(), minlength=n_players * n_bins)
+        result['hist'] = hist.reshape(n_players, n_bins)
+    if lineups is not None:
+        totals = lineups @ scores
+        best = totals.max(axis=0)
+        line = np.quantile(totals, 1 - CASH_SHARE, axis=0)
+        # ties for first split the win
+        winners = totals == best
+        result['lineup_sum'] = totals.sum(axis=1)
+        result['lineup_sum_sq'] = (totals ** 2).sum(axis=1)
+        result['wins'] = (winners / winners.sum(axis=0)).sum(axis=1)
+        result['cashes'] = (totals >= line).sum(axis=1)
+
+    return result
+
+def _percentiles(hist, percentiles):
+    """
+    Reads percentiles of each row of score histograms.
+    """
+    cum = hist.cumsum(axis=1) / hist.sum(axis=1, keepdims=True)
+    values = {}
+    for p in percentiles:
+        idx = (cum < p / 100).sum(axis=1)
+        values[f'p{p}'] = HIST_BINS[np.minimum(idx, len(HIST_BINS) - 2) + 1]
+
+    return values
+
+class SlateSimulator:
+    """
+    Simulates the DFS scores of the players of a slate. Players with at
+    least MIN_GAMES games are drawn from their own empirical distribution,
+    the others from a normal fitted to their mean and deviation. Draws are
+    correlated within teams by a gaussian copula with team_corr.
+    """
+
+    def __init__(self, players, samples, team_corr=TEAM_CORR):
+        self.players = players.reset_index(drop=True)
+        self.team_corr = team_corr
+        teams = self.players['team'].astype('category')
+        self.team_idx = teams.cat.codes.to_numpy()
+        self.n_teams = len(teams.cat.categories)
+        self.means = np.array([np.mean(x) if len(x) else 0.0
+                               for x in samples])
+        self.stds = np.array([np.std(x, ddof=1) if len(x) > 1 else 0.0
+                              for x in samples])
+        self.empirical = np.array([len(x) >= MIN_GAMES for x in samples])
+        self.quantiles = np.array([np.quantile(x, QUANTILE_GRID)
+                                   if len(x) else np.zeros(len(QUANTILE_GRID))
+                                   for x in samples])
+
+    @classmethod
+    def from_boxscores(cls, box_df, ruleset=DEFAULT_RULESET,
+                       team_corr=TEAM_CORR):
+        """
+        Builds the simulator from the season boxscores of the slate players,
+        each player on their latest team.
+        """
+        box_df = box_df.sort_values(by='date')
+        scores = box_df[['player_id', 'player', 'abbrev']].copy()
+        scores['dfs'] = score_dfs(box_df, ruleset)
+        grouped = scores.groupby('player_id', sort=False)
+        players = grouped[['player', 'abbrev']].last().reset_index()
+        players = players.rename({'abbrev': 'team'}, axis=1)
+        samples = [grouped.get_group(x)['dfs'].to_numpy()
+                   for x in players['player_id']]
+
+        return cls(players, samples, team_corr=team_corr)
+
+    def lineup_matrix(self, lineups):
+        """
+        Returns the lineups x players incidence matrix of lineups given as a
+        dataframe with lineup and player_id columns.
+        """
+        idx = pd.Series(self.players.index, index=self.players['player_id'])
+        numbers = lineups['lineup'].astype('category')
+        matrix = np.zeros((len(numbers.cat.categories), len(self.players)))
+        cols = lineups['player_id'].map(idx)
+        known = cols.notna().to_numpy()
+        matrix[numbers.cat.codes.to_numpy()[known],
+               cols[known].astype(int).to_numpy()] = 1
+
+        return matrix, numbers.cat.categories
+
+    def simulate(self, n_sims=N_SIMS, lineups=None, chunk_sims=CHUNK_SIMS,
+                 max_workers=1, seed=None, percentiles=None):
+        """
+        Runs n_sims simulations in chunks of chunk_sims, one after the other
+        in process by default, as the dashboard does per request. With
+        max_workers above 1 the chunks are spread over the shared process
+        pool, for batch runs. Returns the per player score summary, with the
+        passed percentiles (eg PERCENTILES) read from score histograms, and,
+        when lineups are passed, the mean, deviation and chances of each
+        lineup winning and cashing against the others.
+        """
+        matrix, numbers = (self.lineup_matrix(lineups) if lineups is not None
+                           else (None, None))
+        sizes = [min(chunk_sims, n_sims - x)
+                 for x in range(0, n_sims, chunk_sims)]
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        tasks = [(self.quantiles, self.empirical, self.means, self.stds,
+                  self.team_idx, self.n_teams, self.team_corr, matrix,
+                  bool(percentiles), size, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+        if (max_workers or 1) > 1 and len(tasks) > 1:
+            pool = get_process_pool(max_workers)
+            results = list(pool.map(_simulate_chunk, tasks))
+        else:
+            results = [_simulate_chunk(x) for x in tasks]
+        total = {k: sum(x[k] for x in results) for k in results[0]}
+
+        player_df = self.players.copy()
+        mean = total['sum'] / n_sims
+        player_df['mean'] = mean
+        player_df['std'] = np.sqrt(np.maximum(
+            total['sum_sq'] / n_sims - mean ** 2, 0))
+        if percentiles:
+            for k, v in _percentiles(total['hist'], percentiles).items():
+                player_df[k] = v
+        player_df = player_df.round(2)
+        if matrix is None:
+            return player_df, None
+
+        lineup_mean = total['lineup_sum'] / n_sims
+        lineup_df = pd.DataFrame({
+            'lineup': numbers,
+            'mean': lineup_mean,
+            'std': np.sqrt(np.maximum(
+                total['lineup_sum_sq'] / n_sims - lineup_mean ** 2, 0)),
+            'win': total['wins'] / n_sims,
+            'cash': total['cashes'] / n_sims}).round(4)
+
+        return player_df, lineup_df
+
+def simulate_slate(box_df, lineups=None, n_sims=N_SIMS, ruleset=DEFAULT_RULESET,
+                   team_corr=TEAM_CORR, max_workers=1, seed=None,
+                   percentiles=None):
+    """
+    Simulates the slate of the passed season boxscores, see
+    SlateSimulator.simulate.
+    """
+    simulator = SlateSimulator.from_boxscores(box_df, ruleset=ruleset,
+                                              team_corr=team_corr)
+
+    return simulator.simulate(n_sims, lineups=lineups,
+                              max_workers=max_workers, seed=seed,
+                              percentiles=percentiles)
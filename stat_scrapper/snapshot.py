@@ -0,0 +1,180 @@
+# Columnar snapshot of the boxscores table as Parquet files partitioned by
+# season and month, ie db/snapshot/season=2021/month=2021-01/part.parquet,
+# so analytics load seasons without going through sqlite. Partitions are
+# written again once the ingest ledger shows games ingested after them.
+# Run with python -m stat_scrapper.snapshot to sync by hand.
+
+import os
+import sqlite3
+import datetime as dt
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .db_utils import create_connection, execute_query
+from .boxscores import BOXSCORE_COLUMNS, INT_COLUMNS, PCT_COLUMNS
+from .ledger import INGESTED
+
+SNAPSHOT_DIR = Path(__file__).parent.parent / 'db' / 'snapshot'
+PART_NAME = 'part.parquet'
+STRING_COLUMNS = ['game_id', 'player_id', 'player', 'team_name', 'abbrev',
+                  'unique_id']
+SNAPSHOT_SCHEMA = pa.schema(
+    [(x, pa.string()) if x in STRING_COLUMNS
+     else (x, pa.int32()) if x in INT_COLUMNS
+     else (x, pa.float64()) if x in PCT_COLUMNS
+     else (x, pa.int16()) if x == 'season'
+     else (x, pa.date32())
+     for x in BOXSCORE_COLUMNS])
+
+def create_snapshot_log(conn: sqlite3.Connection):
+    execute_query('create_snapshot_log_table.sql', conn)
+
+    return
+
+def get_partition_path(season, month, snapshot_dir=SNAPSHOT_DIR):
+    return (Path(snapshot_dir) / f'season={season}' / f'month={month}'
+            / PART_NAME)
+
+def get_stale_partitions(conn: sqlite3.Connection, seasons=None):
+    """
+    Returns the (season, month) partitions holding games ingested since
+    they were last written, or never written.
+    """
+    q = f"""
+    select l.season,
+           substr(l.date, 1, 7) as month,
+           max(coalesce(l.fetched_at, '')) as fetched
+    from ingest_ledger l
+    where l.status = '{INGESTED}'
+    group by l.season, substr(l.date, 1, 7)
+    """
+    ledger = pd.read_sql(q, conn)
+    synced = pd.read_sql('select season, month, synced_through from '
+                         'snapshot_log', conn)
+    parts = ledger.merge(synced, on=['season', 'month'], how='left')
+    stale = parts[parts['synced_through'].isna()
+                  | (parts['fetched'] > parts['synced_through'])]
+    if seasons is not None:
+        stale = stale[stale['season'].isin([int(x) for x in seasons])]
+
+    return list(stale[['season', 'month']].itertuples(index=False, name=None))
+
+def to_arrow(box_df):
+    """
+    Converts boxscore rows to an arrow table of the snapshot schema.
+    """
+    box_df = box_df[BOXSCORE_COLUMNS].copy()
+    box_df['date'] = pd.to_datetime(box_df['date']).dt.date
+
+    return pa.Table.from_pandas(box_df, schema=SNAPSHOT_SCHEMA,
+                                preserve_index=False)
+
+def write_partitions(conn: sqlite3.Connection, season, months,
+                     snapshot_dir=SNAPSHOT_DIR):
+    """
+    Writes the boxscores of months of a season to their partitions, read
+    in one pass. Files are written aside and moved in place, so readers
+    never open half a file. Returns the rows written by month.
+    """
+    marks = ', '.join('?' for _ in months)
+    params = [int(season)] + list(months)
+    # rows and ledger are read in one transaction so they agree
+    with conn:
+        conn.execute('begin')
+        box_df = pd.read_sql(f"""
+        select * from boxscores
+        where season = ? and substr(date, 1, 7) in ({marks})
+        """, conn, params=params)
+        synced = dict(conn.execute(f"""
+        select substr(date, 1, 7), max(coalesce(fetched_at, ''))
+        from ingest_ledger
+        where season = ? and substr(date, 1, 7) in ({marks}) and status = ?
+        group by substr(date, 1, 7)""", params + [INGESTED]).fetchall())
+    box_months = box_df['date'].str[:7]
+    synced_at = dt.datetime.now().isoformat(timespec='seconds')
+    rows = {}
+    for month in months:
+        month_df = box_df[box_months == month]
+        path = get_partition_path(season, month, snapshot_dir)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        pq.write_table(to_arrow(month_df), tmp_path, compression='snappy')
+        os.replace(tmp_path, path)
+        rows[month] = len(month_df)
+    with conn:
+        conn.executemany("""
+        insert or replace into snapshot_log
+        (season, month, row_count, synced_through, synced_at)
+        values (?, ?, ?, ?, ?)""",
+        [(int(season), x, rows[x], synced.get(x, ''), synced_at)
+         for x in months])
+
+    return rows
+
+def sync_snapshot(conn: sqlite3.Connection, seasons=None,
+                  snapshot_dir=SNAPSHOT_DIR):
+    """
+    Writes every stale partition of the seasons, or of all seasons. Run
+    after ingesting. Returns the number of partitions written.
+    """
+    create_snapshot_log(conn)
+    stale = get_stale_partitions(conn, seasons)
+    by_season = {}
+    for season, month in stale:
+        by_season.setdefault(season, []).append(month)
+    for season, months in by_season.items():
+        rows = write_partitions(conn, season, months, snapshot_dir)
+        print(f'Snapshot {season}: {sum(rows.values())} rows in '
+              f'{len(rows)} months.')
+
+    return len(stale)
+
+def get_partition_paths(seasons=None, months=None, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Returns the partition files of the seasons and months, ie 2021-01, or
+    of all of them.
+    """
+    paths = sorted(Path(snapshot_dir).glob(f'season=*/month=*/{PART_NAME}'))
+    if seasons is not None:
+        seasons = {f'season={x}' for x in seasons}
+        paths = [x for x in paths if x.parent.parent.name in seasons]
+    if months is not None:
+        months = {f'month={x}' for x in months}
+        paths = [x for x in paths if x.parent.name in months]
+
+    return paths
+
+def load_arrow(seasons=None, columns=None, months=None,
+               snapshot_dir=SNAPSHOT_DIR):
+    """
+    Reads the snapshot as an arrow table, memory mapping the partition
+    files and decoding only the columns asked for.
+    """
+    tables = [pq.read_table(x, columns=columns, memory_map=True)
+              for x in get_partition_paths(seasons, months, snapshot_dir)]
+    if not tables:
+        schema = SNAPSHOT_SCHEMA
+        if columns is not None:
+            schema = pa.schema([schema.field(x) for x in columns])
+        return schema.empty_table()
+
+    return pa.concat_tables(tables)
+
+def load_boxscores(seasons=None, columns=None, months=None,
+                   snapshot_dir=SNAPSHOT_DIR):
+    """
+    Loads boxscores from the snapshot as a dataframe, the columns of the
+    boxscores table or only the columns passed. Dates are datetimes.
+    """
+    table = load_arrow(seasons, columns, months, snapshot_dir)
+
+    return table.to_pandas(date_as_object=False)
+
+# Main
+if __name__ == "__main__":
+    conn = create_connection('nba_dfs.db')
+    try:
+        print(f'{sync_snapshot(conn)} partitions written.')
+    finally:
+        conn.close()
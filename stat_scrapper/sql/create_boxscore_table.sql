@@ -1,26 +1,34 @@
 CREATE TABLE IF NOT EXISTS boxscores (
+    game_id text NOT NULL,
+    player_id text NOT NULL,
 	player text NOT NULL,
-	MP text,
-    FG text,
-    FGA text,
-    `3P` text,
-    `3PA` text,
-    `3P%` text,
-    FT  text,
-    FTA text,
-    `FT%` text,
-    ORB text,
-    DRB text,
-    TRB text,
-    AST text,
-    STL text,
-    BLK text,
-    TOV text,
-    PF  text,
-    PTS text,
-    `+/-` text,
-    team_name text,
-    datetext date,
-    unique_id text,
-    abbrev text PRIMARY KEY
-);
\ No newline at end of file
+    MP_SEC integer NOT NULL,
+    FG integer,
+    FGA integer,
+    `FG%` real,
+    `3P` integer,
+    `3PA` integer,
+    `3P%` real,
+    FT  integer,
+    FTA integer,
+    `FT%` real,
+    ORB integer,
+    DRB integer,
+    TRB integer,
+    AST integer,
+    STL integer,
+    BLK integer,
+    TOV integer,
+    PF  integer,
+    PTS integer,
+    `+/-` integer,
+    season integer NOT NULL,
+    date text NOT NULL,
+    team_name text NOT NULL,
+    abbrev text NOT NULL,
+    unique_id text NOT NULL,
+    PRIMARY KEY (game_id, player_id)
+);
+CREATE INDEX IF NOT EXISTS ix_boxscores_abbrev_date ON boxscores (abbrev, date);
+CREATE INDEX IF NOT EXISTS ix_boxscores_player_date ON boxscores (player_id, date);
+CREATE INDEX IF NOT EXISTS ix_boxscores_unique_id ON boxscores (unique_id);
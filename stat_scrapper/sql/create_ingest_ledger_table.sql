@@ -0,0 +1,11 @@
+CREATE TABLE IF NOT EXISTS ingest_ledger (
+    game_id text PRIMARY KEY,
+    url text NOT NULL,
+    season integer NOT NULL,
+    date text NOT NULL,
+    status text NOT NULL DEFAULT 'pending',
+    fetched_at text,
+    row_count integer,
+    error text
+);
+CREATE INDEX IF NOT EXISTS ix_ingest_ledger_status ON ingest_ledger (status, date);
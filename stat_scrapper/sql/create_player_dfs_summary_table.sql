@@ -0,0 +1,14 @@
+CREATE TABLE IF NOT EXISTS player_dfs_summary (
+    season integer NOT NULL,
+    player_id text NOT NULL,
+    player text NOT NULL,
+    abbrev text NOT NULL,
+    games integer NOT NULL,
+    dfs_sum real NOT NULL,
+    dfs_sum_sq real NOT NULL,
+    mp_sec_sum integer NOT NULL,
+    last_games text NOT NULL,
+    last_date text NOT NULL,
+    PRIMARY KEY (season, player_id)
+);
+CREATE INDEX IF NOT EXISTS ix_player_dfs_summary_abbrev ON player_dfs_summary (season, abbrev);
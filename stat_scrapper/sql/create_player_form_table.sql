@@ -0,0 +1,11 @@
+CREATE TABLE IF NOT EXISTS player_form (
+    season integer NOT NULL,
+    player_id text NOT NULL,
+    game_id text NOT NULL,
+    date text NOT NULL,
+    metric text NOT NULL,
+    value real,
+    PRIMARY KEY (season, player_id, metric, game_id)
+);
+CREATE INDEX IF NOT EXISTS ix_player_form_game ON player_form (game_id);
+CREATE INDEX IF NOT EXISTS ix_player_form_metric_date ON player_form (season, metric, date);
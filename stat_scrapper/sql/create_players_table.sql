@@ -0,0 +1,15 @@
+CREATE TABLE IF NOT EXISTS players (
+    player_id text PRIMARY KEY,
+    player text NOT NULL,
+    display text NOT NULL,
+    name text NOT NULL,
+    last_date text
+);
+CREATE INDEX IF NOT EXISTS ix_players_name ON players (name);
+CREATE TABLE IF NOT EXISTS player_aliases (
+    alias text PRIMARY KEY,
+    player_id text NOT NULL,
+    source text NOT NULL,
+    last_date text
+);
+CREATE INDEX IF NOT EXISTS ix_player_aliases_player ON player_aliases (player_id);
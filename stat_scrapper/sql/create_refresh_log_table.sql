@@ -0,0 +1,5 @@
+CREATE TABLE IF NOT EXISTS refresh_log (
+    version integer PRIMARY KEY AUTOINCREMENT,
+    date date NOT NULL,
+    refreshed_at text NOT NULL
+);
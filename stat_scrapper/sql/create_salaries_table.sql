@@ -0,0 +1,11 @@
+CREATE TABLE IF NOT EXISTS salaries (
+    date text NOT NULL,
+    site text NOT NULL,
+    player_id text NOT NULL,
+    player text NOT NULL,
+    team text,
+    pos text,
+    salary integer NOT NULL,
+    fetched_at text NOT NULL,
+    PRIMARY KEY (date, site, player_id)
+);
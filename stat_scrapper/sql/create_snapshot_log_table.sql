@@ -0,0 +1,8 @@
+CREATE TABLE IF NOT EXISTS snapshot_log (
+    season integer NOT NULL,
+    month text NOT NULL,
+    row_count integer NOT NULL,
+    synced_through text NOT NULL,
+    synced_at text NOT NULL,
+    PRIMARY KEY (season, month)
+);
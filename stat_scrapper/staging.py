@@ -0,0 +1,81 @@
+# Staging databases a season is ingested into before being published to the
+# main database. A staged season replaces the published one in a single
+# transaction, so readers see either the old or the new season.
+
+import os
+import sqlite3
+from pathlib import Path
+import pandas as pd
+from .db_utils import execute_query
+from .ledger import create_ledger
+from .summary import create_summary
+from .form import create_player_form
+from .players import create_players, update_players
+
+STAGING_DIR = Path(__file__).parent.parent / 'db' / 'staging'
+# season keyed tables copied from the staging databases
+STAGED_TABLES = ['boxscores', 'ingest_ledger', 'player_dfs_summary',
+                 'player_form']
+
+def get_staging_path(season, staging_dir=STAGING_DIR):
+    return Path(staging_dir) / f'nba_dfs_{season}.db'
+
+def create_tables(conn: sqlite3.Connection):
+    """
+    Creates the tables written by a season ingest.
+    """
+    execute_query('create_boxscore_table.sql', conn)
+    create_ledger(conn)
+    create_summary(conn)
+    create_player_form(conn)
+    create_players(conn)
+
+    return
+
+def connect_staging(season, staging_dir=STAGING_DIR):
+    """
+    Returns a connection to the staging database of a season, created with
+    the season tables when missing.
+    """
+    path = get_staging_path(season, staging_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path)
+    create_tables(conn)
+
+    return conn
+
+def remove_staging(season, staging_dir=STAGING_DIR):
+    path = get_staging_path(season, staging_dir)
+    if path.exists():
+        os.remove(path)
+
+    return
+
+def merge_staging(conn: sqlite3.Connection, season, staging_dir=STAGING_DIR):
+    """
+    Replaces a season of the main database with the one of its staging
+    database in one transaction, and adds the staged players to the
+    identity index.
+    """
+    path = get_staging_path(season, staging_dir)
+    create_tables(conn)
+    conn.execute('attach database ? as staged', (str(path),))
+    try:
+        staged_players = pd.read_sql("""
+        select player_id, player, last_date as date from staged.players""",
+        conn)
+        with conn:
+            conn.execute('begin immediate')
+            for table in STAGED_TABLES:
+                cols = ', '.join(f'"{x[1]}"' for x in conn.execute(
+                    f'pragma main.table_info({table})'))
+                conn.execute(f'delete from main.{table} where season = ?',
+                             (int(season),))
+                conn.execute(f"""
+                insert into main.{table} ({cols})
+                select {cols} from staged.{table}""")
+            update_players(conn, staged_players)
+    finally:
+        conn.execute('detach database staged')
+
+    return
@@ -0,0 +1,177 @@
+# Per player season DFS aggregates kept as running sums, updated as games
+# are ingested so the dashboard reads means and deviations in one lookup.
+
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+from .db_utils import execute_query, upsert_df
+from .scoring import score_dfs
+
+# most recent games kept per player, as [date, game_id, dfs]
+LAST_N = 10
+SUMMARY_COLUMNS = ['season', 'player_id', 'player', 'abbrev', 'games',
+                   'dfs_sum', 'dfs_sum_sq', 'mp_sec_sum', 'last_games',
+                   'last_date']
+
+def create_summary(conn: sqlite3.Connection):
+    execute_query('create_player_dfs_summary_table.sql', conn)
+
+    return
+
+def _score_rows(box_df):
+    rows = box_df[['season', 'player_id', 'player', 'abbrev', 'date',
+                   'game_id', 'MP_SEC']].copy()
+    rows['dfs'] = score_dfs(box_df)
+
+    return rows
+
+def get_last_games(conn: sqlite3.Connection, season, player_id):
+    """
+    Returns the most recent [date, game_id, dfs] of a player from the
+    boxscores table.
+    """
+    q = """
+    select * from boxscores
+    where season = ? and player_id = ?
+    order by date desc, game_id desc
+    limit ?
+    """
+    box_df = pd.read_sql(q, conn, params=(int(season), player_id, LAST_N))
+    rows = _score_rows(box_df).sort_values(by=['date', 'game_id'])
+
+    return rows[['date', 'game_id', 'dfs']].values.tolist()
+
+def update_player_summary(conn: sqlite3.Connection, new_df, old_df=None):
+    """
+    Folds the boxscore rows of newly ingested games into the running sums of
+    their players. When games are ingested again their previously stored
+    rows are passed as old_df and taken out first, so a game is never
+    counted twice. Run inside the transaction writing the boxscores.
+    """
+    new_rows = _score_rows(new_df)
+    if old_df is not None and not old_df.empty:
+        old_rows = _score_rows(old_df)
+    else:
+        old_rows = new_rows.iloc[0:0]
+    keys = pd.concat([new_rows, old_rows])[['season', 'player_id']]
+
+    state = {}
+    for season, ids in keys.groupby('season')['player_id']:
+        ids = ids.unique().tolist()
+        marks = ', '.join('?' for _ in ids)
+        q = f"""
+        select * from player_dfs_summary
+        where season = ? and player_id in ({marks})
+        """
+        current = pd.read_sql(q, conn, params=[int(season)] + ids)
+        for row in current.to_dict('records'):
+            row['last_games'] = json.loads(row['last_games'])
+            state[(row['season'], row['player_id'])] = row
+
+    for row in old_rows.itertuples(index=False):
+        entry = state.get((row.season, row.player_id))
+        if entry is None:
+            continue
+        entry['games'] -= 1
+        entry['dfs_sum'] -= row.dfs
+        entry['dfs_sum_sq'] -= row.dfs ** 2
+        entry['mp_sec_sum'] -= row.MP_SEC
+        entry['last_games'] = [x for x in entry['last_games']
+                               if x[1] != row.game_id]
+
+    for row in new_rows.itertuples(index=False):
+        key = (row.season, row.player_id)
+        entry = state.setdefault(key, {
+            'season': row.season, 'player_id': row.player_id,
+            'player': row.player, 'abbrev': row.abbrev, 'games': 0,
+            'dfs_sum': 0.0, 'dfs_sum_sq': 0.0, 'mp_sec_sum': 0,
+            'last_games': [], 'last_date': row.date})
+        entry['games'] += 1
+        entry['dfs_sum'] += row.dfs
+        entry['dfs_sum_sq'] += row.dfs ** 2
+        entry['mp_sec_sum'] += row.MP_SEC
+        entry['last_games'] = sorted(entry['last_games']
+                                     + [[row.date, row.game_id, row.dfs]])
+        entry['last_games'] = entry['last_games'][-LAST_N:]
+        # name and team follow the player's latest game
+        if row.date >= entry['last_date']:
+            entry['last_date'] = row.date
+            entry['player'] = row.player
+            entry['abbrev'] = row.abbrev
+
+    # games taken out can leave the recent games short, these are read back
+    # from the boxscores which already hold the new rows
+    for entry in state.values():
+        if 0 < len(entry['last_games']) < min(entry['games'], LAST_N):
+            entry['last_games'] = get_last_games(conn, entry['season'],
+                                                 entry['player_id'])
+
+    dropped = [key for key, x in state.items() if x['games'] <= 0]
+    conn.executemany("""
+    delete from player_dfs_summary where season = ? and player_id = ?""",
+    [(int(season), player_id) for season, player_id in dropped])
+    kept = [x for x in state.values() if x['games'] > 0]
+    if kept:
+        summary_df = pd.DataFrame(kept)[SUMMARY_COLUMNS]
+        summary_df['last_games'] = summary_df['last_games'].map(json.dumps)
+        upsert_df(summary_df, 'player_dfs_summary', conn)
+
+    return
+
+def rebuild_player_summary(conn: sqlite3.Connection, season):
+    """
+    Recomputes the summary of a whole season from the boxscores table.
+    """
+    create_summary(conn)
+    box_df = pd.read_sql('select * from boxscores where season = ?', conn,
+                         params=(int(season),))
+    rows = (_score_rows(box_df)
+            .sort_values(by=['player_id', 'date', 'game_id']))
+    rows['dfs_sq'] = rows['dfs'] ** 2
+    grouped = rows.groupby(['season', 'player_id'])
+    summary_df = grouped.agg(player=('player', 'last'),
+                             abbrev=('abbrev', 'last'),
+                             games=('dfs', 'size'),
+                             dfs_sum=('dfs', 'sum'),
+                             dfs_sum_sq=('dfs_sq', 'sum'),
+                             mp_sec_sum=('MP_SEC', 'sum'),
+                             last_date=('date', 'max')).reset_index()
+    last_games = (grouped.tail(LAST_N)
+                  .groupby('player_id')[['date', 'game_id', 'dfs']]
+                  .apply(lambda x: json.dumps(x.values.tolist())))
+    summary_df['last_games'] = summary_df['player_id'].map(last_games)
+    with conn:
+        conn.execute('delete from player_dfs_summary where season = ?',
+                     (int(season),))
+        if not summary_df.empty:
+            upsert_df(summary_df[SUMMARY_COLUMNS], 'player_dfs_summary', conn)
+
+    return
+
+def get_player_summary(conn: sqlite3.Connection, season, abbrevs):
+    """
+    Returns the season DFS mean, standard deviation and minutes of every
+    player whose latest team is one of abbrevs, named without accents.
+    """
+    abbrevs = list(abbrevs)
+    marks = ', '.join('?' for _ in abbrevs)
+    q = f"""
+    select s.player_id,
+           coalesce(p.display, s.player) as player,
+           s.abbrev,
+           s.games,
+           s.mp_sec_sum / 60.0 / s.games as MP,
+           s.dfs_sum / s.games as AVG_DFS,
+           case when s.games > 1
+                then (s.dfs_sum_sq - s.dfs_sum * s.dfs_sum / s.games)
+                     / (s.games - 1)
+                else 0 end as VAR_DFS
+    from player_dfs_summary s
+    left join players p on p.player_id = s.player_id
+    where s.season = ? and s.abbrev in ({marks})
+    """
+    df = pd.read_sql(q, conn, params=[int(season)] + abbrevs)
+    df['STD_DFS'] = np.sqrt(df.pop('VAR_DFS').clip(lower=0))
+
+    return df
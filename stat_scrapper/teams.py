@@ -1,41 +1,153 @@
 import pandas as pd
 from bs4 import BeautifulSoup
-import requests
-import numpy as np
-import os
+from .page_cache import get_page
+import sqlite3
+import threading
+from .db_utils import create_connection, get_db_path, replace_table
 
-def get_abbrevs():
+# basketball-reference abbreviations that differ from the ones used here
+BBREF_ALIASES = {'BRK': 'BKN', 'CHO': 'CHA', 'PHO': 'PHX'}
+
+def scrape_abbrevs():
     """
     Retrieves a dictionary with team names and their correspoding abbreviation.
     """
-    
+
     url = ('https://en.wikipedia.org/wiki/Wikipedia:WikiProject_National_Baske'
            'tball_Association/National_Basketball_Association_team_abbreviatio'
            'ns')
-    
-    source = requests.get(url)
-    soup = BeautifulSoup(source.content, 'html.parser')
-    
+
+    source = get_page(url)
+    soup = BeautifulSoup(source, 'html.parser')
+
     table = soup.find_all('table')
     rows = table[0].find_all('tr')
-    
-    for row in rows:
-        team = row.find_all('td')
-    
-    team_df = pd.DataFrame()
+
+    records = []
     for row in rows[1:]:
         team = row.find_all('td')
         abbrev = team[0].text.strip()
         name = team[1].text.strip()
-        append_dict = {'team_name': name, 'abbrev': abbrev}
-        team_df =  team_df.append(append_dict, ignore_index=True)
-    
+        records.append({'abbrev': abbrev, 'team_name': name})
+    team_df = pd.DataFrame(records, columns=['abbrev', 'team_name'])
+
     return team_df
 
+class TeamRegistry:
+    """
+    In memory index of the teams table, mapping team names to abbreviations
+    and back. Basketball-reference abbreviations (BRK, CHO, PHO) resolve to
+    the abbreviations used in the database.
+    """
+
+    def __init__(self, team_df):
+        self.load(team_df)
+
+    def load(self, team_df):
+        team_df = team_df[['team_name', 'abbrev']].reset_index(drop=True)
+        self.team_df = team_df
+        self.name_to_abbrev = dict(zip(team_df['team_name'],
+                                       team_df['abbrev']))
+        self.abbrev_to_name = dict(zip(team_df['abbrev'],
+                                       team_df['team_name']))
+        self.aliases = {x: x for x in self.abbrev_to_name}
+        self.aliases.update({k: v for k, v in BBREF_ALIASES.items()
+                             if v in self.abbrev_to_name})
+        self.bbref = {v: k for k, v in self.aliases.items()}
+
+    @classmethod
+    def from_db(cls, conn):
+        """
+        Loads the registry from the teams table.
+        """
+        team_df = pd.read_sql('select abbrev, team_name from teams', conn)
+
+        return cls(team_df)
+
+    def reload(self, conn):
+        """
+        Reloads the registry from the teams table in place.
+        """
+        self.load(pd.read_sql('select abbrev, team_name from teams', conn))
+
+    def abbrev(self, team):
+        """
+        Returns the abbreviation of a team name or of any alias of it.
+        """
+        if team in self.name_to_abbrev:
+            return self.name_to_abbrev[team]
+
+        return self.aliases[team]
+
+    def name(self, team):
+        """
+        Returns the full name of a team abbreviation or alias.
+        """
+        if team in self.name_to_abbrev:
+            return team
+
+        return self.abbrev_to_name[self.aliases[team]]
+
+    def bbref_abbrev(self, team):
+        """
+        Returns the abbreviation basketball-reference uses in its urls.
+        """
+        return self.bbref[self.abbrev(team)]
+
+    def abbrevs(self):
+        return list(self.abbrev_to_name)
+
+    def __contains__(self, team):
+        return team in self.name_to_abbrev or team in self.aliases
+
+def load_registry(db_name='nba_dfs.db'):
+    """
+    Builds the registry from the teams table, read through a read only
+    connection, only falling back on wikipedia when the database or its
+    teams table has not been created yet.
+    """
+    conn = None
+    try:
+        conn = sqlite3.connect(f'file:{get_db_path(db_name)}?mode=ro',
+                               uri=True)
+        return TeamRegistry.from_db(conn)
+    except (pd.io.sql.DatabaseError, sqlite3.Error):
+        return TeamRegistry(scrape_abbrevs())
+    finally:
+        if conn is not None:
+            conn.close()
+
+# built on first use by get_registry, refreshed by update_teams_table
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    """
+    Returns the team registry shared by the process, loaded on first use.
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = load_registry()
+
+    return _registry
+
+def get_abbrevs():
+    """
+    Returns a dataframe of the team names and their abbreviation.
+    """
+    return get_registry().team_df.copy()
+
 def update_teams_table(conn):
-    abbrevs = get_abbrevs()
-    abbrevs.to_sql('teams', conn, if_exists='replace')
+    abbrevs = scrape_abbrevs()
+    replace_table(abbrevs, 'teams', conn)
+    get_registry().reload(conn)
     print('Teams succesfully udpated.')
-    
+
     return
-        
\ No newline at end of file
+
+# Main
+if __name__ == "__main__":
+    with create_connection('nba_dfs.db') as conn:
+        update_teams_table(conn)
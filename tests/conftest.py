@@ -0,0 +1,13 @@
+# Puts the repo and the benchmark helpers on the path, then installs the
+# offline page cache before stat_scrapper.teams builds its registry, so the
+# tests never touch the network.
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / 'benchmarks')]
+
+from pages import install_fixture_cache
+
+install_fixture_cache()
@@ -0,0 +1,118 @@
+# Checks the pacing and retries of the http client on a fake clock, the
+# session answering with stub responses.
+
+import pytest
+from stat_scrapper import http_client
+from stat_scrapper.http_client import (RECOVERY, HttpClient, TokenBucket,
+                                       get_host_rate, parse_retry_after)
+
+BBREF_URL = 'https://www.basketball-reference.com/leagues/NBA_2021_games.html'
+
+class Clock:
+    """
+    Stands in for the time module, sleeping moves the clock forward by at
+    least a microsecond, as a real sleep would.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 1e-6)
+
+class Response:
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def close(self):
+        pass
+
+class Session:
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, headers=None, timeout=None):
+        self.calls += 1
+
+        return self.responses.pop(0)
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(http_client, 'time', clock)
+
+    return clock
+
+def make_client(*responses, max_retries=3):
+    client = HttpClient(max_retries=max_retries)
+    client.session = Session(*responses)
+
+    return client
+
+def test_bucket_paces_requests(clock):
+    bucket = TokenBucket(2)
+
+    waits = [bucket.acquire() for _ in range(3)]
+
+    # the first request spends the burst, the others wait half a second
+    assert waits == pytest.approx([0, 0.5, 0.5])
+    assert clock.now == pytest.approx(1001)
+
+def test_throttled_bucket_holds_and_recovers(clock):
+    bucket = TokenBucket(2)
+    bucket.acquire()
+
+    bucket.throttle(retry_after=10)
+
+    assert bucket.rate == 1
+    assert bucket.acquire() >= 10
+    bucket.recover()
+    assert bucket.rate == pytest.approx(1 + 2 * RECOVERY)
+
+def test_retry_after_is_honored(clock):
+    client = make_client(Response(429, {'Retry-After': '30'}),
+                         Response(200))
+    start = clock.now
+
+    response = client.get(BBREF_URL)
+
+    assert response.status_code == 200
+    assert client.session.calls == 2
+    assert clock.now - start >= 30
+    rate = get_host_rate('www.basketball-reference.com')
+    bucket = client.buckets['www.basketball-reference.com']
+    # halved by the 429, a share won back by the success
+    assert bucket.rate == pytest.approx(rate / 2 + rate * RECOVERY)
+
+def test_last_response_returned_out_of_retries(clock):
+    client = make_client(*[Response(503) for _ in range(3)], max_retries=2)
+
+    response = client.get(BBREF_URL)
+
+    assert response.status_code == 503
+    assert client.session.calls == 3
+
+def test_client_errors_are_not_retried(clock):
+    client = make_client(Response(404))
+
+    assert client.get(BBREF_URL).status_code == 404
+    assert client.session.calls == 1
+
+def test_parse_retry_after(clock):
+    assert parse_retry_after('12') == 12
+    assert parse_retry_after('-5') == 0
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+    # http dates are read against the clock
+    clock.now = 1609459200.0
+    assert parse_retry_after('Fri, 01 Jan 2021 00:01:00 GMT') == 60
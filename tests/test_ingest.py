@@ -0,0 +1,89 @@
+# Ingests a synthetic schedule offline, the boxscore pages being rendered
+# from the saved fixture, and checks the ledger and the derived tables.
+
+import pandas as pd
+import pytest
+from pages import (BBREF_URL, SEASON, install_fixture_cache, render_boxscore,
+                   seed_boxscores)
+from synthetic_db import build_database
+from stat_scrapper.boxscores import update_boxscores_table
+from stat_scrapper.db_utils import create_connection
+from stat_scrapper.ledger import FAILED, INGESTED, PENDING
+from stat_scrapper.schedule import load_schedule
+from stat_scrapper.teams import get_registry
+
+GAMES_PER_TEAM = 2
+
+def read_table(conn, table, keys):
+    df = pd.read_sql(f'select * from {table}', conn)
+
+    return df.sort_values(by=keys).reset_index(drop=True)
+
+def get_statuses(conn):
+    return dict(conn.execute('select game_id, status from ingest_ledger'))
+
+@pytest.fixture
+def conn(tmp_path):
+    """
+    Connection to a database holding only a synthetic schedule, with a
+    boxscore page cached for each of its games.
+    """
+    path = str(tmp_path / 'ingest.db')
+    build_database(path, games_per_team=GAMES_PER_TEAM, empty=True)
+    conn = create_connection(path)
+    sched_df = pd.read_sql("""
+    select "Visitor/Neutral", "Home/Neutral", "Box_Score" from schedule""",
+    conn)
+    bbref_abbrev = get_registry().bbref_abbrev
+    seed_boxscores(pd.DataFrame({
+        'url': BBREF_URL + sched_df['Box_Score'],
+        'away': sched_df['Visitor/Neutral'].map(bbref_abbrev),
+        'home': sched_df['Home/Neutral'].map(bbref_abbrev)}))
+    load_schedule(SEASON, conn=conn, refresh=True)
+    yield conn
+    conn.close()
+
+def test_reingest_keeps_summaries(conn):
+    update_boxscores_table(conn, SEASON, append=True)
+    summary = read_table(conn, 'player_dfs_summary', ['season', 'player_id'])
+    form = read_table(conn, 'player_form',
+                      ['season', 'player_id', 'metric', 'game_id'])
+    game_id = conn.execute("""
+    select game_id from ingest_ledger order by date limit 1""").fetchone()[0]
+    with conn:
+        conn.execute('update ingest_ledger set status = ? where game_id = ?',
+                     (PENDING, game_id))
+
+    update_boxscores_table(conn, SEASON, append=True)
+
+    assert set(get_statuses(conn).values()) == {INGESTED}
+    pd.testing.assert_frame_equal(
+        read_table(conn, 'player_dfs_summary', ['season', 'player_id']),
+        summary)
+    pd.testing.assert_frame_equal(
+        read_table(conn, 'player_form',
+                   ['season', 'player_id', 'metric', 'game_id']), form)
+
+def test_failed_games_are_retried(conn):
+    game = conn.execute("""
+    select "Box_Score", "Visitor/Neutral", "Home/Neutral" from schedule
+    order by game_date limit 1""").fetchone()
+    url = BBREF_URL + game[0]
+    cache = install_fixture_cache()
+    cache.put(url, b'<html><body>Not a boxscore</body></html>')
+    try:
+        update_boxscores_table(conn, SEASON, append=True)
+    finally:
+        bbref_abbrev = get_registry().bbref_abbrev
+        cache.put(url, render_boxscore(bbref_abbrev(game[1]),
+                                       bbref_abbrev(game[2])))
+    statuses = get_statuses(conn)
+    failed = [x for x, status in statuses.items() if status == FAILED]
+    assert len(failed) == 1
+
+    update_boxscores_table(conn, SEASON, append=True)
+
+    assert get_statuses(conn)[failed[0]] == INGESTED
+    rows = conn.execute('select count(*) from boxscores where game_id = ?',
+                        (failed[0],)).fetchone()[0]
+    assert rows > 0
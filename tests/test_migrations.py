@@ -0,0 +1,84 @@
+# Migrates a database in the layout stored before the typed schema, with
+# the season rosters served by a stub instead of basketball-reference.
+
+import sqlite3
+import pandas as pd
+import pytest
+from stat_scrapper import migrations
+from stat_scrapper.ledger import INGESTED, PENDING, get_pending_games
+
+STATS = ['FG', 'FGA', 'FG%', '3P', '3PA', '3P%', 'FT', 'FTA', 'FT%', 'ORB',
+         'DRB', 'TRB', 'AST', 'STL', 'BLK', 'TOV', 'PF', 'PTS']
+# player, team, date, unique id of the game, the home team last
+LEGACY_ROWS = [
+    ('Trae Young', 'ATL', '2020-12-23', '2020-12-23ATLCHI'),
+    ('Zach LaVine', 'CHI', '2020-12-23', '2020-12-23ATLCHI'),
+    ('Trae Young', 'ATL', '2020-12-26', '2020-12-26MEMATL'),
+    ('Ja Morant', 'MEM', '2020-12-26', '2020-12-26MEMATL'),
+]
+# date of the refresh log replaced on every refresh
+REFRESH_DATE = '2020-12-29'
+ROSTERS = {
+    'ATL': [('Trae Young', 'youngtr01')],
+    'CHI': [('Zach LaVine', 'lavinza01')],
+}
+
+def get_roster(abbrev, season):
+    if abbrev not in ROSTERS:
+        raise ValueError(f'{abbrev} roster not served')
+
+    return pd.DataFrame(ROSTERS[abbrev], columns=['Player', 'player_id'])
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    """
+    Connection to a database holding a legacy text boxscores table, the old
+    roster table and a rosters table without player ids.
+    """
+    monkeypatch.setattr(migrations, 'get_roster', get_roster)
+    conn = sqlite3.connect(str(tmp_path / 'legacy.db'))
+    legacy_df = pd.DataFrame(LEGACY_ROWS,
+                             columns=['player', 'abbrev', 'date', 'unique_id'])
+    legacy_df['MP'] = '30:15'
+    for stat in STATS:
+        legacy_df[stat] = 1.0
+    legacy_df['+/-'] = '+3'
+    legacy_df['team_name'] = legacy_df['abbrev']
+    legacy_df.to_sql('boxscores', conn, index=False)
+    pd.DataFrame({'Player': ['Trae Young'], 'abbrev': ['ATL']}).to_sql(
+        'roster', conn, index=False)
+    pd.DataFrame({'Player': ['Trae Young'], 'abbrev': ['ATL'],
+                  'team': ['ATL']}).to_sql('rosters', conn, index=False)
+    pd.DataFrame({'date': [REFRESH_DATE]}).to_sql('refresh_log', conn)
+    yield conn
+    conn.close()
+
+def test_migration_resolves_ids_from_rosters(conn):
+    migrations.migrate(conn)
+
+    box_df = pd.read_sql('select game_id, player_id from boxscores', conn)
+    assert sorted(box_df['player_id']) == ['lavinza01', 'youngtr01']
+    assert set(box_df['game_id']) == {'202012230CHI'}
+    statuses = dict(conn.execute('select game_id, status from ingest_ledger'))
+    # a player missing from the rosters holds the whole game back
+    assert statuses == {'202012230CHI': INGESTED, '202012260ATL': PENDING}
+
+def test_migration_drops_old_tables(conn):
+    migrations.migrate(conn)
+
+    tables = [x[0] for x in conn.execute(
+        "select name from sqlite_master where type = 'table'")]
+    assert 'roster' not in tables and 'boxscores_legacy' not in tables
+    assert 'player_id' in migrations.get_columns(conn, 'rosters')
+    # a second run finds nothing left to migrate
+    assert not migrations.migrate_boxscores(conn)
+
+def test_migrated_games_are_not_fetched_again(conn):
+    migrations.migrate(conn)
+
+    fetched_at = conn.execute("""
+    select fetched_at from ingest_ledger where status = ?""",
+    (INGESTED,)).fetchone()[0]
+    assert fetched_at == f'{REFRESH_DATE}T00:00:00'
+    pending = get_pending_games(conn, 2021, before='2021-01-01')
+    assert pending['game_id'].to_list() == ['202012260ATL']
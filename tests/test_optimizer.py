@@ -0,0 +1,68 @@
+# Checks the lineups of the branch and bound search against every lineup
+# of a pool small enough to enumerate.
+
+from itertools import combinations
+import numpy as np
+import pandas as pd
+from stat_scrapper.optimizer import (DK_SLOTS, SALARY_CAP, SLOT_POSITIONS,
+                                     optimize_lineups, parse_positions)
+
+POSITIONS = ['PG', 'SG', 'SF', 'PF', 'C', 'PG/SG', 'SF/PF', 'C', 'PG', 'SF',
+             'PF/C', 'SG/SF', 'G', 'F']
+
+def make_pool(seed=0):
+    rng = np.random.default_rng(seed)
+    n = len(POSITIONS)
+
+    return pd.DataFrame({
+        'player_id': [f'p{i}' for i in range(n)],
+        'player': [f'Player {i}' for i in range(n)],
+        'team': [f'T{i % 4}' for i in range(n)],
+        'game': [i % 4 // 2 for i in range(n)],
+        'pos': POSITIONS,
+        'salary': rng.integers(30, 95, n) * 100,
+        'proj': rng.uniform(10, 60, n).round(2)})
+
+def fits_slots(positions, slots=DK_SLOTS):
+    """
+    Returns True when every player can be given a slot of their own.
+    """
+    if not positions:
+        return True
+    first, rest = positions[0], positions[1:]
+    for slot in slots:
+        if first & SLOT_POSITIONS[slot]:
+            left = list(slots)
+            left.remove(slot)
+            if fits_slots(rest, left):
+                return True
+
+    return False
+
+def brute_force(pool, n):
+    """
+    Returns the projections of the n best valid lineups of the pool.
+    """
+    positions = pool['pos'].map(parse_positions).to_list()
+    totals = []
+    for picks in combinations(range(len(pool)), len(DK_SLOTS)):
+        players = pool.iloc[list(picks)]
+        if players['salary'].sum() > SALARY_CAP:
+            continue
+        if players['game'].nunique() < 2:
+            continue
+        if not fits_slots([positions[i] for i in picks]):
+            continue
+        totals.append(players['proj'].sum())
+
+    return sorted(totals, reverse=True)[:n]
+
+def test_optimizer_matches_brute_force():
+    pool = make_pool()
+    lineups = optimize_lineups(pool, n=10)
+    totals = lineups.groupby('lineup')['proj'].sum().sort_index().to_list()
+
+    assert np.allclose(totals, brute_force(pool, 10))
+    assert (lineups.groupby('lineup')['salary'].sum() <= SALARY_CAP).all()
+    assert (lineups.groupby('lineup')['slot'].apply(sorted)
+            .map(lambda x: x == sorted(DK_SLOTS)).all())
@@ -0,0 +1,116 @@
+# Checks the page cache against a stub http client: pages are served while
+# within their ttl, revalidated once expired and evicted least recently
+# used first, while offline caches never request anything.
+
+import os
+import pytest
+from pages import BOXSCORE_URL, FIXTURE_URLS, install_fixture_cache
+from stat_scrapper import page_cache
+from stat_scrapper.errors import PageNotCachedError
+from stat_scrapper.page_cache import PageCache, get_ttl
+
+SCHEDULE_URL = ('https://www.basketball-reference.com/leagues/'
+                'NBA_2021_games.html')
+
+class Response:
+
+    def __init__(self, status_code=200, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise ValueError(self.status_code)
+
+class Client:
+    """
+    Answers every request with the passed responses in turn, keeping the
+    headers sent.
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None):
+        self.requests.append((url, headers))
+
+        return self.responses.pop(0)
+
+@pytest.fixture
+def client(monkeypatch):
+    client = Client()
+    monkeypatch.setattr(page_cache, 'get_http_client', lambda: client)
+
+    return client
+
+def age(cache, url, seconds):
+    with cache._conn:
+        cache._conn.execute("""
+        update pages set fetched_at = fetched_at - ? where url = ?""",
+        (seconds, url))
+
+def test_fresh_pages_are_not_requested(tmp_path, client):
+    cache = PageCache(tmp_path)
+    cache.put(SCHEDULE_URL, b'schedule')
+    cache.put(BOXSCORE_URL, b'boxscore')
+    # final boxscores never expire
+    age(cache, BOXSCORE_URL, 365 * 24 * 60 * 60)
+
+    assert cache.get(SCHEDULE_URL) == b'schedule'
+    assert cache.get(BOXSCORE_URL) == b'boxscore'
+    assert client.requests == []
+
+def test_expired_pages_are_revalidated(tmp_path, client):
+    cache = PageCache(tmp_path)
+    cache.put(SCHEDULE_URL, b'schedule', etag='"v1"',
+              last_modified='Mon, 28 Dec 2020 00:00:00 GMT')
+    age(cache, SCHEDULE_URL, get_ttl(SCHEDULE_URL) + 1)
+    client.responses.append(Response(304))
+
+    assert cache.get(SCHEDULE_URL) == b'schedule'
+    _, headers = client.requests[0]
+    assert headers == {'If-None-Match': '"v1"',
+                       'If-Modified-Since': 'Mon, 28 Dec 2020 00:00:00 GMT'}
+    # the 304 restarts the ttl
+    assert cache.get(SCHEDULE_URL) == b'schedule'
+    assert len(client.requests) == 1
+
+    age(cache, SCHEDULE_URL, get_ttl(SCHEDULE_URL) + 1)
+    client.responses.append(Response(200, b'new schedule', {'ETag': '"v2"'}))
+
+    assert cache.get(SCHEDULE_URL) == b'new schedule'
+    assert cache._lookup(SCHEDULE_URL)[2] == '"v2"'
+
+def test_least_recently_used_pages_are_evicted(tmp_path, client):
+    cache = PageCache(tmp_path, max_bytes=2500)
+    # random bytes do not compress, so each body takes about 1000 bytes
+    bodies = {x: os.urandom(1000) for x in 'abc'}
+    cache.put('https://example.com/a', bodies['a'])
+    cache.put('https://example.com/b', bodies['b'])
+    cache.get('https://example.com/a')
+    cache.put('https://example.com/c', bodies['c'])
+
+    urls = {x[0] for x in cache._conn.execute('select url from pages')}
+    assert urls == {'https://example.com/a', 'https://example.com/c'}
+    assert cache.size() <= cache.max_bytes
+    # the body of the evicted page is deleted with it
+    assert len(list(cache.object_dir.glob('*/*'))) == 2
+
+def test_offline_cache_never_requests(tmp_path, client):
+    cache = PageCache(tmp_path, offline=True)
+    cache.put(SCHEDULE_URL, b'schedule')
+    age(cache, SCHEDULE_URL, get_ttl(SCHEDULE_URL) + 1)
+
+    # expired pages are replayed as they are
+    assert cache.get(SCHEDULE_URL) == b'schedule'
+    with pytest.raises(PageNotCachedError):
+        cache.get('https://example.com/never-fetched')
+    assert client.requests == []
+
+def test_fixture_cache_replays_saved_pages():
+    cache = install_fixture_cache()
+
+    for url in FIXTURE_URLS:
+        assert cache.get(url)
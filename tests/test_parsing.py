@@ -0,0 +1,48 @@
+# Checks the parser backends agree on the saved pages and the boxscore of
+# the overtime fixture is read into records.
+
+import datetime as dt
+import pytest
+from pages import BOXSCORE_TEAMS, BOXSCORE_URL, read_fixture
+from stat_scrapper.boxscores import (BOX_TABLE_ID, BOXSCORE_COLUMNS,
+                                     get_game_box_score)
+from stat_scrapper.parsing import BACKENDS, get_backend, parse_tables
+
+PAGES = [
+    ('boxscore_ot.html', BOX_TABLE_ID),
+    ('schedule_december.html', '^schedule$'),
+    ('roster_BRK.html', '^roster$'),
+]
+
+@pytest.mark.parametrize('name, table_id', PAGES)
+def test_backends_agree(name, table_id):
+    source = read_fixture(name)
+
+    tables = [parse_tables(source, table_id, backend=x) for x in BACKENDS]
+
+    assert tables[0]
+    assert all(x == tables[0] for x in tables[1:])
+
+def test_boxscore_tables():
+    tables = parse_tables(read_fixture('boxscore_ot.html'), BOX_TABLE_ID)
+
+    # only the basic tables, away team first
+    assert list(tables) == [f'box-{x}-game-basic' for x in BOXSCORE_TEAMS]
+    row = tables['box-MEM-game-basic'][0]
+    assert row['player_href'].startswith('/players/')
+    assert {'mp', 'pts', 'fg_pct'} <= set(row)
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        get_backend('regex')
+
+def test_game_box_score_records():
+    records = get_game_box_score(BOXSCORE_URL, dt.date(2020, 12, 28))
+
+    rows = [dict(zip(BOXSCORE_COLUMNS, x)) for x in records]
+    assert {x['game_id'] for x in rows} == {'202012280BRK'}
+    assert {x['abbrev'] for x in rows} == {'MEM', 'BKN'}
+    assert all(x['season'] == 2021 for x in rows)
+    # overtime minutes add up past the 240 of regulation per team
+    minutes = sum(x['MP_SEC'] for x in rows if x['abbrev'] == 'MEM') / 60
+    assert minutes == pytest.approx(265, abs=1)
@@ -0,0 +1,66 @@
+# Checks the player identity index resolves names from any source to the
+# basketball-reference ids.
+
+import pandas as pd
+import pytest
+from stat_scrapper.db_utils import create_connection
+from stat_scrapper.players import (add_alias, create_players, name_aliases,
+                                   normalize_name, resolve_player_ids,
+                                   update_players)
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = create_connection(str(tmp_path / 'players.db'))
+    create_players(conn)
+    yield conn
+    conn.close()
+
+def add_players(conn, rows):
+    with conn:
+        update_players(conn, pd.DataFrame(
+            rows, columns=['player_id', 'player', 'date']))
+
+def resolve(conn, *names):
+    return resolve_player_ids(conn, pd.Series(names)).to_list()
+
+@pytest.mark.parametrize('name, expected', [
+    ('Nikola Jokić', 'nikola jokic'),
+    ('P.J. Tucker', 'pj tucker'),
+    ('Nathan Knight (TW)', 'nathan knight'),
+    ("  De'Aaron  Fox ", 'deaaron fox'),
+])
+def test_normalize_name(name, expected):
+    assert normalize_name(name) == expected
+
+def test_suffixes_are_aliased():
+    assert name_aliases('Marvin Bagley III') == ['marvin bagley iii',
+                                                 'marvin bagley']
+    assert name_aliases('Gary Payton II') == ['gary payton ii', 'gary payton']
+    assert name_aliases('Trae Young') == ['trae young']
+
+def test_names_resolve_across_sources(conn):
+    add_players(conn, [('jokicni01', 'Nikola Jokić', '2021-01-05'),
+                       ('baglema01', 'Marvin Bagley III', '2021-01-05')])
+
+    assert resolve(conn, 'Nikola Jokic', 'Marvin Bagley', 'Jane Doe') == [
+        'jokicni01', 'baglema01', 'name:jane-doe']
+
+def test_player_name_follows_latest_date(conn):
+    add_players(conn, [('claxtni01', 'Nicolas Claxton', '2021-01-05')])
+    add_players(conn, [('claxtni01', 'Nic Claxton', '2021-02-05')])
+    add_players(conn, [('claxtni01', 'Nicolas Claxton', '2021-01-06')])
+
+    player = conn.execute("""
+    select player from players where player_id = 'claxtni01'""").fetchone()
+    assert player[0] == 'Nic Claxton'
+    # every name seen stays an alias
+    assert resolve(conn, 'Nicolas Claxton', 'Nic Claxton') == [
+        'claxtni01', 'claxtni01']
+
+def test_manual_aliases_are_kept(conn):
+    add_players(conn, [('smithja01', 'Jason Smith', '2021-01-05')])
+    add_alias(conn, 'Jason Smith', 'smithja02')
+
+    add_players(conn, [('smithja01', 'Jason Smith', '2021-02-05')])
+
+    assert resolve(conn, 'Jason Smith') == ['smithja02']
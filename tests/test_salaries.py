@@ -0,0 +1,74 @@
+# Stores the saved DraftKings salaries as daily snapshots and checks the
+# player table reads the salaries of its slate, on synthetic databases.
+
+import numpy as np
+import pandas as pd
+import pytest
+from synthetic_db import build_database
+import callbacks as cb
+from stat_scrapper import salaries
+from stat_scrapper.db_utils import create_connection
+from stat_scrapper.players import create_players, update_players
+from stat_scrapper.salaries import get_salaries, update_salaries_table
+
+@pytest.fixture(autouse=True)
+def slates(monkeypatch):
+    monkeypatch.setattr(salaries, '_slates', {})
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = create_connection(str(tmp_path / 'salaries.db'))
+    create_players(conn)
+    with conn:
+        update_players(conn, pd.DataFrame({'player_id': ['jokicni01'],
+                                           'player': ['Nikola Jokić']}))
+    yield conn
+    conn.close()
+
+def count_salaries(conn, date):
+    return conn.execute('select count(*) from salaries where date = ?',
+                        (date,)).fetchone()[0]
+
+def test_salaries_are_snapshotted_by_date(conn):
+    update_salaries_table(conn, date='2021-01-04', sites=['draftkings'])
+    update_salaries_table(conn, date='2021-01-05', sites=['draftkings'])
+    rows = count_salaries(conn, '2021-01-05')
+
+    # pulling a date again replaces its snapshot
+    update_salaries_table(conn, date='2021-01-05', sites=['draftkings'])
+
+    assert rows > 0
+    assert count_salaries(conn, '2021-01-04') == rows
+    assert count_salaries(conn, '2021-01-05') == rows
+
+def test_salaries_resolve_player_ids(conn):
+    update_salaries_table(conn, date='2021-01-05', sites=['draftkings'])
+
+    sal_df = get_salaries(conn, '2021-01-05')
+
+    ids = sal_df.set_index('player')['player_id']
+    assert ids['Nikola Jokić'] == 'jokicni01'
+    # players missing from the index get an id of their name
+    assert ids['LeBron James'] == 'name:lebron-james'
+    assert sal_df['player_id'].is_unique
+
+def test_slates_without_snapshot_are_empty(conn):
+    update_salaries_table(conn, date='2021-01-05', sites=['draftkings'])
+
+    assert get_salaries(conn, '2021-01-06').empty
+
+def test_player_table_reads_slate_salaries(tmp_path):
+    path = str(tmp_path / 'slate.db')
+    build_database(path, games_per_team=4)
+    conn = create_connection(path)
+    try:
+        date = conn.execute('select min(date) from salaries').fetchone()[0]
+        table_df = cb.get_player_table(conn, date=date)
+        sal_df = get_salaries(conn, date)
+    finally:
+        conn.close()
+
+    assert len(table_df) == len(sal_df)
+    assert table_df['SALARY'].notna().all()
+    multi = table_df['AVG'] / (table_df['SALARY'] / 1000)
+    assert np.allclose(table_df['MULTI'], multi.round(2))
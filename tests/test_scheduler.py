@@ -0,0 +1,61 @@
+# Checks the refresh lock keeps a single refresh running, the refresh
+# itself stubbed out.
+
+import threading
+import time
+from functools import partial
+import pytest
+from stat_scrapper import scheduler
+from stat_scrapper.scheduler import refresh_lock, run_refresh
+
+@pytest.fixture
+def lock_path(tmp_path, monkeypatch):
+    path = tmp_path / 'refresh.lock'
+    monkeypatch.setattr(scheduler, 'refresh_lock',
+                        partial(refresh_lock, path))
+
+    return path
+
+@pytest.fixture
+def refreshes(monkeypatch):
+    refreshes = []
+    monkeypatch.setattr(scheduler, 'refresh_database', refreshes.append)
+
+    return refreshes
+
+def test_lock_is_held_by_one_refresh(lock_path):
+    with refresh_lock(lock_path) as first:
+        with refresh_lock(lock_path) as second:
+            assert first and not second
+
+    with refresh_lock(lock_path) as again:
+        assert again
+
+def test_refresh_skipped_while_locked(tmp_path, lock_path, refreshes):
+    db_name = str(tmp_path / 'refresh.db')
+    with refresh_lock(lock_path):
+        assert not run_refresh(db_name)
+    assert refreshes == []
+
+    assert run_refresh(db_name)
+    assert len(refreshes) == 1
+
+def test_blocking_lock_waits_for_release(lock_path):
+    held = threading.Event()
+
+    def hold():
+        with refresh_lock(lock_path):
+            held.set()
+            time.sleep(0.2)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait()
+    start = time.monotonic()
+
+    with refresh_lock(lock_path, blocking=True) as locked:
+        waited = time.monotonic() - start
+
+    thread.join()
+    assert locked
+    assert waited >= 0.1
@@ -0,0 +1,68 @@
+# Checks the rule set matmul of the scoring engine against the DraftKings
+# and FanDuel rules applied one boxscore row at a time.
+
+import numpy as np
+import pandas as pd
+import pytest
+from stat_scrapper import scoring
+from stat_scrapper.scoring import (SCORING_STATS, register_ruleset,
+                                   score_dfs, score_rulesets)
+
+def make_boxscores(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({x: rng.integers(0, 8, n) for x in SCORING_STATS})
+    # enough big lines for double and triple doubles
+    df['PTS'] = rng.integers(0, 40, n)
+    df['TRB'] = rng.integers(0, 16, n)
+    df['AST'] = rng.integers(0, 14, n)
+    df['player'] = [f'Player {i % 20}' for i in range(n)]
+
+    return df
+
+def score_row(row, stats, bonuses):
+    points = sum(row[k] * v for k, v in stats.items())
+    doubles = sum(row[x] >= 10 for x in ['PTS', 'TRB', 'AST', 'STL', 'BLK'])
+    if doubles >= 2:
+        points += bonuses.get('double_double', 0)
+    if doubles >= 3:
+        points += bonuses.get('triple_double', 0)
+
+    return points
+
+def test_matmul_matches_row_scoring():
+    df = make_boxscores()
+    dk = {'PTS': 1, '3P': 0.5, 'TRB': 1.25, 'AST': 1.5, 'STL': 2, 'BLK': 2,
+          'TOV': -0.5}
+    fd = {'PTS': 1, 'TRB': 1.2, 'AST': 1.5, 'STL': 3, 'BLK': 3, 'TOV': -1}
+    # the boxscores hold triple doubles
+    assert (df[['PTS', 'TRB', 'AST']] >= 10).all(axis=1).any()
+
+    scores = score_rulesets(df, ['draftkings', 'fanduel'])
+
+    expected_dk = [score_row(x, dk, {'double_double': 1.5,
+                                     'triple_double': 3})
+                   for _, x in df.iterrows()]
+    expected_fd = [score_row(x, fd, {}) for _, x in df.iterrows()]
+    assert np.allclose(scores['draftkings'], expected_dk)
+    assert np.allclose(scores['fanduel'], expected_fd)
+    assert list(scores.columns) == ['draftkings', 'fanduel']
+
+def test_scoring_leaves_input_untouched():
+    df = make_boxscores()
+    before = df.copy()
+
+    first = score_dfs(df)
+    second = score_dfs(df)
+
+    pd.testing.assert_frame_equal(df, before)
+    pd.testing.assert_series_equal(first, second)
+
+def test_custom_rulesets(monkeypatch):
+    monkeypatch.setattr(scoring, 'RULESETS', dict(scoring.RULESETS))
+    df = make_boxscores()
+
+    register_ruleset('points_only', {'PTS': 1})
+
+    assert np.allclose(score_dfs(df, 'points_only'), df['PTS'])
+    with pytest.raises(ValueError):
+        register_ruleset('bad', {'FGA': 1})
@@ -0,0 +1,77 @@
+# Round trips the boxscores of a synthetic season through the Parquet
+# snapshot and checks only the stale partitions are written again.
+
+import pandas as pd
+import pytest
+from synthetic_db import build_database
+from stat_scrapper.boxscores import BOXSCORE_COLUMNS
+from stat_scrapper.db_utils import create_connection
+from stat_scrapper.snapshot import (get_partition_paths, load_boxscores,
+                                    sync_snapshot)
+
+KEYS = ['game_id', 'player_id']
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / 'snapshot.db')
+    build_database(path, games_per_team=12)
+    conn = create_connection(path)
+    yield conn
+    conn.close()
+
+def read_boxscores(conn):
+    box_df = pd.read_sql('select * from boxscores', conn)
+    box_df['date'] = pd.to_datetime(box_df['date'])
+
+    return box_df.sort_values(by=KEYS).reset_index(drop=True)
+
+def test_snapshot_round_trip(conn, tmp_path):
+    snapshot_dir = tmp_path / 'snapshot'
+
+    written = sync_snapshot(conn, snapshot_dir=snapshot_dir)
+
+    # the season spans several months
+    assert written > 1
+    assert written == len(get_partition_paths(snapshot_dir=snapshot_dir))
+    box_df = (load_boxscores(snapshot_dir=snapshot_dir)
+              .sort_values(by=KEYS).reset_index(drop=True))
+    assert list(box_df.columns) == BOXSCORE_COLUMNS
+    pd.testing.assert_frame_equal(box_df, read_boxscores(conn),
+                                  check_dtype=False)
+
+def test_snapshot_loads_columns_and_months(conn, tmp_path):
+    snapshot_dir = tmp_path / 'snapshot'
+    sync_snapshot(conn, snapshot_dir=snapshot_dir)
+    month = conn.execute('select min(substr(date, 1, 7)) from boxscores'
+                         ).fetchone()[0]
+
+    box_df = load_boxscores(columns=['player_id', 'PTS'], months=[month],
+                            snapshot_dir=snapshot_dir)
+
+    rows = conn.execute("""
+    select count(*) from boxscores where substr(date, 1, 7) = ?""",
+    (month,)).fetchone()[0]
+    assert list(box_df.columns) == ['player_id', 'PTS']
+    assert len(box_df) == rows
+
+def test_only_stale_partitions_are_written(conn, tmp_path):
+    snapshot_dir = tmp_path / 'snapshot'
+    sync_snapshot(conn, snapshot_dir=snapshot_dir)
+
+    assert sync_snapshot(conn, snapshot_dir=snapshot_dir) == 0
+
+    # a game of the first month ingested again after the sync
+    game_id, = conn.execute("""
+    select game_id from ingest_ledger order by date limit 1""").fetchone()
+    with conn:
+        conn.execute("""
+        update ingest_ledger set fetched_at = '9999-12-31T00:00:00'
+        where game_id = ?""", (game_id,))
+        conn.execute('update boxscores set PTS = PTS + 1 where game_id = ?',
+                     (game_id,))
+
+    assert sync_snapshot(conn, snapshot_dir=snapshot_dir) == 1
+    box_df = (load_boxscores(snapshot_dir=snapshot_dir)
+              .sort_values(by=KEYS).reset_index(drop=True))
+    pd.testing.assert_frame_equal(box_df, read_boxscores(conn),
+                                  check_dtype=False)
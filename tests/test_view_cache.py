@@ -0,0 +1,123 @@
+# Checks the view cache and the slate store serve a slate's views until
+# they expire or a new refresh is logged, on a small synthetic database.
+
+import pandas as pd
+import pytest
+from synthetic_db import build_database
+from data_store import SlateStore
+from view_cache import ViewCache
+from stat_scrapper.db_utils import ConnectionManager
+from stat_scrapper.refresh import log_refresh
+
+def make_key(date='2021-01-05', version=1):
+    return {'date': date, 'version': version}
+
+def age(cache, seconds):
+    with cache._connect() as conn:
+        conn.execute('update views set created_at = created_at - ?',
+                     (seconds,))
+
+@pytest.fixture
+def cache(tmp_path):
+    return ViewCache(tmp_path / 'views.db', ttl=60)
+
+def test_views_are_computed_once(cache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+
+        return pd.DataFrame({'x': [1, 2]})
+
+    first = cache.memoize('team_table', make_key(), compute)
+    second = cache.memoize('team_table', make_key(), compute)
+
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(first, second)
+    # rule sets are cached apart
+    cache.memoize('team_table', make_key(), compute, ruleset='fanduel')
+    assert len(calls) == 2
+
+def test_expired_views_are_computed_again(cache):
+    cache.put('team_table', make_key(), 'old')
+    age(cache, 61)
+
+    assert cache.get('team_table', make_key()) is None
+    assert cache.memoize('team_table', make_key(), lambda: 'new') == 'new'
+
+def test_new_refresh_invalidates_views(cache):
+    cache.put('team_table', make_key(version=1), 'first')
+
+    cache.put('team_table', make_key(version=2), 'second')
+
+    assert cache.get('team_table', make_key(version=1)) is None
+    assert cache.get('team_table', make_key(version=2)) == 'second'
+    with cache._connect() as conn:
+        versions = [x[0] for x in conn.execute('select version from views')]
+    assert versions == [2]
+
+def test_least_recently_used_views_are_evicted(tmp_path):
+    cache = ViewCache(tmp_path / 'views.db', max_bytes=2500)
+    for date in ['2021-01-01', '2021-01-02']:
+        cache.put('table', make_key(date), b'x' * 1000)
+    cache.get('table', make_key('2021-01-01'))
+
+    cache.put('table', make_key('2021-01-03'), b'x' * 1000)
+
+    assert cache.get('table', make_key('2021-01-02')) is None
+    assert cache.get('table', make_key('2021-01-01')) is not None
+    assert cache.size() <= cache.max_bytes
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / 'slate.db')
+    build_database(path, games_per_team=4)
+    store = SlateStore(ConnectionManager(path), max_slates=1)
+    # keys loaded from the database
+    store.loads = []
+
+    def load(key):
+        store.loads.append(key)
+
+        return SlateStore._load(store, key)
+    store._load = load
+    yield store
+    store.connections.close()
+
+def get_dates(store):
+    return [x[0] for x in store.connections.reader().execute("""
+    select distinct game_date from schedule order by game_date limit 2""")]
+
+def test_store_loads_each_slate_once(store):
+    date = get_dates(store)[0]
+    key = store.get_key(date)
+
+    df = store.get(key)
+
+    assert not df.empty
+    assert store.get(store.get_key(date)) is df
+    assert len(store.loads) == 1
+
+def test_store_reloads_after_refresh(store):
+    date = get_dates(store)[0]
+    key = store.get_key(date)
+    store.get(key)
+    schedule = store.get_schedule(key)
+    with store.connections.writer() as conn:
+        log_refresh(conn)
+
+    new_key = store.get_key(date)
+    store.get(new_key)
+
+    assert new_key['version'] == key['version'] + 1
+    assert len(store.loads) == 2
+    assert store.get_schedule(new_key) is not schedule
+
+def test_store_evicts_least_recently_used_slates(store):
+    first, second = get_dates(store)
+
+    store.get(store.get_key(first))
+    store.get(store.get_key(second))
+    store.get(store.get_key(first))
+
+    assert [x['date'] for x in store.loads] == [first, second, first]
@@ -1,8 +1,8 @@
-from stat_scrapper.boxscores import update_boxscores_table
-from stat_scrapper.db_utils import create_connection
+from stat_scrapper.scheduler import run_refresh
+from stat_scrapper.metrics import format_stages
 
-with create_connection('nba_dfs.db') as conn:
-    try:
-        update_boxscores_table(conn, '2021')
-    except:
-        raise Exception('Boxscore Update Failed')
\ No newline at end of file
+# the same refresh the dashboard's scheduler runs, skipped while one of
+# them is already running
+run_refresh()
+# time spent in each stage of the scrapers, to see where a slow run went
+print(format_stages())
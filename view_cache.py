@@ -0,0 +1,149 @@
+# Memoizes the dashboard views computed from a slate, ie the team and player
+# tables, so they are computed once per data refresh rather than on every
+# callback. Views are kept in sqlite so every gunicorn worker shares them.
+
+import pickle
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from stat_scrapper.scoring import DEFAULT_RULESET
+
+CACHE_PATH = Path(__file__).parent / 'db' / 'view_cache.db'
+# seconds a view is served before it is computed again
+DEFAULT_TTL = 60 * 60
+# upper bound of the pickled views kept on disk
+MAX_CACHE_BYTES = 256 * 1024 ** 2
+
+class ViewCache:
+    """
+    Cache of computed views keyed on (view, date, refresh version, ruleset).
+    A new refresh record bumps the version so views of older refreshes are
+    never served again and are dropped on the next write. Views older than
+    ttl are computed again and least recently used views are evicted once
+    the cache outgrows max_bytes.
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=DEFAULT_TTL,
+                 max_bytes=MAX_CACHE_BYTES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        with self._connect() as conn:
+            conn.execute('pragma journal_mode=wal')
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS views (
+                view text NOT NULL,
+                date text NOT NULL,
+                version integer NOT NULL,
+                ruleset text NOT NULL,
+                data blob NOT NULL,
+                size integer NOT NULL,
+                created_at real NOT NULL,
+                last_access real NOT NULL,
+                PRIMARY KEY (view, date, version, ruleset)
+            )""")
+            conn.execute("""
+            CREATE INDEX IF NOT EXISTS ix_views_last_access
+            ON views (last_access)""")
+
+    @contextmanager
+    def _connect(self):
+        # a connection per call, sqlite locking keeps workers consistent
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, view, key, ruleset=DEFAULT_RULESET):
+        """
+        Returns the cached view of the slate key or None when it is missing
+        or expired.
+        """
+        entry = (view, key['date'], key['version'], ruleset)
+        with self._connect() as conn:
+            row = conn.execute("""
+            select data, created_at from views
+            where view = ? and date = ? and version = ? and ruleset = ?""",
+            entry).fetchone()
+            if row is None or time.time() - row[1] >= self.ttl:
+                return None
+            conn.execute("""
+            update views set last_access = ?
+            where view = ? and date = ? and version = ? and ruleset = ?""",
+            (time.time(),) + entry)
+
+        return pickle.loads(row[0])
+
+    def put(self, view, key, value, ruleset=DEFAULT_RULESET):
+        """
+        Stores a view of the slate key, dropping the views of older refreshes
+        and evicting down to max_bytes.
+        """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("""
+            insert or replace into views
+            (view, date, version, ruleset, data, size, created_at, last_access)
+            values (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (view, key['date'], key['version'], ruleset, data, len(data),
+             now, now))
+        self.purge(key['version'])
+        self.evict()
+
+        return
+
+    def memoize(self, view, key, compute, ruleset=DEFAULT_RULESET):
+        """
+        Returns the cached view of the slate key, computing and storing it
+        with compute() on a miss.
+        """
+        value = self.get(view, key, ruleset)
+        if value is None:
+            value = compute()
+            self.put(view, key, value, ruleset)
+
+        return value
+
+    def purge(self, version):
+        """
+        Drops the views of refreshes before version and the expired views.
+        """
+        with self._connect() as conn:
+            conn.execute('delete from views where version < ? or created_at < ?',
+                         (version, time.time() - self.ttl))
+
+        return
+
+    def size(self):
+        with self._connect() as conn:
+            return conn.execute(
+                'select coalesce(sum(size), 0) from views').fetchone()[0]
+
+    def evict(self):
+        """
+        Drops the least recently used views until the cache is back under
+        max_bytes.
+        """
+        with self._connect() as conn:
+            rows = conn.execute("""
+            select rowid, size from views order by last_access desc""")
+            total = 0
+            dropped = []
+            for rowid, size in rows.fetchall():
+                total += size
+                if total > self.max_bytes:
+                    dropped.append((rowid,))
+            conn.executemany('delete from views where rowid = ?', dropped)
+
+        return
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('delete from views')
+
+        return